@@ -1,16 +1,23 @@
 """
 API Router for ETL/Indexing endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
-from app.models.schemas import IndexMedicalRequest, IndexMedicalResponse, IndexStatusResponse
+from fastapi import APIRouter, Depends, HTTPException
+from typing import List, Union
+from app.models.schemas import (
+    IndexMedicalRequest, IndexMedicalResponse, IndexStatusResponse,
+    ETLJobRequest, ETLJobResponse, IngestRequest, AttachmentIngestRequest, AttachmentIngestResponse
+)
 from app.etl.pipeline import ETLPipeline
+from app.etl.job_queue import ETLJobQueue
+from app.etl.data_extractor import FETCH_ENDPOINTS
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/etl", tags=["ETL"])
 
-# Global ETL pipeline instance
+# Global ETL pipeline and job queue instances
 etl_pipeline: ETLPipeline = None
+job_queue: ETLJobQueue = None
 
 async def get_etl_pipeline() -> ETLPipeline:
     """Dependency to get ETL pipeline"""
@@ -18,101 +25,119 @@ async def get_etl_pipeline() -> ETLPipeline:
         raise HTTPException(status_code=503, detail="ETL pipeline not initialized")
     return etl_pipeline
 
-@router.post("/index-medical", response_model=IndexMedicalResponse)
+async def get_job_queue() -> ETLJobQueue:
+    """Dependency to get ETL job queue"""
+    if not job_queue:
+        raise HTTPException(status_code=503, detail="ETL job queue not initialized")
+    return job_queue
+
+@router.post("/index-medical", response_model=Union[ETLJobResponse, IndexMedicalResponse])
 async def index_medical(
     request: IndexMedicalRequest,
-    pipeline: ETLPipeline = Depends(get_etl_pipeline)
+    pipeline: ETLPipeline = Depends(get_etl_pipeline),
+    queue: ETLJobQueue = Depends(get_job_queue)
 ):
     """
     Trigger ETL pipeline to index medical data from Odoo
     
+    Enqueues a job for the ETL worker process and returns it; poll
+    GET /etl/jobs/{id} for progress.
+    
     - **models**: List of Odoo models to index
     - **incremental**: Only index new/modified records
     - **limit**: Max records per model
     - **days**: Only index records from last N days
+    - **resume**: Continue an interrupted run from its last committed page
+    - **wait**: Index inline in the API process and return the results
     """
     try:
-        logger.info(f"Starting medical data indexing: {request.models}")
-        
-        results = await pipeline.run_full_indexing(
-            models=request.models,
-            limit=request.limit,
-            incremental=request.incremental
-        )
-        
-        total_records = sum(r['records_indexed'] for r in results.values())
-        total_chunks = sum(r['chunks_created'] for r in results.values())
+        if not request.wait:
+            job = await queue.enqueue(
+                models=request.models,
+                incremental=request.incremental,
+                limit=request.limit,
+                resume=request.resume
+            )
+            logger.info(f"Queued medical data indexing job {job['id']}: {request.models}")
+            return ETLJobResponse(**job)
         
-        logger.info(f"Indexing complete: {total_records} records, {total_chunks} chunks")
-        
-        return IndexMedicalResponse(
-            status="success",
-            results=results,
-            total_records=total_records,
-            total_chunks=total_chunks
-        )
+        logger.info(f"Starting inline medical data indexing: {request.models}")
+        return await _index_inline(pipeline, request.models, request.limit, request.incremental, request.resume)
         
     except Exception as e:
         logger.error(f"Medical indexing error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/index-medical-all", response_model=IndexMedicalResponse)
+@router.post("/index-medical-all", response_model=Union[ETLJobResponse, IndexMedicalResponse])
 async def index_medical_all(
-    pipeline: ETLPipeline = Depends(get_etl_pipeline)
+    resume: bool = False,
+    wait: bool = False,
+    pipeline: ETLPipeline = Depends(get_etl_pipeline),
+    queue: ETLJobQueue = Depends(get_job_queue)
 ):
     """
     Force a full re-indexing of all medical models from Odoo.
-    Ignores sync flags and fetches all records.
+    Ignores sync flags and fetches all records, in a job for the ETL worker.
+    
+    - **resume**: Continue an interrupted full run from its last committed page
+    - **wait**: Index inline in the API process and return the results
     """
     try:
         models = ['res.partner', 'medical.disease', 'wk.appointment', 'prescription.order.knk']
-        logger.info(f"Starting FULL medical data indexing for: {models}")
-        
-        results = await pipeline.run_full_indexing(
-            models=models,
-            limit=None,
-            incremental=False
-        )
-        
-        total_records = sum(r['records_indexed'] for r in results.values())
-        total_chunks = sum(r['chunks_created'] for r in results.values())
+        if not wait:
+            job = await queue.enqueue(models=models, incremental=False, resume=resume)
+            logger.info(f"Queued FULL medical data indexing job {job['id']}")
+            return ETLJobResponse(**job)
         
-        logger.info(f"Full indexing complete: {total_records} records, {total_chunks} chunks")
-        
-        return IndexMedicalResponse(
-            status="success",
-            results=results,
-            total_records=total_records,
-            total_chunks=total_chunks
-        )
+        logger.info(f"Starting inline FULL medical data indexing for: {models}")
+        return await _index_inline(pipeline, models, None, False, resume)
         
     except Exception as e:
         logger.error(f"Full medical indexing error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _index_inline(pipeline: ETLPipeline, models, limit, incremental, resume) -> IndexMedicalResponse:
+    """Run the indexing in the API process (opt-in, competes with chat traffic)"""
+    results = await pipeline.run_full_indexing(
+        models=models,
+        limit=limit,
+        incremental=incremental,
+        resume=resume
+    )
+    
+    total_records = sum(r['records_indexed'] for r in results.values())
+    total_chunks = sum(r['chunks_created'] for r in results.values())
+    
+    logger.info(f"Indexing complete: {total_records} records, {total_chunks} chunks")
+    
+    return IndexMedicalResponse(
+        status="success",
+        results=results,
+        total_records=total_records,
+        total_chunks=total_chunks
+    )
+
 @router.post("/sync")
 async def sync_medical_data(
-    background_tasks: BackgroundTasks,
-    pipeline: ETLPipeline = Depends(get_etl_pipeline)
+    queue: ETLJobQueue = Depends(get_job_queue)
 ):
     """
     Trigger an auto-sync in the background.
     Incrementally pulls latest medical records from Odoo.
-    Returns immediately while processing continues in background.
+    Returns immediately; the sync runs as a job in the ETL worker process.
     """
     try:
         logger.info("Scheduling background auto-sync...")
         
-        # Add the indexing task to background pool
-        background_tasks.add_task(
-            pipeline.run_full_indexing,
+        job = await queue.enqueue(
             models=['wk.appointment', 'prescription.order.knk'],
             incremental=True
         )
         
         return {
             "status": "success",
-            "message": "Auto-sync started in the background"
+            "message": "Auto-sync queued for the ETL worker",
+            "job_id": job['id']
         }
         
     except Exception as e:
@@ -141,10 +166,140 @@ async def index_status(pipeline: ETLPipeline = Depends(get_etl_pipeline)):
         return IndexStatusResponse(
             index_stats=status.get('index_stats', {}),
             etl_metadata=status.get('etl_metadata', {}),
+            checkpoints=status.get('checkpoints', {}),
             total_indexed_records=total_records,
-            total_chunks=total_chunks
+            total_chunks=total_chunks,
+            index_version=status.get('index_version', '')
         )
         
     except Exception as e:
         logger.error(f"Status check error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/jobs", response_model=ETLJobResponse)
+async def enqueue_job(
+    request: ETLJobRequest,
+    queue: ETLJobQueue = Depends(get_job_queue)
+):
+    """
+    Enqueue an indexing job for the ETL worker process
+    
+    - **models**: List of Odoo models to index
+    - **incremental**: Only index new/modified records
+    - **limit**: Max records per model
+    - **resume**: Continue interrupted runs from their last committed page
+    """
+    try:
+        job = await queue.enqueue(
+            models=request.models,
+            incremental=request.incremental,
+            limit=request.limit,
+            resume=request.resume
+        )
+        return ETLJobResponse(**job)
+        
+    except Exception as e:
+        logger.error(f"Job enqueue error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/jobs", response_model=List[ETLJobResponse])
+async def list_jobs(
+    limit: int = 20,
+    queue: ETLJobQueue = Depends(get_job_queue)
+):
+    """List the most recent indexing jobs"""
+    try:
+        jobs = await queue.list_jobs(limit=limit)
+        return [ETLJobResponse(**job) for job in jobs]
+        
+    except Exception as e:
+        logger.error(f"Job list error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/jobs/{job_id}", response_model=ETLJobResponse)
+async def get_job(
+    job_id: int,
+    queue: ETLJobQueue = Depends(get_job_queue)
+):
+    """
+    Poll job progress
+    
+    Returns records/chunks indexed so far, throughput (per second) and ETA
+    """
+    job = await queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return ETLJobResponse(**job)
+
+@router.post("/jobs/{job_id}/cancel", response_model=ETLJobResponse)
+async def cancel_job(
+    job_id: int,
+    queue: ETLJobQueue = Depends(get_job_queue)
+):
+    """
+    Cancel a job. Queued jobs are dropped; running jobs stop after the
+    current page and can later be resumed from their checkpoint.
+    """
+    job = await queue.request_cancel(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return ETLJobResponse(**job)
+
+@router.post("/ingest", response_model=ETLJobResponse)
+async def ingest_records(
+    request: IngestRequest,
+    queue: ETLJobQueue = Depends(get_job_queue)
+):
+    """
+    Push-based ingestion of changed Odoo records
+    
+    Called by the Odoo outbox dispatcher with the IDs of created/modified
+    records. Only those records are (re)indexed by the ETL worker, without
+    scanning the whole model for unsynced records.
+    
+    - **odoo_model**: Odoo model of the changed records
+    - **res_ids**: IDs of the changed records
+    """
+    if request.odoo_model not in FETCH_ENDPOINTS:
+        raise HTTPException(status_code=400, detail=f"Unsupported model: {request.odoo_model}")
+    if not request.res_ids:
+        raise HTTPException(status_code=400, detail="res_ids must not be empty")
+    
+    try:
+        job = await queue.enqueue(
+            models=[request.odoo_model],
+            res_ids=sorted(set(request.res_ids))
+        )
+        return ETLJobResponse(**job)
+        
+    except Exception as e:
+        logger.error(f"Ingest enqueue error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/attachments", response_model=AttachmentIngestResponse)
+async def ingest_attachment(
+    request: AttachmentIngestRequest,
+    pipeline: ETLPipeline = Depends(get_etl_pipeline)
+):
+    """
+    Chunk, embed and index the extracted text of a chat attachment
+    
+    Stored under odoo_model 'ir.attachment' (linked to the patient when
+    patient_seq is given); earlier chunks of the attachment are replaced.
+    Retrieve them with POST /rag/search-attachments.
+    """
+    if not request.text.strip():
+        raise HTTPException(status_code=400, detail="text must not be empty")
+    
+    try:
+        attachment = request.model_dump(exclude={'attachment_id'})
+        attachment['id'] = request.attachment_id
+        result = await pipeline.run_attachment_indexing([attachment])
+        return AttachmentIngestResponse(
+            attachment_id=request.attachment_id,
+            chunks_created=result['chunks_created']
+        )
+        
+    except Exception as e:
+        logger.error(f"Attachment ingest error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -4,8 +4,12 @@ API Router for RAG endpoints
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.database import get_db
-from app.models.schemas import QueryRequest, ChatRequest, RAGQueryResponse
-from app.services.rag_service import RAGService
+from app.models.schemas import (
+    QueryRequest, ChatRequest, ChatTurnRequest, ChatJobRequest, ChatJobResponse, PatientQueryRequest,
+    PrescriptionQueryRequest, RAGQueryResponse, AttachmentSearchRequest, AttachmentSearchResponse
+)
+from app.services.rag_service import RAGService, PATIENT_SYSTEM_INSTRUCTION
+from app.services.chat_job_service import ChatJobService
 from app.services.embedding_service import EmbeddingService
 from app.services.llm_service import LLMService
 import logging
@@ -17,6 +21,7 @@ router = APIRouter(prefix="/rag", tags=["RAG"])
 embedding_service: EmbeddingService = None
 llm_service: LLMService = None
 rag_service: RAGService = None
+chat_jobs: ChatJobService = None
 
 async def get_rag_service() -> RAGService:
     """Dependency to get RAG service"""
@@ -45,16 +50,7 @@ async def query_rag(
         # If filtering by patient, strictly confine LLM to their history
         system_instruction = None
         if metadata_filter:
-            system_instruction = (
-                "You are a medical AI assistant tailored to analyze a specific patient's context. "
-                "The provided context contains the known medical history for this patient. "
-                "If the user asks about a symptom or condition that is NOT explicitly mentioned "
-                "in the records, DO NOT simply say it's not present. Instead, analyze the patient's "
-                "existing medical history (e.g., past diseases, medications, chief complaints like heart issues) "
-                "and provide medical guidance on how the new symptom might be related to their known underlying conditions. "
-                "Offer plausible connections based on medical knowledge and strongly advise seeking immediate care "
-                "if their history warrants it."
-            )
+            system_instruction = PATIENT_SYSTEM_INSTRUCTION
         
         result = await rag.query(
             prompt=request.prompt,
@@ -70,6 +66,99 @@ async def query_rag(
         logger.error(f"Query error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/query-patient", response_model=RAGQueryResponse)
+async def query_patient(
+    request: PatientQueryRequest,
+    session: AsyncSession = Depends(get_db),
+    rag: RAGService = Depends(get_rag_service)
+):
+    """
+    Query a patient's medical history
+    
+    Answers from the patient's precomputed summary (active medications,
+    diagnoses, latest vitals), adding the most relevant chunks for
+    questions the summary does not cover.
+    
+    - **patient_seq**: Patient ID
+    - **prompt**: Natural language question about the patient
+    - **limit**: Max chunks retrieved in addition to the summary
+    """
+    try:
+        result = await rag.query_patient(
+            prompt=request.prompt,
+            patient_seq=request.patient_seq,
+            session=session,
+            limit=request.limit,
+            system_instruction=PATIENT_SYSTEM_INSTRUCTION
+        )
+        
+        return RAGQueryResponse(**result)
+        
+    except Exception as e:
+        logger.error(f"Patient query error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/query-prescriptions", response_model=RAGQueryResponse)
+async def query_prescriptions(
+    request: PrescriptionQueryRequest,
+    session: AsyncSession = Depends(get_db),
+    rag: RAGService = Depends(get_rag_service)
+):
+    """
+    Search prescriptions with structured filters
+    
+    Filters are applied on indexed columns before similarity ranking.
+    
+    - **prompt**: Natural language query
+    - **diagnosis_code**: Optional ICD code the prescription must carry
+    - **physician_id**: Optional physician Odoo ID
+    - **date_from** / **date_to**: Optional prescription date range
+    - **medication**: Optional medication name (substring match)
+    """
+    try:
+        result = await rag.query_prescriptions(
+            prompt=request.prompt,
+            session=session,
+            limit=request.limit,
+            diagnosis_code=request.diagnosis_code,
+            physician_id=request.physician_id,
+            date_from=request.date_from,
+            date_to=request.date_to,
+            medication=request.medication
+        )
+        
+        return RAGQueryResponse(**result)
+        
+    except Exception as e:
+        logger.error(f"Prescription query error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/search-attachments", response_model=AttachmentSearchResponse)
+async def search_attachments(
+    request: AttachmentSearchRequest,
+    session: AsyncSession = Depends(get_db),
+    rag: RAGService = Depends(get_rag_service)
+):
+    """
+    Retrieve the most relevant chunks of indexed chat attachments (no LLM call)
+    
+    - **prompt**: Natural language question
+    - **attachment_ids**: Attachments indexed through /etl/attachments
+    - **limit**: Maximum number of chunks
+    """
+    try:
+        chunks = await rag.search_attachments(
+            prompt=request.prompt,
+            attachment_ids=request.attachment_ids,
+            session=session,
+            limit=request.limit
+        )
+        return AttachmentSearchResponse(chunks=chunks)
+        
+    except Exception as e:
+        logger.error(f"Attachment search error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.post("/chat", response_model=RAGQueryResponse)
 async def chat_rag(
     request: ChatRequest,
@@ -83,26 +172,11 @@ async def chat_rag(
     - **session_id**: Unique identifier string for conversation history
     - **patient_seq**: Optional patient ID to restrict context to that patient
     - **reset**: If True, wipes the memory context for the provided session_id
+    
+    Conversation history is stored server-side, so clients only send the new message.
     """
     try:
-        # Build metadata filter for patient-specific queries
-        metadata_filter = {}
-        if request.patient_seq:
-            metadata_filter['patient_seq'] = request.patient_seq
-            
-        # If filtering by patient, strictly confine LLM to their history
-        system_instruction = None
-        if metadata_filter:
-            system_instruction = (
-                "You are a medical AI assistant tailored to analyze a specific patient's context. "
-                "The provided context contains the known medical history for this patient. "
-                "If the user asks about a symptom or condition that is NOT explicitly mentioned "
-                "in the records, DO NOT simply say it's not present. Instead, analyze the patient's "
-                "existing medical history (e.g., past diseases, medications, chief complaints like heart issues) "
-                "and provide medical guidance on how the new symptom might be related to their known underlying conditions. "
-                "Offer plausible connections based on medical knowledge and strongly advise seeking immediate care "
-                "if their history warrants it."
-            )
+        metadata_filter, system_instruction = _chat_filters(request)
         
         result = await rag.chat(
             prompt=request.prompt,
@@ -110,7 +184,7 @@ async def chat_rag(
             session=session,
             reset=request.reset,
             limit=5,
-            metadata_filter=metadata_filter if metadata_filter else None,
+            metadata_filter=metadata_filter,
             system_instruction=system_instruction,
             chat_history=request.chat_history,
         )
@@ -121,6 +195,62 @@ async def chat_rag(
         logger.error(f"Chat query error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/chat/turns")
+async def record_chat_turn(
+    request: ChatTurnRequest,
+    session: AsyncSession = Depends(get_db),
+    rag: RAGService = Depends(get_rag_service)
+):
+    """
+    Record a turn the client answered without calling /rag/chat (e.g. from its
+    response cache) in the session history, so that follow-ups keep context
+    """
+    try:
+        message_count = await rag.record_chat_turn(
+            session_id=request.session_id,
+            prompt=request.prompt,
+            answer=request.response,
+            session=session,
+            patient_seq=request.patient_seq
+        )
+        return {'status': 'success', 'session_id': request.session_id, 'message_count': message_count}
+        
+    except Exception as e:
+        logger.error(f"Chat turn record error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _chat_filters(request: ChatRequest):
+    """Metadata filter and system instruction for a chat turn"""
+    # Build metadata filter for patient-specific queries
+    if not request.patient_seq:
+        return None, None
+    # If filtering by patient, strictly confine LLM to their history
+    return {'patient_seq': request.patient_seq}, PATIENT_SYSTEM_INSTRUCTION
+
+@router.post("/chat/jobs", response_model=ChatJobResponse, status_code=202)
+async def submit_chat_job(request: ChatJobRequest):
+    """
+    Asynchronous conversational RAG: returns a job id immediately and POSTs the
+    answer as a JSON-RPC call to callback_url once it is ready
+    
+    The callback params are job_id, job_ref, token (the callback_token), status
+    ('success' or 'error'), and response/metadata or message.
+    Jobs of one session_id run one at a time, in submission order.
+    """
+    if not chat_jobs:
+        raise HTTPException(status_code=503, detail="Chat job service not initialized")
+    metadata_filter, system_instruction = _chat_filters(request)
+    job = chat_jobs.submit(request, metadata_filter, system_instruction)
+    return ChatJobResponse(**job)
+
+@router.get("/chat/jobs/{job_id}", response_model=ChatJobResponse)
+async def get_chat_job(job_id: str):
+    """Status of a recent chat job (queued, running, delivered or failed)"""
+    job = chat_jobs.get(job_id) if chat_jobs else None
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Chat job {job_id} not found")
+    return ChatJobResponse(**job)
+
 from typing import Optional
 
 @router.get("/patient-data")
@@ -9,6 +9,17 @@ from sqlalchemy.ext.asyncio import AsyncEngine
 logger = logging.getLogger(__name__)
 
 
+async def _run_once(conn, name: str, sql: str):
+    """Run a one-off data migration unless schema_migrations records it as applied"""
+    result = await conn.execute(
+        text("INSERT INTO schema_migrations (name) VALUES (:name) ON CONFLICT (name) DO NOTHING RETURNING name"),
+        {'name': name}
+    )
+    if result.fetchone():
+        await conn.execute(text(sql))
+        logger.info(f"Migration {name} applied")
+
+
 async def init_database(engine: AsyncEngine):
     """
     Initialize database with required extensions and tables.
@@ -21,6 +32,14 @@ async def init_database(engine: AsyncEngine):
         await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
         logger.info("pgvector extension ready")
         
+        # Create schema migrations table (one-off data migrations already applied)
+        await conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                name VARCHAR(255) PRIMARY KEY,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """))
+        
         # Create medical_rag_index table (unified vector storage)
         await conn.execute(text("""
             CREATE TABLE IF NOT EXISTS medical_rag_index (
@@ -38,6 +57,49 @@ async def init_database(engine: AsyncEngine):
         """))
         logger.info("medical_rag_index table ready")
         
+        # Promoted prescription filter columns (populated by VectorLoader from metadata)
+        await conn.execute(text("""
+            ALTER TABLE medical_rag_index
+                ADD COLUMN IF NOT EXISTS prescription_date DATE,
+                ADD COLUMN IF NOT EXISTS physician_id INTEGER,
+                ADD COLUMN IF NOT EXISTS diagnosis_codes TEXT[]
+        """))
+        # Backfill rows indexed before the columns existed (once, not on every startup)
+        await _run_once(conn, 'backfill_prescription_filter_columns', """
+            UPDATE medical_rag_index SET
+                prescription_date = CASE
+                    WHEN metadata->>'prescription_date' ~ '^\\d{4}-\\d{2}-\\d{2}'
+                    THEN substring(metadata->>'prescription_date' from 1 for 10)::date
+                END,
+                physician_id = CASE
+                    WHEN metadata->>'physician_id' ~ '^\\d+$' THEN (metadata->>'physician_id')::integer
+                END,
+                diagnosis_codes = CASE
+                    WHEN jsonb_typeof(metadata->'diagnosis_codes') = 'array'
+                    THEN ARRAY(SELECT upper(jsonb_array_elements_text(metadata->'diagnosis_codes')))
+                    ELSE '{}'
+                END
+            WHERE odoo_model = 'prescription.order.knk' AND diagnosis_codes IS NULL
+        """)
+        await conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS medical_rag_index_prescription_date_idx
+            ON medical_rag_index (odoo_model, prescription_date)
+        """))
+        await conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS medical_rag_index_physician_idx
+            ON medical_rag_index (physician_id)
+        """))
+        await conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS medical_rag_index_diagnosis_codes_idx
+            ON medical_rag_index USING gin (diagnosis_codes)
+        """))
+        # Patient lookups (summaries, raw records) filter on the patient_seq metadata key
+        await conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS medical_rag_index_patient_seq_idx
+            ON medical_rag_index ((metadata->>'patient_seq'))
+        """))
+        logger.info("Prescription filter columns ready")
+        
         # Create IVFFlat index for fast similarity search
         # Only create if enough rows exist (IVFFlat needs data)
         row_count = await conn.execute(text(
@@ -60,6 +122,23 @@ async def init_database(engine: AsyncEngine):
             """))
             logger.info("HNSW index ready")
         
+        # Create per-patient summary table (maintained by app.etl.patient_summary)
+        await conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS patient_summaries (
+                patient_seq VARCHAR(255) PRIMARY KEY,
+                patient_id INTEGER,
+                prescription_count INTEGER DEFAULT 0,
+                latest_prescription_id INTEGER,
+                latest_prescription_date DATE,
+                latest_vitals JSONB DEFAULT '{}',
+                active_medications JSONB DEFAULT '[]',
+                diagnoses JSONB DEFAULT '[]',
+                summary_text TEXT,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """))
+        logger.info("patient_summaries table ready")
+        
         # Create ETL metadata table
         await conn.execute(text("""
             CREATE TABLE IF NOT EXISTS etl_metadata (
@@ -72,5 +151,92 @@ async def init_database(engine: AsyncEngine):
             )
         """))
         logger.info("etl_metadata table ready")
-    
+
+        # Create ETL checkpoint table (per-page progress of the last run per model)
+        await conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS etl_checkpoints (
+                odoo_model VARCHAR(255) PRIMARY KEY,
+                status VARCHAR(32) NOT NULL DEFAULT 'running',
+                last_res_id INTEGER,
+                pages_committed INTEGER DEFAULT 0,
+                records_indexed INTEGER DEFAULT 0,
+                chunks_created INTEGER DEFAULT 0,
+                last_write_date TIMESTAMP,
+                started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """))
+        logger.info("etl_checkpoints table ready")
+
+        # Create ETL job queue table (consumed by the app.etl.worker process)
+        await conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS etl_jobs (
+                id SERIAL PRIMARY KEY,
+                models JSONB NOT NULL DEFAULT '[]',
+                res_ids JSONB,
+                incremental BOOLEAN DEFAULT TRUE,
+                record_limit INTEGER,
+                resume BOOLEAN DEFAULT FALSE,
+                status VARCHAR(32) NOT NULL DEFAULT 'queued',
+                cancel_requested BOOLEAN DEFAULT FALSE,
+                worker_id VARCHAR(255),
+                current_model VARCHAR(255),
+                records_indexed INTEGER DEFAULT 0,
+                chunks_created INTEGER DEFAULT 0,
+                total_records INTEGER,
+                result JSONB,
+                error TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                started_at TIMESTAMP,
+                finished_at TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """))
+        await conn.execute(text(
+            "ALTER TABLE etl_jobs ADD COLUMN IF NOT EXISTS res_ids JSONB"
+        ))
+        await conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS etl_jobs_status_idx ON etl_jobs (status, id)
+        """))
+        # Prescriptions indexed before physician_id / diagnosis_codes were added to their
+        # metadata keep NULL filter columns after the backfill above: queue one full reindex
+        await _run_once(conn, 'reindex_prescriptions_for_filter_columns', """
+            INSERT INTO etl_jobs (models, incremental, resume, status, created_at, updated_at)
+            SELECT CAST('["prescription.order.knk"]' AS jsonb), FALSE, FALSE, 'queued', now(), now()
+            WHERE EXISTS (
+                SELECT 1 FROM medical_rag_index
+                WHERE odoo_model = 'prescription.order.knk' AND metadata->>'physician_id' IS NULL
+            )
+        """)
+        logger.info("etl_jobs table ready")
+
+        # Create chat history tables (conversation state owned by RAGService.chat)
+        await conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS chat_sessions (
+                session_id VARCHAR(255) PRIMARY KEY,
+                patient_seq VARCHAR(255),
+                summary TEXT,
+                message_count INTEGER DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """))
+        await conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS chat_sessions_updated_at_idx ON chat_sessions (updated_at)
+        """))
+        await conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS chat_messages (
+                id BIGSERIAL PRIMARY KEY,
+                session_id VARCHAR(255) NOT NULL REFERENCES chat_sessions (session_id) ON DELETE CASCADE,
+                role VARCHAR(16) NOT NULL,
+                content TEXT NOT NULL,
+                token_count INTEGER DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """))
+        await conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS chat_messages_session_idx ON chat_messages (session_id, id)
+        """))
+        logger.info("chat history tables ready")
+
     logger.info("Database initialization complete")
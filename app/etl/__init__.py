@@ -4,6 +4,8 @@ from .data_extractor import OdooDataExtractor
 from .data_transformer import MedicalDataTransformer
 from .embedding_generator import MedicalEmbeddingGenerator
 from .vector_loader import VectorLoader
+from .job_queue import ETLJobQueue
+from .patient_summary import PatientSummaryBuilder
 
 __all__ = [
     'ODOO_MODEL_MAPPING',
@@ -11,4 +13,6 @@ __all__ = [
     'MedicalDataTransformer',
     'MedicalEmbeddingGenerator',
     'VectorLoader',
+    'ETLJobQueue',
+    'PatientSummaryBuilder',
 ]
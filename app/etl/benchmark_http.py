@@ -0,0 +1,66 @@
+"""
+HTTP Client Benchmark
+Measures per-call overhead of Odoo API calls with a new aiohttp session per
+call versus the extractor's pooled session, using the /api/rag/ping endpoint.
+
+Run with: python -m app.etl.benchmark_http --calls 200
+"""
+import time
+import asyncio
+import argparse
+
+import aiohttp
+
+from .data_extractor import OdooDataExtractor
+
+PING_ENDPOINT = "/api/rag/ping"
+
+
+async def call_with_new_session(extractor: OdooDataExtractor) -> dict:
+    """One call the way _call_odoo_api used to work: new session, new connection"""
+    config = await extractor._get_odoo_config()
+    payload = {"jsonrpc": "2.0", "method": "call", "params": {}}
+    async with aiohttp.ClientSession(headers={"Authorization": f"Bearer {config['api_key']}"}) as session:
+        async with session.post(f"{config['url']}{PING_ENDPOINT}", json=payload, timeout=30) as response:
+            return await response.json()
+
+
+async def benchmark(calls: int, concurrency: int) -> dict:
+    """Return milliseconds per call for each client strategy"""
+    extractor = OdooDataExtractor(None, None)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def timed(call) -> float:
+        async def one():
+            async with semaphore:
+                await call()
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(calls)))
+        return (time.perf_counter() - start) / calls * 1000
+
+    try:
+        # Warm up DNS resolution and the pooled connections
+        await extractor._call_odoo_api(PING_ENDPOINT, {})
+        return {
+            'new session per call': await timed(lambda: call_with_new_session(extractor)),
+            'pooled session': await timed(lambda: extractor._call_odoo_api(PING_ENDPOINT, {})),
+        }
+    finally:
+        await extractor.close()
+
+
+async def main():
+    """CLI entry point"""
+    parser = argparse.ArgumentParser(description='Benchmark Odoo API client overhead')
+    parser.add_argument('--calls', type=int, default=200, help='Calls per strategy')
+    parser.add_argument('--concurrency', type=int, default=1, help='Concurrent in-flight calls')
+
+    args = parser.parse_args()
+
+    results = await benchmark(args.calls, args.concurrency)
+    for name, ms in results.items():
+        print(f"{name:<22} {ms:8.2f} ms/call")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,166 @@
+"""
+Transform Benchmark
+Measures per-record cost of MedicalDataTransformer on synthetic prescriptions
+shaped like the Odoo prescriptions/fetch_all payload, comparing the per-record
+API with the page-based batch API.
+
+Run with: python -m app.etl.benchmark_transform --records 2000 --workers 0 4
+"""
+import random
+import time
+import argparse
+import cProfile
+import pstats
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from .data_transformer import MedicalDataTransformer
+
+MEDICATIONS = ['Metformin', 'Amlodipine', 'Atorvastatin', 'Omeprazole', 'Paracetamol', 'Salbutamol', 'Insulin Glargine']
+DIAGNOSES = [('E11', 'Type 2 diabetes mellitus'), ('I10', 'Essential hypertension'), ('J45', 'Asthma'), ('K21', 'GERD')]
+INVESTIGATIONS = ['CBC', 'HbA1c', 'Lipid Profile', 'Serum Creatinine', 'Chest X-Ray', 'ECG']
+
+
+def make_prescription(res_id: int, rng: random.Random) -> Dict:
+    """
+    Build a synthetic prescription with the keys RagIntegrationController._assemble_prescription_data
+    emits for /api/rag/prescriptions/fetch_all (many2one values already resolved to names)
+    """
+    diagnoses = rng.sample(DIAGNOSES, rng.randint(1, 3))
+    return {
+        'id': res_id,
+        'name': f"RX{res_id:06d}",
+        'patient': f"Patient {res_id % 500}",
+        'patient_seq': f"2024{res_id % 500:05d}",
+        'patient_res_id': res_id % 500,
+        'physician': f"Dr. Physician {res_id % 20}",
+        'physician_res_id': res_id % 20,
+        'date': (datetime(2024, 1, 1, 9, 30) + timedelta(days=res_id % 365)).isoformat(),
+        'state': 'done',
+        'disease': None,
+        'description': 'Follow-up visit for chronic disease management.',
+        'vitals': {
+            'weight': round(rng.uniform(50, 110), 1),
+            'height': rng.randint(150, 190),
+            'bmi': round(rng.uniform(18, 35), 1),
+            'blood_pressure': f"{rng.randint(100, 160)}/{rng.randint(60, 100)}",
+            'pulse': rng.randint(55, 110),
+            'respiratory_rate': rng.randint(12, 24),
+            'temperature': round(rng.uniform(36.0, 39.0), 1),
+            'spo2': rng.randint(90, 100),
+            'rbs': rng.randint(80, 250),
+        },
+        'clinical_scores': {
+            'pain_score': rng.randint(0, 10),
+            'dyspnea': None,
+            'cardiac_rythm': None,
+            'nihss': None,
+            'motor_power': None,
+            'pupil_reaction': None,
+            'pupil_reaction_right': None,
+            'glassgow_coma_scale': None,
+        },
+        'status_updates': {
+            'symptom_status': 'improving',
+            'medication_adherence': 'good',
+            'performance_status_update': None,
+            'counseling_behavioral_response': None,
+            'side_effects': None,
+        },
+        'medications': [
+            {
+                'name': rng.choice(MEDICATIONS),
+                'quantity': float(rng.randint(1, 60)),
+                'days': float(rng.randint(5, 90)),
+                'instruction': 'Take after meals' if rng.random() < 0.3 else None,
+            }
+            for _ in range(rng.randint(2, 12))
+        ],
+        'diagnoses': [{'name': name, 'disease_code': code} for code, name in diagnoses],
+        'complaints': [{'name': 'Fatigue', 'period': '2 weeks', 'location': ''}],
+        'signs': [],
+        'investigations': [{'name': name} for name in rng.sample(INVESTIGATIONS, 3)],
+        'investigation_result': None,
+        'procedures': [],
+        'procedure_result': None,
+        'physical_examinations': {
+            'general': 'Alert, oriented', 'heent': None, 'cvs': 'S1 S2 normal', 'respiratory': 'Clear',
+            'abdomen': None, 'msk': None, 'cns': None, 'boards': [],
+        },
+        'gcs_scores': [],
+        'bmi_records': [],
+        'exercises': [],
+        'ortho_items': [],
+        'old_history': [],
+        'medical_history': [{'name': 'Hypertension since 2015', 'date': '2015-03-01', 'medication': 'Amlodipine'}],
+        'past_medical_history': [],
+        'medication_history': [],
+        'family_history': [],
+        'social_history': [],
+        'patient_history': 'Known case of diabetes and hypertension. ' * rng.randint(1, 40),
+        'advice_notes': 'Low salt diet, regular walking',
+        'patient_details': None,
+        'followup_notes': None,
+        'additional_comments': None,
+        'next_visit_days': 30,
+        'write_date': '2024-06-01T10:00:00',
+    }
+
+
+def make_prescriptions(count: int, seed: int = 42) -> List[Dict]:
+    rng = random.Random(seed)
+    return [make_prescription(i + 1, rng) for i in range(count)]
+
+
+def benchmark(transformer: MedicalDataTransformer, records: List[Dict], page_size: int, workers: List[int]) -> Dict[str, float]:
+    """Return microseconds per record for each transform path"""
+    results = {}
+
+    start = time.perf_counter()
+    for record in records:
+        transformer.flatten_prescription(record)
+    results['per-record'] = (time.perf_counter() - start) / len(records) * 1e6
+
+    for worker_count in workers:
+        # Warm up the pool (process start-up and tokenizer load are one-off costs)
+        transformer.transform_batch('prescription.order.knk', records[:page_size], workers=worker_count)
+        start = time.perf_counter()
+        for i in range(0, len(records), page_size):
+            transformer.transform_batch('prescription.order.knk', records[i:i + page_size], workers=worker_count)
+        results[f"batch (workers={worker_count})"] = (time.perf_counter() - start) / len(records) * 1e6
+
+    return results
+
+
+def main():
+    """CLI entry point"""
+    parser = argparse.ArgumentParser(description='Benchmark prescription transformation')
+    parser.add_argument('--records', type=int, default=2000, help='Synthetic prescriptions to generate')
+    parser.add_argument('--page-size', type=int, default=500, help='Records per batch call')
+    parser.add_argument('--workers', type=int, nargs='+', default=[0], help='Process pool sizes to compare')
+    parser.add_argument('--profile', action='store_true', help='Print a cProfile breakdown of the batch path')
+
+    args = parser.parse_args()
+
+    records = make_prescriptions(args.records)
+    transformer = MedicalDataTransformer()
+    # Load the tokenizer outside the timed sections
+    transformer.count_tokens(['warm up'])
+
+    try:
+        for name, usec in benchmark(transformer, records, args.page_size, args.workers).items():
+            print(f"{name:<22} {usec:10.1f} us/record")
+
+        if args.profile:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            for i in range(0, len(records), args.page_size):
+                transformer.transform_batch('prescription.order.knk', records[i:i + args.page_size], workers=0)
+            profiler.disable()
+            pstats.Stats(profiler).sort_stats('cumulative').print_stats(15)
+    finally:
+        transformer.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -13,6 +13,42 @@ from .odoo_schema import ODOO_MODEL_MAPPING
 
 logger = logging.getLogger(__name__)
 
+# Bulk fetch endpoint and base domain per indexed model
+FETCH_ENDPOINTS = {
+    'wk.appointment': ("/api/rag/export", [('appoint_state', '!=', 'rejected')]),
+    'prescription.order.knk': ("/api/rag/prescriptions/fetch_all", [('state', '!=', 'cancelled')]),
+    'res.partner': ("/api/rag/export", [('partner_type', '=', 'patient')]),
+    'medical.disease': ("/api/rag/diseases/fetch_all", []),
+}
+
+# Columns read through /api/rag/export: record key -> Odoo field (or many2one path)
+EXPORT_PROJECTIONS = {
+    'wk.appointment': {
+        'appointment_number': 'name',
+        'appoint_date': 'appoint_date',
+        'appoint_state': 'appoint_state',
+        'patient_name': 'customer.name',
+        'patient_id': 'customer.seq',
+        'patient_res_id': 'customer',
+        'doctor_name': 'appoint_person_id.name',
+        'doctor_res_id': 'appoint_person_id',
+        'description': 'description',
+        'amount_total': 'amount_total',
+        'write_date': 'write_date',
+    },
+    'res.partner': {
+        'name': 'name',
+        'patient_seq': 'seq',
+        'date_of_birth': 'date_of_birth',
+        'age': 'age',
+        'gender': 'gender',
+        'phone': 'phone',
+        'email': 'email',
+        'city': 'city',
+        'write_date': 'write_date',
+    },
+}
+
 
 class OdooDataExtractor:
     """Extract data from Odoo medical models"""
@@ -21,6 +57,7 @@ class OdooDataExtractor:
         self.engine = odoo_engine  # This will be unused for extraction now
         self.vector_engine = vector_engine
         self._odoo_config = None
+        self._session = None
 
     async def _get_odoo_config(self) -> Dict:
         """Fetch Odoo URL and API Key from env or config file"""
@@ -46,12 +83,36 @@ class OdooDataExtractor:
         self._odoo_config = {"url": odoo_url, "api_key": api_key}
         return self._odoo_config
 
+    async def _get_session(self):
+        """
+        Shared HTTP session for all Odoo calls of this extractor, so connections
+        (and TLS sessions) are reused instead of set up per call
+        """
+        if self._session is None or self._session.closed:
+            import aiohttp
+            config = await self._get_odoo_config()
+            connector = aiohttp.TCPConnector(
+                limit=int(os.getenv('ODOO_HTTP_POOL_SIZE', '10')),
+                keepalive_timeout=60
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers={"Authorization": f"Bearer {config['api_key']}"},
+                timeout=aiohttp.ClientTimeout(total=30)
+            )
+        return self._session
+
+    async def close(self):
+        """Close the pooled HTTP session"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
     async def _call_odoo_api(self, endpoint_suffix: str, params: Dict) -> Dict:
         """Invoke Odoo JSON-RPC API"""
         config = await self._get_odoo_config()
-        import aiohttp
+        session = await self._get_session()
         
-        headers = {"Authorization": f"Bearer {config['api_key']}"}
         url = f"{config['url']}{endpoint_suffix}"
         
         payload = {
@@ -60,19 +121,30 @@ class OdooDataExtractor:
             "params": params
         }
         
-        async with aiohttp.ClientSession(headers=headers) as session:
-            async with session.post(url, json=payload, timeout=30) as response:
-                if response.status != 200:
-                    logger.error(f"Odoo API HTTP error {response.status} for {endpoint_suffix}")
-                    return {"status": "error", "message": f"HTTP {response.status}"}
-                
-                resp_data = await response.json()
-                if "result" in resp_data:
-                    return resp_data["result"]
-                elif "error" in resp_data:
-                    logger.error(f"Odoo API Error for {endpoint_suffix}: {resp_data['error']}")
-                    return {"status": "error", "message": resp_data["error"]}
-                return {"status": "error", "message": "Unknown malformed response"}
+        async with session.post(url, json=payload) as response:
+            if response.status != 200:
+                logger.error(f"Odoo API HTTP error {response.status} for {endpoint_suffix}")
+                return {"status": "error", "message": f"HTTP {response.status}"}
+            
+            resp_data = await response.json()
+            if "result" in resp_data:
+                return resp_data["result"]
+            elif "error" in resp_data:
+                logger.error(f"Odoo API Error for {endpoint_suffix}: {resp_data['error']}")
+                return {"status": "error", "message": resp_data["error"]}
+            return {"status": "error", "message": "Unknown malformed response"}
+
+    def _result_data(self, res: Dict, action: str) -> List:
+        """
+        Data of an Odoo API result
+
+        Raises:
+            RuntimeError: If the call failed, so that an Odoo error is never
+                mistaken for an empty page (the end of the data)
+        """
+        if res.get("status") != "success":
+            raise RuntimeError(f"Failed to {action}: {res.get('message')}")
+        return res.get("data", [])
 
     async def _get_ids(self, model: str, incremental: bool = True, limit: Optional[int] = None) -> List[int]:
         """Fetch record IDs via API list_ids"""
@@ -95,26 +167,42 @@ class OdooDataExtractor:
         }
         
         res = await self._call_odoo_api("/api/rag/list_ids", params)
+        return self._result_data(res, f"list {model} IDs")
+
+    async def count_records(self, model: str, incremental: bool = True) -> Optional[int]:
+        """Count the records an extraction would return, via API count (used for ETA)"""
+        domain = []
+        if incremental and model in ['wk.appointment', 'prescription.order.knk']:
+            domain.append(('is_rag_synced', '!=', True))
+
+        if model == 'wk.appointment':
+            domain.append(('appoint_state', '!=', 'rejected'))
+        elif model == 'prescription.order.knk':
+            domain.append(('state', '!=', 'cancelled'))
+        elif model == 'res.partner':
+            domain = await self._patient_domain(incremental)
+
+        res = await self._call_odoo_api("/api/rag/count", {"model": model, "domain": domain})
         if res.get("status") == "success":
-            return res.get("data", [])
-        return []
+            return res.get("count")
+        return None
 
     async def extract_appointments(
         self, 
         limit: Optional[int] = None,
         since_date: Optional[datetime] = None,
-        incremental: bool = True
+        incremental: bool = True,
+        after_id: Optional[int] = None
     ) -> List[Dict]:
-        """Extract appointment data via Bulk API"""
+        """Extract appointment data via Bulk API, in ascending ID order after `after_id`"""
         domain = []
         if incremental:
             domain.append(('is_rag_synced', '!=', True))
         domain.append(('appoint_state', '!=', 'rejected'))
         
-        params = {"domain": domain, "limit": limit}
-        res = await self._call_odoo_api("/api/rag/appointments/fetch_all", params)
+        res = await self._export('wk.appointment', domain, limit=limit, after_id=after_id)
         
-        appointments = res.get("data", []) if res.get("status") == "success" else []
+        appointments = self._result_data(res, "extract wk.appointment")
         logger.info(f"Extracted {len(appointments)} appointments")
         return appointments
 
@@ -122,53 +210,127 @@ class OdooDataExtractor:
         self,
         limit: Optional[int] = None,
         since_date: Optional[datetime] = None,
-        incremental: bool = True
+        incremental: bool = True,
+        after_id: Optional[int] = None
     ) -> List[Dict]:
-        """Extract prescription data via Bulk API"""
+        """Extract prescription data via Bulk API, in ascending ID order after `after_id`"""
         domain = []
         if incremental:
             domain.append(('is_rag_synced', '!=', True))
         domain.append(('state', '!=', 'cancelled'))
+        if after_id:
+            domain.append(('id', '>', after_id))
         
-        params = {"domain": domain, "limit": limit}
+        params = {"domain": domain, "limit": limit, "order": "id asc"}
         res = await self._call_odoo_api("/api/rag/prescriptions/fetch_all", params)
         
-        prescriptions = res.get("data", []) if res.get("status") == "success" else []
+        prescriptions = self._result_data(res, "extract prescription.order.knk")
         logger.info(f"Extracted {len(prescriptions)} prescriptions")
         return prescriptions
 
+    async def _patient_domain(self, incremental: bool = True) -> List:
+        """
+        Patients to extract. res.partner has no is_rag_synced flag, so an
+        incremental run takes the patients written since the last indexed one.
+        """
+        domain = [('partner_type', '=', 'patient')]
+        if incremental:
+            last_write_date = await self.get_last_indexed_date('res.partner')
+            if last_write_date:
+                domain.append(('write_date', '>', last_write_date.strftime('%Y-%m-%d %H:%M:%S.%f')))
+        return domain
+
     async def extract_patients(
         self,
         limit: Optional[int] = None,
         since_date: Optional[datetime] = None,
-        incremental: bool = True
+        incremental: bool = True,
+        after_id: Optional[int] = None
     ) -> List[Dict]:
-        """Extract patient data via Bulk API"""
-        domain = [('partner_type', '=', 'patient')]
-        if incremental:
-            domain.append(('is_rag_synced', '!=', True))
-            
-        params = {"domain": domain, "limit": limit}
-        res = await self._call_odoo_api("/api/rag/patients/fetch_all", params)
+        """Extract patient data via Bulk API, in ascending ID order after `after_id`"""
+        domain = await self._patient_domain(incremental)
+        
+        res = await self._export('res.partner', domain, limit=limit, after_id=after_id)
         
-        patients = res.get("data", []) if res.get("status") == "success" else []
+        patients = self._result_data(res, "extract res.partner")
         logger.info(f"Extracted {len(patients)} patients")
         return patients
 
     async def extract_diseases(
         self,
         limit: Optional[int] = None,
-        incremental: bool = False
+        incremental: bool = False,
+        after_id: Optional[int] = None
     ) -> List[Dict]:
-        """Extract disease data via Bulk API"""
+        """Extract disease data via Bulk API, in ascending ID order after `after_id`"""
         domain = []
-        params = {"domain": domain, "limit": limit}
+        if after_id:
+            domain.append(('id', '>', after_id))
+        params = {"domain": domain, "limit": limit, "order": "id asc"}
         res = await self._call_odoo_api("/api/rag/diseases/fetch_all", params)
         
-        diseases = res.get("data", []) if res.get("status") == "success" else []
+        diseases = self._result_data(res, "extract medical.disease")
         logger.info(f"Extracted {len(diseases)} diseases")
         return diseases
     
+    async def _export(
+        self,
+        odoo_model: str,
+        domain: list,
+        limit: Optional[int] = None,
+        after_id: Optional[int] = None
+    ) -> Dict:
+        """
+        Read one page of a model's EXPORT_PROJECTIONS columns via /api/rag/export
+        and return it as {"status", "data": [record dicts]} like the fetch_all endpoints
+        """
+        projection = EXPORT_PROJECTIONS[odoo_model]
+        params = {
+            "model": odoo_model,
+            "fields": list(projection.values()),
+            "domain": domain,
+            "limit": limit,
+            "after_id": after_id
+        }
+        res = await self._call_odoo_api("/api/rag/export", params)
+        if res.get("status") != "success":
+            return res
+        
+        # Rows come back as value lists aligned with res["fields"] ('id' first)
+        keys = ['id'] + list(projection)
+        position = {field: i for i, field in enumerate(res["fields"])}
+        columns = [0] + [position[field] for field in projection.values()]
+        data = [{key: row[i] for key, i in zip(keys, columns)} for row in res.get("rows", [])]
+        return {"status": "success", "data": data}
+
+    async def extract_by_ids(self, odoo_model: str, res_ids: List[int]) -> List[Dict]:
+        """
+        Extract only the given records via Bulk API (push-based ingestion).
+        Records filtered out by the model's base domain (e.g. cancelled) are not returned.
+        
+        Raises:
+            RuntimeError: If the Odoo API call fails, so callers never mistake
+                an error for deleted records
+        """
+        if odoo_model not in FETCH_ENDPOINTS:
+            raise ValueError(f"Unsupported model for ingestion: {odoo_model}")
+        if not res_ids:
+            return []
+        
+        endpoint, base_domain = FETCH_ENDPOINTS[odoo_model]
+        domain = list(base_domain) + [('id', 'in', list(res_ids))]
+        
+        if odoo_model in EXPORT_PROJECTIONS:
+            res = await self._export(odoo_model, domain)
+        else:
+            res = await self._call_odoo_api(endpoint, {"domain": domain, "limit": None, "order": "id asc"})
+        if res.get("status") != "success":
+            raise RuntimeError(f"Failed to extract {odoo_model} {res_ids}: {res.get('message')}")
+        
+        records = res.get("data", [])
+        logger.info(f"Extracted {len(records)}/{len(res_ids)} {odoo_model} records by ID")
+        return records
+
     # The following helper methods are now handled by the Odoo Controller API
     # and are kept here as empty stubs or removed to avoid direct SQL usage.
 
@@ -219,6 +381,96 @@ class OdooDataExtractor:
                 'total_chunks': total_chunks
             })
 
+    async def get_checkpoint(self, model_name: str) -> Optional[Dict]:
+        """Get the page checkpoint of the last indexing run for a model"""
+        query = """
+        SELECT status, last_res_id, pages_committed, records_indexed,
+               chunks_created, last_write_date, started_at, updated_at
+        FROM etl_checkpoints
+        WHERE odoo_model = :model_name
+        """
+        async with self.vector_engine.connect() as conn:
+            result = await conn.execute(text(query), {'model_name': model_name})
+            row = result.fetchone()
+            if not row:
+                return None
+            return {
+                'status': row.status,
+                'last_res_id': row.last_res_id,
+                'pages_committed': row.pages_committed or 0,
+                'records_indexed': row.records_indexed or 0,
+                'chunks_created': row.chunks_created or 0,
+                'last_write_date': row.last_write_date,
+                'started_at': row.started_at,
+                'updated_at': row.updated_at
+            }
+
+    async def start_checkpoint(self, model_name: str):
+        """Reset the checkpoint for a model at the start of a fresh run"""
+        query = """
+        INSERT INTO etl_checkpoints
+            (odoo_model, status, last_res_id, pages_committed, records_indexed,
+             chunks_created, last_write_date, started_at, updated_at)
+        VALUES (:model_name, 'running', NULL, 0, 0, 0, NULL, :now, :now)
+        ON CONFLICT (odoo_model)
+        DO UPDATE SET
+            status = 'running',
+            last_res_id = NULL,
+            pages_committed = 0,
+            records_indexed = 0,
+            chunks_created = 0,
+            last_write_date = NULL,
+            started_at = :now,
+            updated_at = :now
+        """
+        async with self.vector_engine.begin() as conn:
+            await conn.execute(text(query), {'model_name': model_name, 'now': datetime.now()})
+
+    async def save_checkpoint(
+        self,
+        model_name: str,
+        last_res_id: int,
+        pages_committed: int,
+        records_indexed: int,
+        chunks_created: int,
+        last_write_date: Optional[datetime] = None
+    ):
+        """Record the last fully committed page of a running indexing pass"""
+        query = """
+        UPDATE etl_checkpoints SET
+            status = 'running',
+            last_res_id = :last_res_id,
+            pages_committed = :pages_committed,
+            records_indexed = :records_indexed,
+            chunks_created = :chunks_created,
+            last_write_date = :last_write_date,
+            updated_at = :now
+        WHERE odoo_model = :model_name
+        """
+        async with self.vector_engine.begin() as conn:
+            await conn.execute(text(query), {
+                'model_name': model_name,
+                'last_res_id': last_res_id,
+                'pages_committed': pages_committed,
+                'records_indexed': records_indexed,
+                'chunks_created': chunks_created,
+                'last_write_date': last_write_date,
+                'now': datetime.now()
+            })
+
+    async def set_checkpoint_status(self, model_name: str, status: str):
+        """Mark a checkpoint as 'completed' or 'failed'"""
+        query = """
+        UPDATE etl_checkpoints SET status = :status, updated_at = :now
+        WHERE odoo_model = :model_name
+        """
+        async with self.vector_engine.begin() as conn:
+            await conn.execute(text(query), {
+                'model_name': model_name,
+                'status': status,
+                'now': datetime.now()
+            })
+
     async def get_existing_odoo_ids(self, odoo_model: str) -> set:
         """Fetch all unique odoo_res_id values currently in the vector DB for a given model"""
         query = "SELECT DISTINCT odoo_res_id FROM medical_rag_index WHERE odoo_model = :model_name"
@@ -230,16 +482,26 @@ class OdooDataExtractor:
                     existing_ids.add(int(row[0]))
         return existing_ids
 
-    async def mark_records_as_synced(self, odoo_model: str, record_ids: List[int]) -> int:
-        """Mark records as synced in Odoo via API"""
-        if not record_ids:
-            return 0
-            
-        res = await self._call_odoo_api("/api/rag/mark_synced", {"model": odoo_model, "res_ids": record_ids})
+    async def mark_records_as_synced(self, odoo_model: str, records: List[Dict]) -> List[int]:
+        """
+        Mark extracted records as synced in Odoo via API, guarded by the
+        write_date each record had at extraction
+        
+        Returns:
+            IDs of records modified in Odoo since extraction; they stay unsynced
+            so the next incremental run picks them up again
+        """
+        if not records:
+            return []
+        
+        versions = [[r['id'], r.get('write_date') or None] for r in records]
+        res = await self._call_odoo_api("/api/rag/mark_synced", {"model": odoo_model, "versions": versions})
         if res.get("status") == "success":
-            count = res.get("count", len(record_ids))
-            logger.info(f"Marked {count} records as synced for {odoo_model}")
-            return count
+            changed_ids = res.get("changed_ids", [])
+            logger.info(f"Marked {res.get('count', len(records))} records as synced for {odoo_model}")
+            if changed_ids:
+                logger.info(f"{len(changed_ids)} {odoo_model} records changed during indexing: {changed_ids[:20]}")
+            return changed_ids
         else:
             logger.error(f"Failed to mark records as synced for {odoo_model}: {res.get('message')}")
-            return 0
+            return []
@@ -2,20 +2,175 @@
 Data Transformer for Medical Records
 Converts structured Odoo data into natural language text suitable for embedding
 """
-from typing import Dict, List, Tuple, Any
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import repeat
+from typing import Dict, List, Optional, Tuple, Any
 from datetime import datetime, date
 from decimal import Decimal
 import logging
 
 logger = logging.getLogger(__name__)
 
+# ClinicalBERT accepts 512 tokens including [CLS] and [SEP]
+MAX_MODEL_TOKENS = 512
+SPECIAL_TOKENS = 2
+
+# Section headers emitted by _build_prescription_text all start on a blank line
+SECTION_BOUNDARY = re.compile(r'\s*(?=\n\n)')
+
+# Physical examination fields and their labels, in display order
+EXAM_FIELDS = (
+    ('general', 'General'),
+    ('heent', 'HEENT'),
+    ('cvs', 'CVS'),
+    ('respiratory', 'Respiratory'),
+    ('abdomen', 'Abdomen'),
+    ('msk', 'Musculoskeletal'),
+    ('cns', 'CNS Screens'),
+)
+EXAM_BOARD_LINE = "\n  * {}: {}".format
+EXAM_LINE = "\n- {}: {}".format
+
+# Scalar vitals stored directly on the prescription, before and after blood pressure
+SCALAR_VITALS_PRE_BP = (
+    ('temperature', "\n- Temperature: {}".format),
+    ('spo2', "\n- SpO2: {}%".format),
+    ('rbs', "\n- Random Blood Sugar (RBS): {}".format),
+    ('v_weight', "\n- Weight (Scalar): {}".format),
+    ('v_height', "\n- Height (Scalar): {}".format),
+    ('v_bmi', "\n- BMI (Scalar): {}".format),
+)
+SCALAR_VITALS_POST_BP = (
+    ('v_pulse', "\n- Pulse (Scalar): {}".format),
+    ('v_respiratory_rate', "\n- Respiratory Rate (Scalar): {}".format),
+)
+
+# Values _sanitize_for_json returns unchanged (checked before the isinstance chain)
+JSON_SCALAR_TYPES = frozenset((str, int, float, bool))
+
+# Pages smaller than this per worker are transformed in-process
+MIN_RECORDS_PER_WORKER = 50
+
+# Raw related-data lists copied into prescription metadata
+PRESCRIPTION_LIST_FIELDS = (
+    'medications', 'diagnoses', 'complaints', 'investigations', 'vitals', 'signs',
+    'past_medical_history', 'medication_history', 'family_history', 'social_history',
+    'exercises', 'ortho', 'old_history', 'medical_history', 'advice_notes',
+    'physical_examinations', 'procedures', 'gcs_scores', 'bmi_records',
+)
+
+
+@lru_cache(maxsize=4)
+def get_tokenizer(model_name: str):
+    """Load (once per process) the tokenizer of the embedding model"""
+    from transformers import AutoTokenizer
+    logger.info(f"Loading tokenizer: {model_name}")
+    return AutoTokenizer.from_pretrained(model_name)
+
+
+def _transform_slice(transformer: 'MedicalDataTransformer', odoo_model: str, records: List[Dict]) -> List[Tuple[int, int, str, Dict]]:
+    """Process pool entry point for MedicalDataTransformer.transform_batch"""
+    return transformer._transform_records(odoo_model, records)
+
 
 class MedicalDataTransformer:
     """Transform structured medical data into natural language"""
     
-    def __init__(self, chunk_size: int = 800, chunk_overlap: int = 150):
-        self.chunk_size = chunk_size
-        self.chunk_overlap = chunk_overlap
+    def __init__(self, chunk_size: int = 480, chunk_overlap: int = 64, tokenizer_name: str = None):
+        """
+        Args:
+            chunk_size: Maximum tokens per chunk (capped to the model limit)
+            chunk_overlap: Tokens of trailing context repeated at the start of the next chunk
+            tokenizer_name: HuggingFace tokenizer used for counting. Defaults to the embedding model
+        """
+        self.chunk_size = min(chunk_size, MAX_MODEL_TOKENS - SPECIAL_TOKENS)
+        self.chunk_overlap = min(chunk_overlap, self.chunk_size // 2)
+        self.tokenizer_name = tokenizer_name or os.getenv('EMBEDDING_MODEL', 'emilyalsentzer/Bio_ClinicalBERT')
+        self._pool = None
+        self._pool_workers = 0
+    
+    @property
+    def tokenizer(self):
+        return get_tokenizer(self.tokenizer_name)
+    
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        """Count model tokens (without special tokens) for each text"""
+        if not texts:
+            return []
+        encoded = self.tokenizer(texts, add_special_tokens=False)['input_ids']
+        return [len(ids) for ids in encoded]
+    
+    def transform_batch(self, odoo_model: str, records: List[Dict], workers: int = None) -> List[Tuple[int, int, str, Dict]]:
+        """
+        Transform a page of Odoo records
+        
+        Args:
+            odoo_model: Odoo model of the records
+            records: Records from the extractor
+            workers: Processes to fan out across (defaults to ETL_TRANSFORM_WORKERS;
+                0 or 1 transforms in-process)
+            
+        Returns:
+            List of (res_id, chunk_index, text, metadata) tuples in record order
+        """
+        if workers is None:
+            workers = int(os.getenv('ETL_TRANSFORM_WORKERS', '0'))
+        
+        if workers > 1 and len(records) >= workers * MIN_RECORDS_PER_WORKER:
+            size = -(-len(records) // workers)
+            slices = [records[i:i + size] for i in range(0, len(records), size)]
+            pool = self._get_pool(workers)
+            results = pool.map(_transform_slice, repeat(self), repeat(odoo_model), slices)
+            return [row for part in results for row in part]
+        
+        return self._transform_records(odoo_model, records)
+    
+    def _transform_records(self, odoo_model: str, records: List[Dict]) -> List[Tuple[int, int, str, Dict]]:
+        """Transform records in the current process"""
+        if odoo_model == 'prescription.order.knk':
+            return self._transform_prescriptions(records)
+        if odoo_model == 'ir.attachment':
+            return self._transform_attachments(records)
+        
+        if odoo_model == 'wk.appointment':
+            flatten = self.flatten_appointment
+        elif odoo_model == 'res.partner':
+            flatten = self.flatten_patient
+        elif odoo_model == 'medical.disease':
+            flatten = self.flatten_disease
+        else:
+            raise ValueError(f"Unknown model: {odoo_model}")
+        
+        results = []
+        for record in records:
+            text, metadata = flatten(record)
+            results.append((record['id'], 0, text, metadata))
+        return results
+    
+    def _get_pool(self, workers: int) -> ProcessPoolExecutor:
+        """Lazily create the transform process pool"""
+        if self._pool is None or self._pool_workers != workers:
+            self.close()
+            self._pool = ProcessPoolExecutor(max_workers=workers)
+            self._pool_workers = workers
+        return self._pool
+    
+    def close(self):
+        """Shut down the transform process pool, if any"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+            self._pool_workers = 0
+    
+    def __getstate__(self):
+        # The pool stays in the parent process
+        state = self.__dict__.copy()
+        state['_pool'] = None
+        state['_pool_workers'] = 0
+        return state
     
     def flatten_appointment(self, appointment: Dict) -> Tuple[str, Dict]:
         """
@@ -143,11 +298,14 @@ class MedicalDataTransformer:
         Returns:
             List of (flattened_text, metadata) tuples
         """
-        # Build comprehensive prescription text
-        full_text = self._build_prescription_text(prescription)
-        
-        # Create base metadata
-        base_metadata = {
+        return [
+            (text, metadata)
+            for _, _, text, metadata in self._transform_prescriptions([prescription])
+        ]
+    
+    def _prescription_metadata(self, prescription: Dict) -> Dict:
+        """Build (unsanitized) metadata shared by all chunks of a prescription"""
+        return {
             'odoo_model': 'prescription.order.knk',
             'odoo_res_id': prescription['id'],
             'patient_id': prescription.get('patient_res_id'),
@@ -161,27 +319,7 @@ class MedicalDataTransformer:
                                [d.get('secondary_diagnosis_name') for d in prescription.get('diagnoses', []) if d.get('secondary_diagnosis_name')],
             
             # Insert full related data lists directly into Metadata
-            'medications': prescription.get('medications', []),
-            'diagnoses': prescription.get('diagnoses', []),
-            'complaints': prescription.get('complaints', []),
-            'investigations': prescription.get('investigations', []),
-            'vitals': prescription.get('vitals', []),
-            'signs': prescription.get('signs', []),
-            'past_medical_history': prescription.get('past_medical_history', []),
-            'medication_history': prescription.get('medication_history', []),
-            'family_history': prescription.get('family_history', []),
-            'social_history': prescription.get('social_history', []),
-            'exercises': prescription.get('exercises', []),
-            'ortho': prescription.get('ortho', []),
-            'old_history': prescription.get('old_history', []),
-            'medical_history': prescription.get('medical_history', []),
-            'advice_notes': prescription.get('advice_notes', []),
-            
-            # Newly added 
-            'physical_examinations': prescription.get('physical_examinations', []),
-            'procedures': prescription.get('procedures', []),
-            'gcs_scores': prescription.get('gcs_scores', []),
-            'bmi_records': prescription.get('bmi_records', []),
+            **{field: prescription.get(field, []) for field in PRESCRIPTION_LIST_FIELDS},
             
             # Clinical Scalars
             'clinical_scalars': {
@@ -213,21 +351,58 @@ class MedicalDataTransformer:
             
             'indexed_at': datetime.now().isoformat()
         }
+    
+    def _transform_prescriptions(self, prescriptions: List[Dict]) -> List[Tuple[int, int, str, Dict]]:
+        """
+        Flatten and chunk a page of prescriptions
+
+        Token counts for the whole page come from one tokenizer call, and each
+        prescription's metadata is sanitized once and shared by its chunks.
+        """
+        texts = [self._build_prescription_text(p) for p in prescriptions]
+        token_counts = self.count_tokens(texts)
         
-        # Check if chunking is needed (ClinicalBERT has 512 token limit ~400 words)
-        if len(full_text.split()) > 350:  # Conservative estimate
-            chunks = self._chunk_text(full_text)
-            results = []
+        results = []
+        for prescription, full_text, token_count in zip(prescriptions, texts, token_counts):
+            base_metadata = self._sanitize_for_json(self._prescription_metadata(prescription))
+            
+            # Check if chunking is needed (ClinicalBERT has a 512 token limit)
+            chunks = self._chunk_text(full_text) if token_count > self.chunk_size else [full_text]
             for idx, chunk in enumerate(chunks):
-                metadata = base_metadata.copy()
-                metadata['chunk_index'] = idx
-                metadata['total_chunks'] = len(chunks)
-                results.append((chunk, self._sanitize_for_json(metadata)))
-            return results
-        else:
-            base_metadata['chunk_index'] = 0
-            base_metadata['total_chunks'] = 1
-            return [(full_text, self._sanitize_for_json(base_metadata))]
+                metadata = dict(base_metadata, chunk_index=idx, total_chunks=len(chunks))
+                results.append((prescription['id'], idx, chunk, metadata))
+        return results
+    
+    def _transform_attachments(self, attachments: List[Dict]) -> List[Tuple[int, int, str, Dict]]:
+        """
+        Chunk the extracted text of chat attachments pushed by Odoo
+
+        Every chunk starts with the document name so a retrieved excerpt stays
+        attributable; attachments without text produce no chunks.
+        """
+        results = []
+        for attachment in attachments:
+            body = (attachment.get('text') or '').strip()
+            if not body:
+                continue
+            header = f"Document: {attachment.get('name') or 'Attachment'}"
+            base_metadata = self._sanitize_for_json({
+                'odoo_model': 'ir.attachment',
+                'odoo_res_id': attachment['id'],
+                'attachment_name': attachment.get('name'),
+                'mimetype': attachment.get('mimetype'),
+                'checksum': attachment.get('checksum'),
+                'patient_seq': attachment.get('patient_seq'),
+                'channel_id': attachment.get('channel_id'),
+                'indexed_at': datetime.now().isoformat()
+            })
+            # The header is prepended to every chunk, so it comes out of the token budget
+            header_tokens = self.count_tokens([header])[0]
+            chunks = self._chunk_text(body, max(self.chunk_size - header_tokens, self.chunk_overlap + 1))
+            for idx, chunk in enumerate(chunks):
+                metadata = dict(base_metadata, chunk_index=idx, total_chunks=len(chunks))
+                results.append((attachment['id'], idx, f"{header}\n{chunk}", metadata))
+        return results
     
     def _build_prescription_text(self, prescription: Dict) -> str:
         """Build comprehensive prescription text"""
@@ -361,27 +536,17 @@ class MedicalDataTransformer:
                     parts.append(f"\n- BMI: {bmi['bmi_value']} {bmi.get('bmi_unit', '')}")
                     
             # Extract standalone scalar vitals directly on prescription
-            if prescription.get('temperature'):
-                parts.append(f"\n- Temperature: {prescription['temperature']}")
-            if prescription.get('spo2'):
-                parts.append(f"\n- SpO2: {prescription['spo2']}%")
-            if prescription.get('rbs'):
-                parts.append(f"\n- Random Blood Sugar (RBS): {prescription['rbs']}")
-            if prescription.get('v_weight'):
-                parts.append(f"\n- Weight (Scalar): {prescription['v_weight']}")
-            if prescription.get('v_height'):
-                parts.append(f"\n- Height (Scalar): {prescription['v_height']}")
-            if prescription.get('v_bmi'):
-                parts.append(f"\n- BMI (Scalar): {prescription['v_bmi']}")
+            for field, template in SCALAR_VITALS_PRE_BP:
+                if prescription.get(field):
+                    parts.append(template(prescription[field]))
             if prescription.get('blood_presure'):
                 bp = f"{prescription['blood_presure']}"
                 if prescription.get('blood_presure_2'):
                     bp += f"/{prescription['blood_presure_2']}"
                 parts.append(f"\n- Blood Pressure (Scalar): {bp}")
-            if prescription.get('v_pulse'):
-                parts.append(f"\n- Pulse (Scalar): {prescription['v_pulse']}")
-            if prescription.get('v_respiratory_rate'):
-                parts.append(f"\n- Respiratory Rate (Scalar): {prescription['v_respiratory_rate']}")
+            for field, template in SCALAR_VITALS_POST_BP:
+                if prescription.get(field):
+                    parts.append(template(prescription[field]))
                 
         # Clinical Scores & Classifications
         if any([prescription.get('gcs_scores'), prescription.get('nihss'), prescription.get('pain_score'), prescription.get('motor_power'), prescription.get('dyspnea'), prescription.get('cardiac_rythm')]):
@@ -434,33 +599,18 @@ class MedicalDataTransformer:
             # Array relations
             for exam in pe_list:
                 parts.append(f"\n- Physical Board Result:")
-                if exam.get('general'): parts.append(f"\n  * General: {exam['general']}")
-                if exam.get('heent'): parts.append(f"\n  * HEENT: {exam['heent']}")
-                if exam.get('cvs'): parts.append(f"\n  * CVS: {exam['cvs']}")
-                if exam.get('respiratory'): parts.append(f"\n  * Respiratory: {exam['respiratory']}")
-                if exam.get('abdomen'): parts.append(f"\n  * Abdomen: {exam['abdomen']}")
-                if exam.get('msk'): parts.append(f"\n  * Musculoskeletal: {exam['msk']}")
-                if exam.get('cns'): parts.append(f"\n  * CNS Screens: {exam['cns']}")
+                for field, label in EXAM_FIELDS:
+                    if exam.get(field): parts.append(EXAM_BOARD_LINE(label, exam[field]))
                 
             # Scalar relations fallback / Main Dict values
             if isinstance(pe_data, dict) and not pe_list:
-                if pe_data.get('general'): parts.append(f"\n- General: {pe_data['general']}")
-                if pe_data.get('heent'): parts.append(f"\n- HEENT: {pe_data['heent']}")
-                if pe_data.get('cvs'): parts.append(f"\n- CVS: {pe_data['cvs']}")
-                if pe_data.get('respiratory'): parts.append(f"\n- Respiratory: {pe_data['respiratory']}")
-                if pe_data.get('abdomen'): parts.append(f"\n- Abdomen: {pe_data['abdomen']}")
-                if pe_data.get('msk'): parts.append(f"\n- Musculoskeletal: {pe_data['msk']}")
-                if pe_data.get('cns'): parts.append(f"\n- CNS Screens: {pe_data['cns']}")
+                for field, label in EXAM_FIELDS:
+                    if pe_data.get(field): parts.append(EXAM_LINE(label, pe_data[field]))
             
             # Final fallback to root prescription scalars
             if not pe_data:
-                if prescription.get('general'): parts.append(f"\n- General: {prescription['general']}")
-                if prescription.get('heent'): parts.append(f"\n- HEENT: {prescription['heent']}")
-                if prescription.get('cvs'): parts.append(f"\n- CVS: {prescription['cvs']}")
-                if prescription.get('respiratory'): parts.append(f"\n- Respiratory: {prescription['respiratory']}")
-                if prescription.get('abdomen'): parts.append(f"\n- Abdomen: {prescription['abdomen']}")
-                if prescription.get('msk'): parts.append(f"\n- Musculoskeletal: {prescription['msk']}")
-                if prescription.get('cns'): parts.append(f"\n- CNS Screens: {prescription['cns']}")
+                for field, label in EXAM_FIELDS:
+                    if prescription.get(field): parts.append(EXAM_LINE(label, prescription[field]))
         
         # Patient History
         if prescription.get('patient_history'):
@@ -625,31 +775,85 @@ class MedicalDataTransformer:
         
         return " ".join(parts)
     
-    def _chunk_text(self, text: str) -> List[str]:
+    def _chunk_text(self, text: str, chunk_size: Optional[int] = None) -> List[str]:
         """
-        Split long text into chunks with overlap
-        Uses word-based chunking to preserve context
+        Split long text into chunks of at most chunk_size tokens (default self.chunk_size)
+
+        Whole sections (Vital Signs, Medications Prescribed, ...) are packed
+        greedily; a section that is too large on its own is split between its
+        lines, so list entries such as medications are never cut. Each new chunk
+        starts with up to chunk_overlap tokens of trailing lines from the previous one.
         """
-        words = text.split()
+        chunk_size = chunk_size or self.chunk_size
+        units = self._split_units(text, chunk_size)
+        counts = self.count_tokens(units)
+
         chunks = []
-        
-        # Calculate words per chunk (rough estimate: 1 token ≈ 0.75 words)
-        words_per_chunk = int(self.chunk_size * 0.75)
-        overlap_words = int(self.chunk_overlap * 0.75)
-        
-        start = 0
-        while start < len(words):
-            end = start + words_per_chunk
-            chunk_words = words[start:end]
-            chunks.append(" ".join(chunk_words))
-            
-            # Move start position with overlap
-            start = end - overlap_words
-            if start >= len(words):
-                break
-        
+        current, current_counts = [], []
+        for unit, count in zip(units, counts):
+            if current and sum(current_counts) + count > chunk_size:
+                chunks.append("\n".join(current).strip())
+                current, current_counts = self._overlap_tail(current, current_counts, count, chunk_size)
+            current.append(unit)
+            current_counts.append(count)
+        if current:
+            chunks.append("\n".join(current).strip())
+
         logger.info(f"Split text into {len(chunks)} chunks")
         return chunks
+
+    def _split_units(self, text: str, chunk_size: int) -> List[str]:
+        """
+        Break text into the largest pieces that fit in a chunk:
+        whole sections, else section lines, else word windows
+        """
+        units = []
+        for section in SECTION_BOUNDARY.split(text):
+            section = section.strip()
+            if not section:
+                continue
+            lines = [line.strip() for line in section.split("\n") if line.strip()]
+            line_counts = self.count_tokens(lines)
+            if sum(line_counts) <= chunk_size:
+                # Blank line keeps the section boundary visible inside a chunk
+                units.append("\n" + "\n".join(lines))
+                continue
+            for line, count in zip(lines, line_counts):
+                if count <= chunk_size:
+                    units.append(line)
+                else:
+                    units.extend(self._split_long_line(line, chunk_size))
+        return units
+
+    def _split_long_line(self, line: str, chunk_size: int) -> List[str]:
+        """Split a single oversized line on word boundaries by token count"""
+        words = line.split()
+        counts = self.count_tokens(words)
+        pieces, current, total = [], [], 0
+        for word, count in zip(words, counts):
+            if current and total + count > chunk_size:
+                pieces.append(" ".join(current))
+                current, total = [], 0
+            # A single word longer than a chunk is left to tokenizer truncation
+            current.append(word)
+            total += count
+        if current:
+            pieces.append(" ".join(current))
+        return pieces
+
+    def _overlap_tail(
+        self, units: List[str], counts: List[int], next_count: int, chunk_size: int
+    ) -> Tuple[List[str], List[int]]:
+        """Trailing units of a finished chunk to repeat at the start of the next one"""
+        budget = min(self.chunk_overlap, chunk_size - next_count)
+        tail, tail_counts, total = [], [], 0
+        for unit, count in zip(reversed(units), reversed(counts)):
+            if total + count > budget:
+                break
+            tail.insert(0, unit)
+            tail_counts.insert(0, count)
+            total += count
+        return tail, tail_counts
     
     def _format_time(self, time_float: float) -> str:
         """Convert Odoo time float to HH:MM format"""
@@ -659,6 +863,8 @@ class MedicalDataTransformer:
 
     def _sanitize_for_json(self, obj: Any) -> Any:
         """Recursively convert datetime/date/decimal into JSON serializable types"""
+        if type(obj) in JSON_SCALAR_TYPES:
+            return obj
         if isinstance(obj, dict):
             return {k: self._sanitize_for_json(v) for k, v in obj.items() if v is not None}
         elif isinstance(obj, list):
@@ -0,0 +1,258 @@
+"""
+ETL Job Queue
+Persistent queue of indexing jobs stored in the etl_jobs table.
+The API enqueues jobs and polls progress; a separate worker process claims and runs them.
+"""
+import json
+from typing import List, Dict, Optional
+from datetime import datetime
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+
+
+class ETLJobCancelled(Exception):
+    """Raised inside a running job when cancellation has been requested"""
+
+
+class ETLJobQueue:
+    """Enqueue, claim and track ETL jobs in etl_jobs"""
+
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+
+    async def enqueue(
+        self,
+        models: List[str],
+        incremental: bool = True,
+        limit: Optional[int] = None,
+        resume: bool = False,
+        res_ids: Optional[List[int]] = None
+    ) -> Dict:
+        """
+        Add an indexing job to the queue
+
+        Args:
+            res_ids: If given, index only these record IDs of the (single) model
+
+        Returns:
+            The created job
+        """
+        query = """
+        INSERT INTO etl_jobs (models, res_ids, incremental, record_limit, resume, status, created_at, updated_at)
+        VALUES (CAST(:models AS jsonb), CAST(:res_ids AS jsonb), :incremental, :record_limit, :resume, :status, :now, :now)
+        RETURNING *
+        """
+        async with self.engine.begin() as conn:
+            result = await conn.execute(text(query), {
+                'models': json.dumps(models),
+                'res_ids': json.dumps(res_ids) if res_ids is not None else None,
+                'incremental': incremental,
+                'record_limit': limit,
+                'resume': resume,
+                'status': QUEUED,
+                'now': datetime.now()
+            })
+            job = self._row_to_dict(result.fetchone())
+
+        logger.info(f"Enqueued ETL job {job['id']} for {models}")
+        return job
+
+    async def get(self, job_id: int) -> Optional[Dict]:
+        """Get a job by ID"""
+        async with self.engine.connect() as conn:
+            result = await conn.execute(text("SELECT * FROM etl_jobs WHERE id = :id"), {'id': job_id})
+            row = result.fetchone()
+            return self._row_to_dict(row) if row else None
+
+    async def list_jobs(self, limit: int = 20) -> List[Dict]:
+        """List the most recent jobs"""
+        async with self.engine.connect() as conn:
+            result = await conn.execute(
+                text("SELECT * FROM etl_jobs ORDER BY id DESC LIMIT :limit"),
+                {'limit': limit}
+            )
+            return [self._row_to_dict(row) for row in result.fetchall()]
+
+    async def request_cancel(self, job_id: int) -> Optional[Dict]:
+        """
+        Cancel a job. Queued jobs are cancelled immediately; running jobs are
+        flagged and stop after their current page.
+        """
+        query = """
+        UPDATE etl_jobs SET
+            cancel_requested = TRUE,
+            status = CASE WHEN status = :queued THEN :cancelled ELSE status END,
+            finished_at = CASE WHEN status = :queued THEN :now ELSE finished_at END,
+            updated_at = :now
+        WHERE id = :id AND status IN (:queued, :running)
+        """
+        async with self.engine.begin() as conn:
+            await conn.execute(text(query), {
+                'id': job_id,
+                'queued': QUEUED,
+                'running': RUNNING,
+                'cancelled': CANCELLED,
+                'now': datetime.now()
+            })
+        return await self.get(job_id)
+
+    async def claim_next(self, worker_id: str) -> Optional[Dict]:
+        """
+        Atomically claim the oldest queued job for a worker.
+        SKIP LOCKED lets several workers poll the same table safely.
+        """
+        query = """
+        UPDATE etl_jobs SET
+            status = :running,
+            worker_id = :worker_id,
+            started_at = :now,
+            updated_at = :now
+        WHERE id = (
+            SELECT id FROM etl_jobs
+            WHERE status = :queued
+            ORDER BY id
+            FOR UPDATE SKIP LOCKED
+            LIMIT 1
+        )
+        RETURNING *
+        """
+        async with self.engine.begin() as conn:
+            result = await conn.execute(text(query), {
+                'running': RUNNING,
+                'queued': QUEUED,
+                'worker_id': worker_id,
+                'now': datetime.now()
+            })
+            row = result.fetchone()
+            return self._row_to_dict(row) if row else None
+
+    async def update_progress(
+        self,
+        job_id: int,
+        current_model: str,
+        records_indexed: int,
+        chunks_created: int,
+        total_records: Optional[int] = None
+    ) -> bool:
+        """
+        Record job progress
+
+        Returns:
+            True if cancellation has been requested for the job
+        """
+        query = """
+        UPDATE etl_jobs SET
+            current_model = :current_model,
+            records_indexed = :records_indexed,
+            chunks_created = :chunks_created,
+            total_records = COALESCE(:total_records, total_records),
+            updated_at = :now
+        WHERE id = :id
+        RETURNING cancel_requested
+        """
+        async with self.engine.begin() as conn:
+            result = await conn.execute(text(query), {
+                'id': job_id,
+                'current_model': current_model,
+                'records_indexed': records_indexed,
+                'chunks_created': chunks_created,
+                'total_records': total_records,
+                'now': datetime.now()
+            })
+            row = result.fetchone()
+            return bool(row and row[0])
+
+    async def finish(
+        self,
+        job_id: int,
+        status: str,
+        result: Optional[Dict] = None,
+        error: Optional[str] = None
+    ):
+        """Mark a job as completed, failed or cancelled"""
+        query = """
+        UPDATE etl_jobs SET
+            status = :status,
+            result = CAST(:result AS jsonb),
+            error = :error,
+            finished_at = :now,
+            updated_at = :now
+        WHERE id = :id
+        """
+        async with self.engine.begin() as conn:
+            await conn.execute(text(query), {
+                'id': job_id,
+                'status': status,
+                'result': json.dumps(result or {}, default=str),
+                'error': error,
+                'now': datetime.now()
+            })
+        logger.info(f"ETL job {job_id} {status}")
+
+    async def requeue_stale(self, worker_id: str) -> int:
+        """
+        Put jobs left running by a previous instance of this worker back in the
+        queue, in resume mode so they continue from their ETL checkpoints
+        """
+        query = """
+        UPDATE etl_jobs SET status = :queued, resume = TRUE, updated_at = :now
+        WHERE status = :running AND worker_id = :worker_id
+        """
+        async with self.engine.begin() as conn:
+            result = await conn.execute(text(query), {
+                'queued': QUEUED,
+                'running': RUNNING,
+                'worker_id': worker_id,
+                'now': datetime.now()
+            })
+            return result.rowcount
+
+    def _row_to_dict(self, row) -> Dict:
+        """Convert an etl_jobs row into a dict with derived progress rates and ETA"""
+        job = dict(row._mapping)
+
+        # asyncpg returns JSONB columns as strings
+        for key, default in (('models', []), ('res_ids', None), ('result', None)):
+            if isinstance(job.get(key), str):
+                try:
+                    job[key] = json.loads(job[key])
+                except (json.JSONDecodeError, TypeError):
+                    job[key] = default
+
+        elapsed = None
+        if job.get('started_at'):
+            end = job.get('finished_at') or datetime.now()
+            elapsed = max((end - job['started_at']).total_seconds(), 0.0)
+
+        records = job.get('records_indexed') or 0
+        chunks = job.get('chunks_created') or 0
+        records_per_sec = records / elapsed if elapsed else 0.0
+        chunks_per_sec = chunks / elapsed if elapsed else 0.0
+
+        eta_seconds = None
+        total = job.get('total_records')
+        if job.get('status') == RUNNING and total and records_per_sec > 0:
+            eta_seconds = max(total - records, 0) / records_per_sec
+
+        job['elapsed_seconds'] = elapsed
+        job['records_per_sec'] = round(records_per_sec, 2)
+        job['chunks_per_sec'] = round(chunks_per_sec, 2)
+        job['eta_seconds'] = round(eta_seconds, 1) if eta_seconds is not None else None
+
+        for key in ('created_at', 'started_at', 'finished_at', 'updated_at'):
+            if job.get(key):
+                job[key] = job[key].isoformat()
+
+        return job
@@ -0,0 +1,233 @@
+"""
+Patient Summary Builder
+Maintains one precomputed row per patient in patient_summaries (latest vitals,
+active medications, diagnoses) from the indexed prescription metadata.
+Only patients whose prescriptions were just (re)indexed are recomputed.
+"""
+import json
+from datetime import datetime, date, timedelta
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+import logging
+
+logger = logging.getLogger(__name__)
+
+VITAL_LABELS = {
+    'v_weight': 'Weight',
+    'v_height': 'Height',
+    'v_bmi': 'BMI',
+    'pulse': 'Pulse',
+    'respiratory_rate': 'Respiratory Rate',
+    'temperature': 'Temperature',
+    'spo2': 'SpO2',
+    'rbs': 'Random Blood Sugar',
+    'pain_score': 'Pain Score',
+}
+
+
+def _parse_date(value) -> Optional[date]:
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+def _item_name(item: Dict, *keys: str) -> Optional[str]:
+    for key in keys:
+        if item.get(key):
+            return str(item[key])
+    return None
+
+
+class PatientSummaryBuilder:
+    """Recompute patient_summaries rows from medical_rag_index"""
+
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+
+    async def patient_seqs_for(self, res_ids: Iterable[int]) -> List[str]:
+        """Patients currently linked to indexed prescriptions (used before their vectors are removed)"""
+        res_ids = list(res_ids)
+        if not res_ids:
+            return []
+        query = """
+        SELECT DISTINCT metadata->>'patient_seq' FROM medical_rag_index
+        WHERE odoo_model = 'prescription.order.knk' AND odoo_res_id = ANY(:res_ids)
+          AND metadata->>'patient_seq' IS NOT NULL
+        """
+        async with self.engine.connect() as conn:
+            result = await conn.execute(text(query), {'res_ids': res_ids})
+            return [row[0] for row in result.fetchall()]
+
+    async def refresh(self, patient_seqs: Iterable[str]) -> int:
+        """
+        Recompute the summaries of the given patients
+
+        Returns:
+            Number of summaries written or removed
+        """
+        patient_seqs = sorted({str(seq) for seq in patient_seqs if seq})
+        if not patient_seqs:
+            return 0
+
+        # First chunk of each prescription carries the full structured metadata
+        query = """
+        SELECT metadata->>'patient_seq', odoo_res_id, metadata
+        FROM medical_rag_index
+        WHERE odoo_model = 'prescription.order.knk' AND chunk_index = 0
+          AND metadata->>'patient_seq' = ANY(:patient_seqs)
+        """
+        async with self.engine.connect() as conn:
+            result = await conn.execute(text(query), {'patient_seqs': patient_seqs})
+            rows = result.fetchall()
+
+        by_patient: Dict[str, List[Dict]] = {seq: [] for seq in patient_seqs}
+        for patient_seq, res_id, metadata in rows:
+            if isinstance(metadata, str):
+                metadata = json.loads(metadata)
+            metadata['odoo_res_id'] = res_id
+            by_patient[patient_seq].append(metadata)
+
+        upsert = """
+        INSERT INTO patient_summaries
+            (patient_seq, patient_id, prescription_count, latest_prescription_id, latest_prescription_date,
+             latest_vitals, active_medications, diagnoses, summary_text, updated_at)
+        VALUES
+            (:patient_seq, :patient_id, :prescription_count, :latest_prescription_id, :latest_prescription_date,
+             CAST(:latest_vitals AS jsonb), CAST(:active_medications AS jsonb), CAST(:diagnoses AS jsonb),
+             :summary_text, :updated_at)
+        ON CONFLICT (patient_seq) DO UPDATE SET
+            patient_id = EXCLUDED.patient_id,
+            prescription_count = EXCLUDED.prescription_count,
+            latest_prescription_id = EXCLUDED.latest_prescription_id,
+            latest_prescription_date = EXCLUDED.latest_prescription_date,
+            latest_vitals = EXCLUDED.latest_vitals,
+            active_medications = EXCLUDED.active_medications,
+            diagnoses = EXCLUDED.diagnoses,
+            summary_text = EXCLUDED.summary_text,
+            updated_at = EXCLUDED.updated_at
+        """
+        async with self.engine.begin() as conn:
+            for patient_seq, prescriptions in by_patient.items():
+                if not prescriptions:
+                    await conn.execute(
+                        text("DELETE FROM patient_summaries WHERE patient_seq = :patient_seq"),
+                        {'patient_seq': patient_seq}
+                    )
+                    continue
+                summary = self.build_summary(patient_seq, prescriptions)
+                await conn.execute(text(upsert), {
+                    **summary,
+                    'latest_vitals': json.dumps(summary['latest_vitals'], default=str),
+                    'active_medications': json.dumps(summary['active_medications'], default=str),
+                    'diagnoses': json.dumps(summary['diagnoses'], default=str),
+                    'updated_at': datetime.now()
+                })
+
+        logger.info(f"Refreshed {len(patient_seqs)} patient summaries")
+        return len(patient_seqs)
+
+    def build_summary(self, patient_seq: str, prescriptions: List[Dict], today: date = None) -> Dict:
+        """Aggregate a patient's prescription metadata into one summary"""
+        today = today or date.today()
+        prescriptions = sorted(
+            prescriptions,
+            key=lambda p: (_parse_date(p.get('prescription_date')) or date.min, p['odoo_res_id']),
+            reverse=True
+        )
+        latest = prescriptions[0]
+
+        # Latest recorded value of each vital across prescriptions (newest first)
+        latest_vitals = {}
+        for prescription in prescriptions:
+            scalars = prescription.get('clinical_scalars') or {}
+            for key, label in VITAL_LABELS.items():
+                if label not in latest_vitals and scalars.get(key) not in (None, '', 0, False):
+                    latest_vitals[label] = scalars[key]
+            if 'Blood Pressure' not in latest_vitals and scalars.get('blood_presure'):
+                bp = str(scalars['blood_presure'])
+                if scalars.get('blood_presure_2'):
+                    bp += f"/{scalars['blood_presure_2']}"
+                latest_vitals['Blood Pressure'] = bp
+
+        # Medications whose course (prescription date + days) has not ended,
+        # plus everything on the latest prescription
+        active_medications = []
+        seen_medications = set()
+        for prescription in prescriptions:
+            prescribed_on = _parse_date(prescription.get('prescription_date'))
+            for med in prescription.get('medications') or []:
+                name = _item_name(med, 'medication_name', 'name')
+                if not name or name.lower() in seen_medications:
+                    continue
+                ends_on = None
+                try:
+                    if prescribed_on and med.get('days'):
+                        ends_on = prescribed_on + timedelta(days=int(float(med['days'])))
+                except (TypeError, ValueError):
+                    pass
+                if prescription is latest or (ends_on and ends_on >= today):
+                    seen_medications.add(name.lower())
+                    active_medications.append({
+                        'name': name,
+                        'dose': med.get('dose') or med.get('quantity'),
+                        'frequency': med.get('frequency'),
+                        'prescribed_on': prescription.get('prescription_date'),
+                        'until': ends_on.isoformat() if ends_on else None
+                    })
+
+        # Every diagnosis with first/last time it was recorded
+        diagnoses = {}
+        for prescription in reversed(prescriptions):
+            for diag in prescription.get('diagnoses') or []:
+                name = _item_name(diag, 'disease_name', 'name', 'disease_code')
+                if not name:
+                    continue
+                entry = diagnoses.setdefault(name.lower(), {
+                    'name': name,
+                    'code': diag.get('disease_code'),
+                    'first_seen': prescription.get('prescription_date')
+                })
+                entry['last_seen'] = prescription.get('prescription_date')
+
+        summary = {
+            'patient_seq': patient_seq,
+            'patient_id': latest.get('patient_id'),
+            'prescription_count': len(prescriptions),
+            'latest_prescription_id': latest['odoo_res_id'],
+            'latest_prescription_date': _parse_date(latest.get('prescription_date')),
+            'latest_vitals': latest_vitals,
+            'active_medications': active_medications,
+            'diagnoses': list(diagnoses.values()),
+        }
+        summary['summary_text'] = self._render(summary)
+        return summary
+
+    def _render(self, summary: Dict) -> str:
+        """Natural language form of a summary, used as LLM context"""
+        parts = [
+            f"Patient Summary (ID: {summary['patient_seq']})",
+            f"Prescriptions on record: {summary['prescription_count']}, "
+            f"latest on {summary['latest_prescription_date'] or 'Unknown'}"
+        ]
+
+        if summary['diagnoses']:
+            parts.append("\nDiagnoses:")
+            for diag in summary['diagnoses']:
+                code = f" ({diag['code']})" if diag.get('code') else ""
+                parts.append(f"- {diag['name']}{code}, last recorded {diag.get('last_seen') or 'Unknown'}")
+
+        if summary['active_medications']:
+            parts.append("\nActive Medications:")
+            for med in summary['active_medications']:
+                details = ", ".join(str(v) for v in (med.get('dose'), med.get('frequency')) if v)
+                until = f" until {med['until']}" if med.get('until') else ""
+                parts.append(f"- {med['name']}{' ' + details if details else ''}{until}")
+
+        if summary['latest_vitals']:
+            parts.append("\nLatest Vitals:")
+            for label, value in summary['latest_vitals'].items():
+                parts.append(f"- {label}: {value}")
+
+        return "\n".join(parts)
@@ -3,10 +3,13 @@ ETL Pipeline Orchestrator for Medical Data
 Coordinates extraction, transformation, embedding, and loading
 """
 import os
+import json
 import asyncio
+import hashlib
 import argparse
+from functools import partial
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 import logging
 
 from sqlalchemy.ext.asyncio import create_async_engine
@@ -15,6 +18,7 @@ from .data_extractor import OdooDataExtractor
 from .data_transformer import MedicalDataTransformer
 from .embedding_generator import MedicalEmbeddingGenerator
 from .vector_loader import VectorLoader
+from .patient_summary import PatientSummaryBuilder
 
 logging.basicConfig(
     level=logging.INFO,
@@ -32,347 +36,352 @@ class ETLPipeline:
         
         self.extractor = OdooDataExtractor(None, self.engine)
         self.transformer = MedicalDataTransformer(
-            chunk_size=int(os.getenv('ETL_CHUNK_SIZE', '800')),
-            chunk_overlap=int(os.getenv('ETL_CHUNK_OVERLAP', '150'))
+            chunk_size=int(os.getenv('ETL_CHUNK_SIZE', '480')),
+            chunk_overlap=int(os.getenv('ETL_CHUNK_OVERLAP', '64'))
         )
         self.embedding_generator = MedicalEmbeddingGenerator()
         self.loader = VectorLoader(self.engine)
+        self.summaries = PatientSummaryBuilder(self.engine)
+        
+        # Records fetched from Odoo and checkpointed per page
+        self.page_size = int(os.getenv('ETL_PAGE_SIZE', '100'))
     
-    async def run_appointment_indexing(
+    def _parse_write_date(self, write_date) -> datetime:
+        """Parse an Odoo write_date value (ISO string or datetime)"""
+        if isinstance(write_date, datetime):
+            return write_date
+        if isinstance(write_date, str):
+            try:
+                return datetime.fromisoformat(write_date.replace('Z', '+00:00'))
+            except ValueError:
+                pass
+        return datetime.now()
+
+    def _transform_page(self, odoo_model: str, records: List[Dict]) -> List[Tuple[int, int, str, Dict]]:
+        """Transform a page of Odoo records into (res_id, chunk_index, text, metadata) tuples"""
+        return self.transformer.transform_batch(odoo_model, records)
+
+    async def _run_paged_indexing(
         self,
+        odoo_model: str,
+        extract_page: Callable[..., Awaitable[List[Dict]]],
+        transform_page: Callable[[List[Dict]], List[Tuple[int, int, str, Dict]]],
         limit: Optional[int] = None,
-        incremental: bool = False
+        incremental: bool = False,
+        resume: bool = False,
+        embedding_batch_size: Optional[int] = None,
+        mark_synced: bool = True,
+        on_page: Optional[Callable[[str, int, int], Awaitable[None]]] = None
     ) -> dict:
-        """Index appointment data"""
-        logger.info("Starting appointment indexing...")
+        """
+        Index a model page by page in ascending ID order.
         
-        # Get last indexed date for incremental updates
-        since_date = None
-        if incremental:
-            since_date = await self.extractor.get_last_indexed_date('wk.appointment')
-            if since_date:
-                logger.info(f"Incremental update since: {since_date}")
+        Every page is embedded, loaded, marked as synced in Odoo and then
+        committed to etl_checkpoints, so an interrupted run loses at most one
+        page of work. With resume=True an unfinished run continues after the
+        last committed record ID instead of starting over.
         
-        # Extract appointments
-        appointments = await self.extractor.extract_appointments(
-            limit=limit,
-            since_date=since_date,
-            incremental=incremental
-        )
+        Args:
+            odoo_model: Odoo model name
+            extract_page: Extractor coroutine accepting limit, after_id and incremental
+            transform_page: Returns (res_id, chunk_index, text, metadata) tuples for a page of records
+            limit: Max records to index for this run
+            incremental: Only index records not yet synced to RAG
+            resume: Continue from the last committed page of an unfinished run
+            embedding_batch_size: Batch size for embedding generation
+            mark_synced: Mark each committed page as synced in Odoo
+            on_page: Awaited after each committed page with (odoo_model, records_indexed,
+                chunks_created); raising from it aborts the run after that page
+        """
+        if embedding_batch_size is None:
+            embedding_batch_size = int(os.getenv('ETL_BATCH_SIZE', '32'))
         
-        if not appointments:
-            logger.info("No appointments to index")
-            return {'records_indexed': 0, 'chunks_created': 0, 'data': []}
+        checkpoint = await self.extractor.get_checkpoint(odoo_model) if resume else None
+        if checkpoint and checkpoint['status'] != 'completed':
+            after_id = checkpoint['last_res_id']
+            pages_committed = checkpoint['pages_committed']
+            records_indexed = checkpoint['records_indexed']
+            chunks_created = checkpoint['chunks_created']
+            last_write_date = checkpoint['last_write_date']
+            logger.info(
+                f"Resuming {odoo_model} indexing after ID {after_id} "
+                f"({pages_committed} pages, {records_indexed} records already committed)"
+            )
+        else:
+            after_id = None
+            pages_committed = 0
+            records_indexed = 0
+            chunks_created = 0
+            last_write_date = None
+            await self.extractor.start_checkpoint(odoo_model)
         
-        # Transform
-        record_data = []
-        for appointment in appointments:
-            text, metadata = self.transformer.flatten_appointment(appointment)
-            record_data.append((appointment['id'], text, metadata))
-            
-        # Generate embeddings in batches
-        texts = [data[1] for data in record_data]
-        embeddings = self.embedding_generator.generate_embeddings(
-            texts,
-            batch_size=int(os.getenv('ETL_BATCH_SIZE', '32'))
-        )
+        records_changed = 0
+        try:
+            while limit is None or records_indexed < limit:
+                page_limit = self.page_size if limit is None else min(self.page_size, limit - records_indexed)
+                records = await extract_page(limit=page_limit, after_id=after_id, incremental=incremental)
+                if not records:
+                    break
+                
+                # Transform
+                chunk_data = transform_page(records)
+                
+                # Generate embeddings for the whole page
+                embeddings = self.embedding_generator.generate_embeddings(
+                    [chunk[2] for chunk in chunk_data],
+                    batch_size=embedding_batch_size
+                )
+                
+                vectors_to_load = [
+                    (odoo_model, res_id, chunk_index, text, metadata, embedding)
+                    for (res_id, chunk_index, text, metadata), embedding in zip(chunk_data, embeddings)
+                ]
+                
+                # Replace the page's chunks, dropping those past an edited record's new length
+                chunks_created += await self.loader.replace_vectors(
+                    odoo_model, [r['id'] for r in records], vectors_to_load
+                )
+                
+                # Recompute summaries of the patients whose prescriptions were just loaded
+                if odoo_model == 'prescription.order.knk':
+                    await self.summaries.refresh(chunk[3].get('patient_seq') for chunk in chunk_data)
+                
+                # Mark this page synced in Odoo before committing the checkpoint
+                # (records edited since extraction are left for the next incremental run)
+                record_ids = [r['id'] for r in records]
+                if mark_synced:
+                    records_changed += len(await self.extractor.mark_records_as_synced(odoo_model, records))
+                
+                page_write_date = max(self._parse_write_date(r.get('write_date')) for r in records)
+                last_write_date = max(last_write_date, page_write_date) if last_write_date else page_write_date
+                after_id = max(record_ids)
+                pages_committed += 1
+                records_indexed += len(records)
+                
+                await self.extractor.save_checkpoint(
+                    odoo_model,
+                    after_id,
+                    pages_committed,
+                    records_indexed,
+                    chunks_created,
+                    last_write_date
+                )
+                logger.info(
+                    f"Committed {odoo_model} page {pages_committed} "
+                    f"(up to ID {after_id}, {records_indexed} records, {chunks_created} chunks)"
+                )
+                
+                if on_page:
+                    await on_page(odoo_model, records_indexed, chunks_created)
+                if len(records) < page_limit:
+                    break
+        except Exception:
+            await self.extractor.set_checkpoint_status(odoo_model, 'failed')
+            raise
         
-        # Prepare for loading
-        vectors_to_load = []
-        for (res_id, text, metadata), embedding in zip(record_data, embeddings):
-            vectors_to_load.append((
-                'wk.appointment',
-                res_id,
-                0,
-                text,
-                metadata,
-                embedding
-            ))
-        
-        # Load vectors in batches
-        batch_size = 100
-        chunks_created = 0
-        for i in range(0, len(vectors_to_load), batch_size):
-            batch = vectors_to_load[i:i+batch_size]
-            chunks_created += await self.loader.load_vectors(batch)
-        
-        # Update ETL metadata
-        if appointments:
-            # Parse write_date strings if they aren't already datetime objects
-            processed_dates = []
-            for a in appointments:
-                wd = a.get('write_date')
-                if isinstance(wd, str):
-                    try:
-                        processed_dates.append(datetime.fromisoformat(wd.replace('Z', '+00:00')))
-                    except ValueError:
-                        processed_dates.append(datetime.now())
-                elif isinstance(wd, datetime):
-                    processed_dates.append(wd)
-                else:
-                    processed_dates.append(datetime.now())
-            
-            last_write_date = max(processed_dates) if processed_dates else datetime.now()
-            
+        if records_indexed:
             await self.extractor.update_etl_metadata(
-                'wk.appointment',
-                last_write_date,
-                len(appointments),
+                odoo_model,
+                last_write_date or datetime.now(),
+                records_indexed,
                 chunks_created
             )
-            
-            # Mark synced in Odoo
-            record_ids = [a['id'] for a in appointments]
-            await self.extractor.mark_records_as_synced('wk.appointment', record_ids)
+        await self.extractor.set_checkpoint_status(odoo_model, 'completed')
         
-        logger.info(f"Indexed {len(appointments)} appointments, created {chunks_created} chunks")
         return {
-            'records_indexed': len(appointments), 
+            'records_indexed': records_indexed,
             'chunks_created': chunks_created,
-            'data': appointments
+            'records_changed': records_changed
         }
+    
+    async def run_appointment_indexing(
+        self,
+        limit: Optional[int] = None,
+        incremental: bool = False,
+        resume: bool = False,
+        on_page: Optional[Callable[[str, int, int], Awaitable[None]]] = None
+    ) -> dict:
+        """Index appointment data"""
+        logger.info("Starting appointment indexing...")
+        
+        result = await self._run_paged_indexing(
+            'wk.appointment',
+            self.extractor.extract_appointments,
+            partial(self._transform_page, 'wk.appointment'),
+            limit=limit,
+            incremental=incremental,
+            resume=resume,
+            on_page=on_page
+        )
+        
+        logger.info(f"Indexed {result['records_indexed']} appointments, created {result['chunks_created']} chunks")
+        return result
 
     async def run_patient_indexing(
         self,
         limit: Optional[int] = None,
-        incremental: bool = False
+        incremental: bool = False,
+        resume: bool = False,
+        on_page: Optional[Callable[[str, int, int], Awaitable[None]]] = None
     ) -> dict:
         """Index patient data"""
         logger.info("Starting patient indexing...")
         
-        patients = await self.extractor.extract_patients(
+        result = await self._run_paged_indexing(
+            'res.partner',
+            self.extractor.extract_patients,
+            partial(self._transform_page, 'res.partner'),
             limit=limit,
-            incremental=incremental
+            incremental=incremental,
+            resume=resume,
+            # No is_rag_synced flag on res.partner; incremental runs go by write_date
+            mark_synced=False,
+            on_page=on_page
         )
         
-        if not patients:
-            logger.info("No patients to index")
-            return {'records_indexed': 0, 'chunks_created': 0, 'data': []}
-            
-        # Transform
-        record_data = []
-        for patient in patients:
-            text, metadata = self.transformer.flatten_patient(patient)
-            record_data.append((patient['id'], text, metadata))
-            
-        # Generate embeddings in batches
-        texts = [data[1] for data in record_data]
-        embeddings = self.embedding_generator.generate_embeddings(
-            texts,
-            batch_size=int(os.getenv('ETL_BATCH_SIZE', '32'))
-        )
-        
-        # Prepare for loading
-        vectors_to_load = []
-        for (res_id, text, metadata), embedding in zip(record_data, embeddings):
-            vectors_to_load.append((
-                'res.partner',
-                res_id,
-                0,
-                text,
-                metadata,
-                embedding
-            ))
-            
-        # Load vectors in batches
-        batch_size = 100
-        chunks_created = 0
-        for i in range(0, len(vectors_to_load), batch_size):
-            batch = vectors_to_load[i:i+batch_size]
-            chunks_created += await self.loader.load_vectors(batch)
-        
-        if patients:
-            # Parse write_date strings
-            processed_dates = []
-            for p in patients:
-                wd = p.get('write_date')
-                if isinstance(wd, str):
-                    try:
-                        processed_dates.append(datetime.fromisoformat(wd.replace('Z', '+00:00')))
-                    except ValueError:
-                        processed_dates.append(datetime.now())
-                elif isinstance(wd, datetime):
-                    processed_dates.append(wd)
-                else:
-                    processed_dates.append(datetime.now())
-            
-            last_write_date = max(processed_dates) if processed_dates else datetime.now()
-            
-            await self.extractor.update_etl_metadata(
-                'res.partner',
-                last_write_date,
-                len(patients),
-                chunks_created
-            )
-            
-            record_ids = [p['id'] for p in patients]
-            await self.extractor.mark_records_as_synced('res.partner', record_ids)
-            
-        logger.info(f"Indexed {len(patients)} patients")
-        return {
-            'records_indexed': len(patients),
-            'chunks_created': chunks_created,
-            'data': patients
-        }
+        logger.info(f"Indexed {result['records_indexed']} patients")
+        return result
 
     async def run_disease_indexing(
         self,
-        limit: Optional[int] = None
+        limit: Optional[int] = None,
+        resume: bool = False,
+        on_page: Optional[Callable[[str, int, int], Awaitable[None]]] = None
     ) -> dict:
         """Index disease data"""
         logger.info("Starting disease indexing...")
         
-        # Diseases are usually full sync
-        diseases = await self.extractor.extract_diseases(limit=limit)
-        
-        if not diseases:
-            logger.info("No diseases to index")
-            return {'records_indexed': 0, 'chunks_created': 0, 'data': []}
-            
-        # Transform
-        record_data = []
-        for disease in diseases:
-            text, metadata = self.transformer.flatten_disease(disease)
-            record_data.append((disease['id'], text, metadata))
-            
-        # Generate embeddings in batches
-        # For very large datasets like diseases, we do this in bigger batches
-        logger.info(f"Generating embeddings for {len(diseases)} diseases...")
-        texts = [data[1] for data in record_data]
-        embeddings = self.embedding_generator.generate_embeddings(
-            texts,
-            batch_size=128 # Higher batch size for simpler texts
+        # Diseases are usually full sync and have no sync flag in Odoo.
+        # Simpler texts allow larger embedding batches.
+        result = await self._run_paged_indexing(
+            'medical.disease',
+            self.extractor.extract_diseases,
+            partial(self._transform_page, 'medical.disease'),
+            limit=limit,
+            incremental=False,
+            resume=resume,
+            embedding_batch_size=128,
+            mark_synced=False,
+            on_page=on_page
         )
         
-        # Prepare for loading
-        vectors_to_load = []
-        for (res_id, text, metadata), embedding in zip(record_data, embeddings):
-            vectors_to_load.append((
-                'medical.disease',
-                res_id,
-                0,
-                text,
-                metadata,
-                embedding
-            ))
-            
-        # Load vectors in batches
-        batch_size = 500
-        chunks_created = 0
-        for i in range(0, len(vectors_to_load), batch_size):
-            batch = vectors_to_load[i:i+batch_size]
-            chunks_created += await self.loader.load_vectors(batch)
-            if (i // batch_size) % 10 == 0:
-                logger.info(f"Loaded {i + len(batch)}/{len(vectors_to_load)} diseases...")
-        
-        logger.info(f"Indexed {len(diseases)} diseases")
-        return {
-            'records_indexed': len(diseases),
-            'chunks_created': chunks_created,
-            'data': diseases
-        }
+        logger.info(f"Indexed {result['records_indexed']} diseases")
+        return result
     
     async def run_prescription_indexing(
         self,
         limit: Optional[int] = None,
-        incremental: bool = False
+        incremental: bool = False,
+        resume: bool = False,
+        on_page: Optional[Callable[[str, int, int], Awaitable[None]]] = None
     ) -> dict:
         """Index prescription data"""
         logger.info("Starting prescription indexing...")
         
-        # Get last indexed date for incremental updates
-        since_date = None
-        if incremental:
-            since_date = await self.extractor.get_last_indexed_date('prescription.order.knk')
-            if since_date:
-                logger.info(f"Incremental update since: {since_date}")
-        
-        # Extract prescriptions
-        prescriptions = await self.extractor.extract_prescriptions(
+        result = await self._run_paged_indexing(
+            'prescription.order.knk',
+            self.extractor.extract_prescriptions,
+            partial(self._transform_page, 'prescription.order.knk'),
             limit=limit,
-            since_date=since_date,
-            incremental=incremental
+            incremental=incremental,
+            resume=resume,
+            on_page=on_page
         )
         
-        if not prescriptions:
-            logger.info("No prescriptions to index")
-            return {'records_indexed': 0, 'chunks_created': 0, 'data': []}
+        logger.info(f"Indexed {result['records_indexed']} prescriptions, created {result['chunks_created']} chunks")
+        return result
+    
+    async def run_ids_indexing(self, odoo_model: str, res_ids: List[int]) -> dict:
+        """
+        Index only the given records, as pushed by the Odoo change outbox.
+        Records that no longer match the model's extraction domain (deleted or
+        cancelled in Odoo) have their vectors removed.
+        """
+        logger.info(f"Starting push indexing of {len(res_ids)} {odoo_model} records...")
         
-        # Transform and embed
-        vectors_to_load = []
-        total_chunks = 0
+        records = await self.extractor.extract_by_ids(odoo_model, res_ids)
         
-        for prescription in prescriptions:
-            # Transform (may return multiple chunks)
-            chunks_with_metadata = self.transformer.flatten_prescription(prescription)
-            
-            # Generate embeddings for all chunks
-            texts = [chunk for chunk, _ in chunks_with_metadata]
-            embeddings = self.embedding_generator.generate_embeddings(
-                texts,
-                batch_size=int(os.getenv('ETL_BATCH_SIZE', '32'))
-            )
-            
-            # Prepare for loading
-            for (text, metadata), embedding in zip(chunks_with_metadata, embeddings):
-                vectors_to_load.append((
-                    'prescription.order.knk',
-                    prescription['id'],
-                    metadata['chunk_index'],
-                    text,
-                    metadata,
-                    embedding
-                ))
-                total_chunks += 1
-        
-        # Load vectors in batches
-        batch_size = 100
-        chunks_loaded = 0
-        for i in range(0, len(vectors_to_load), batch_size):
-            batch = vectors_to_load[i:i+batch_size]
-            chunks_loaded += await self.loader.load_vectors(batch)
-        
-        # Update ETL metadata
-        if prescriptions:
-            # Parse write_date strings
-            processed_dates = []
-            for p in prescriptions:
-                wd = p.get('write_date')
-                if isinstance(wd, str):
-                    try:
-                        processed_dates.append(datetime.fromisoformat(wd.replace('Z', '+00:00')))
-                    except ValueError:
-                        processed_dates.append(datetime.now())
-                elif isinstance(wd, datetime):
-                    processed_dates.append(wd)
-                else:
-                    processed_dates.append(datetime.now())
-            
-            last_write_date = max(processed_dates) if processed_dates else datetime.now()
-
-            await self.extractor.update_etl_metadata(
-                'prescription.order.knk',
-                last_write_date,
-                len(prescriptions),
-                chunks_loaded
-            )
-            
-            # Mark synced in Odoo
-            record_ids = [p['id'] for p in prescriptions]
-            await self.extractor.mark_records_as_synced('prescription.order.knk', record_ids)
+        # Patients linked before this update also need their summary recomputed
+        # (prescription removed or moved to another patient)
+        affected_patients = set()
+        if odoo_model == 'prescription.order.knk':
+            affected_patients.update(await self.summaries.patient_seqs_for(res_ids))
         
-        logger.info(f"Indexed {len(prescriptions)} prescriptions, created {chunks_loaded} chunks")
+        chunk_data = self._transform_page(odoo_model, records)
+        
+        embeddings = self.embedding_generator.generate_embeddings(
+            [chunk[2] for chunk in chunk_data],
+            batch_size=int(os.getenv('ETL_BATCH_SIZE', '32')),
+            show_progress=False
+        )
+        vectors_to_load = [
+            (odoo_model, res_id, chunk_index, text, metadata, embedding)
+            for (res_id, chunk_index, text, metadata), embedding in zip(chunk_data, embeddings)
+        ]
+        indexed_ids = [r['id'] for r in records]
+        # Replace, not upsert: chunks beyond an edited record's new length must go
+        chunks_created = await self.loader.replace_vectors(odoo_model, indexed_ids, vectors_to_load)
+        
+        changed_ids = []
+        if indexed_ids and odoo_model != 'medical.disease':
+            # Records edited meanwhile stay unsynced; their edit already re-queued them in the outbox
+            changed_ids = await self.extractor.mark_records_as_synced(odoo_model, records)
+        
+        removed_ids = sorted(set(res_ids) - set(indexed_ids))
+        for res_id in removed_ids:
+            await self.loader.delete_model_vectors(odoo_model, res_id)
+        
+        if odoo_model == 'prescription.order.knk':
+            affected_patients.update(chunk[3].get('patient_seq') for chunk in chunk_data)
+            await self.summaries.refresh(affected_patients)
+        
+        logger.info(
+            f"Push-indexed {len(indexed_ids)} {odoo_model} records ({chunks_created} chunks), "
+            f"removed {len(removed_ids)}"
+        )
         return {
-            'records_indexed': len(prescriptions), 
-            'chunks_created': chunks_loaded,
-            'data': prescriptions
+            'records_indexed': len(indexed_ids),
+            'chunks_created': chunks_created,
+            'records_removed': len(removed_ids),
+            'records_changed': len(changed_ids)
         }
     
+    async def run_attachment_indexing(self, attachments: List[Dict]) -> dict:
+        """
+        Index the extracted text of chat attachments pushed by Odoo under
+        odoo_model 'ir.attachment', replacing earlier chunks of each attachment.
+        
+        Args:
+            attachments: Dicts with id, name, text and optional mimetype,
+                checksum, patient_seq and channel_id
+        """
+        chunk_data = self._transform_page('ir.attachment', attachments)
+        
+        # Called from the API: embed off the event loop so other requests keep being served
+        embeddings = await asyncio.get_running_loop().run_in_executor(None, partial(
+            self.embedding_generator.generate_embeddings,
+            [chunk[2] for chunk in chunk_data],
+            batch_size=int(os.getenv('ETL_BATCH_SIZE', '32')),
+            show_progress=False
+        ))
+        vectors_to_load = [
+            ('ir.attachment', res_id, chunk_index, text, metadata, embedding)
+            for (res_id, chunk_index, text, metadata), embedding in zip(chunk_data, embeddings)
+        ]
+        chunks_created = await self.loader.replace_vectors(
+            'ir.attachment', [attachment['id'] for attachment in attachments], vectors_to_load
+        )
+        
+        logger.info(f"Indexed {len(attachments)} attachments ({chunks_created} chunks)")
+        return {'records_indexed': len(attachments), 'chunks_created': chunks_created}
+    
     async def run_full_indexing(
         self,
         models: list = None,
         limit: Optional[int] = None,
-        incremental: bool = False
+        incremental: bool = False,
+        resume: bool = False,
+        on_page: Optional[Callable[[str, int, int], Awaitable[None]]] = None
     ) -> dict:
         """Run indexing for multiple models"""
         if models is None:
@@ -382,13 +391,13 @@ class ETLPipeline:
         
         for model in models:
             if model == 'wk.appointment':
-                results[model] = await self.run_appointment_indexing(limit, incremental)
+                results[model] = await self.run_appointment_indexing(limit, incremental, resume, on_page)
             elif model == 'prescription.order.knk':
-                results[model] = await self.run_prescription_indexing(limit, incremental)
+                results[model] = await self.run_prescription_indexing(limit, incremental, resume, on_page)
             elif model == 'res.partner':
-                results[model] = await self.run_patient_indexing(limit, incremental)
+                results[model] = await self.run_patient_indexing(limit, incremental, resume, on_page)
             elif model == 'medical.disease':
-                results[model] = await self.run_disease_indexing(limit)
+                results[model] = await self.run_disease_indexing(limit, resume, on_page)
             else:
                 logger.warning(f"Unknown model: {model}")
         
@@ -413,14 +422,39 @@ class ETLPipeline:
                     'total_records': row.total_records,
                     'total_chunks': row.total_chunks
                 }
+            
+            # Get per-page checkpoints of the last run
+            result = await conn.execute(text("SELECT * FROM etl_checkpoints"))
+            checkpoints = {}
+            for row in result.fetchall():
+                checkpoints[row.odoo_model] = {
+                    'status': row.status,
+                    'last_res_id': row.last_res_id,
+                    'pages_committed': row.pages_committed,
+                    'records_indexed': row.records_indexed,
+                    'chunks_created': row.chunks_created,
+                    'started_at': row.started_at.isoformat() if row.started_at else None,
+                    'updated_at': row.updated_at.isoformat() if row.updated_at else None
+                }
         
         return {
             'index_stats': stats,
-            'etl_metadata': etl_metadata
+            'etl_metadata': etl_metadata,
+            'checkpoints': checkpoints,
+            'index_version': self._index_version(stats)
         }
     
+    def _index_version(self, stats: dict) -> str:
+        """Short fingerprint of the index contents; changes whenever chunks are loaded or removed"""
+        fingerprint = json.dumps(
+            sorted((model, s['total_chunks'], s['last_updated']) for model, s in stats.items())
+        )
+        return hashlib.sha1(fingerprint.encode()).hexdigest()[:16]
+    
     async def close(self):
-        """Close database connections"""
+        """Close database connections, the Odoo HTTP session and the transform process pool"""
+        self.transformer.close()
+        await self.extractor.close()
         await self.engine.dispose()
 
 
@@ -434,6 +468,8 @@ async def main():
                         help='Incremental update (only new/modified records)')
     parser.add_argument('--full-reindex', action='store_true',
                         help='Full reindex (ignore last indexed date)')
+    parser.add_argument('--resume', action='store_true',
+                        help='Resume an interrupted run from its last committed page')
     parser.add_argument('--status', action='store_true',
                         help='Show indexing status')
     
@@ -447,19 +483,22 @@ async def main():
             print("\n=== Indexing Status ===")
             print(f"\nIndex Stats: {status['index_stats']}")
             print(f"\nETL Metadata: {status['etl_metadata']}")
+            print(f"\nCheckpoints: {status['checkpoints']}")
         else:
             incremental = not args.full_reindex
             
             if args.model == 'all':
                 results = await pipeline.run_full_indexing(
                     limit=args.limit,
-                    incremental=incremental
+                    incremental=incremental,
+                    resume=args.resume
                 )
             else:
                 results = await pipeline.run_full_indexing(
                     models=[args.model],
                     limit=args.limit,
-                    incremental=incremental
+                    incremental=incremental,
+                    resume=args.resume
                 )
             
             print("\n=== Indexing Results ===")
@@ -3,9 +3,10 @@ Vector Loader for Medical RAG Index
 Loads embeddings and metadata into the medical_rag_index table
 """
 from typing import List, Dict, Tuple
-from datetime import datetime
+from datetime import datetime, date
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncEngine
+import json
 import logging
 
 logger = logging.getLogger(__name__)
@@ -14,6 +15,25 @@ logger = logging.getLogger(__name__)
 class VectorLoader:
     """Load embeddings into medical_rag_index table"""
     
+    # Upsert, so that reloading a record overwrites its chunks
+    UPSERT_QUERY = """
+    INSERT INTO medical_rag_index 
+        (odoo_model, odoo_res_id, chunk_index, content_text, metadata, embedding,
+         prescription_date, physician_id, diagnosis_codes, created_at, updated_at)
+    VALUES 
+        (:odoo_model, :odoo_res_id, :chunk_index, :content_text, CAST(:metadata AS jsonb), CAST(:embedding AS vector),
+         :prescription_date, :physician_id, CAST(:diagnosis_codes AS text[]), :created_at, :updated_at)
+    ON CONFLICT (odoo_model, odoo_res_id, chunk_index)
+    DO UPDATE SET
+        content_text = EXCLUDED.content_text,
+        metadata = EXCLUDED.metadata,
+        embedding = EXCLUDED.embedding,
+        prescription_date = EXCLUDED.prescription_date,
+        physician_id = EXCLUDED.physician_id,
+        diagnosis_codes = EXCLUDED.diagnosis_codes,
+        updated_at = EXCLUDED.updated_at
+    """
+    
     def __init__(self, engine: AsyncEngine):
         self.engine = engine
     
@@ -35,23 +55,47 @@ class VectorLoader:
         
         logger.info(f"Loading {len(records)} vectors into medical_rag_index")
         
-        # Use upsert to handle duplicates
-        query = """
-        INSERT INTO medical_rag_index 
-            (odoo_model, odoo_res_id, chunk_index, content_text, metadata, embedding, created_at, updated_at)
-        VALUES 
-            (:odoo_model, :odoo_res_id, :chunk_index, :content_text, CAST(:metadata AS jsonb), CAST(:embedding AS vector), :created_at, :updated_at)
-        ON CONFLICT (odoo_model, odoo_res_id, chunk_index)
-        DO UPDATE SET
-            content_text = EXCLUDED.content_text,
-            metadata = EXCLUDED.metadata,
-            embedding = EXCLUDED.embedding,
-            updated_at = EXCLUDED.updated_at
+        batch_data = self._prepare_rows(records)
+        
+        # Execute batch insert
+        async with self.engine.begin() as conn:
+            for data in batch_data:
+                await conn.execute(text(self.UPSERT_QUERY), data)
+        
+        logger.info(f"Successfully loaded {len(records)} vectors")
+        return len(records)
+    
+    async def replace_vectors(
+        self,
+        odoo_model: str,
+        odoo_res_ids: List[int],
+        records: List[Tuple[str, int, int, str, Dict, List[float]]]
+    ) -> int:
         """
+        Replace all chunks of the given records by new ones in one transaction,
+        so a failure never leaves a record with no chunks indexed
         
-        import json
+        Args:
+            odoo_model: Odoo model of the records
+            odoo_res_ids: Records whose existing chunks are removed
+            records: New chunks, as for load_vectors
+            
+        Returns:
+            Number of chunks loaded
+        """
+        async with self.engine.begin() as conn:
+            await conn.execute(
+                text("DELETE FROM medical_rag_index WHERE odoo_model = :odoo_model AND odoo_res_id = ANY(:odoo_res_ids)"),
+                {'odoo_model': odoo_model, 'odoo_res_ids': list(odoo_res_ids)}
+            )
+            for data in self._prepare_rows(records):
+                await conn.execute(text(self.UPSERT_QUERY), data)
         
-        # Prepare batch data
+        logger.info(f"Replaced {odoo_model} {list(odoo_res_ids)} with {len(records)} vectors")
+        return len(records)
+    
+    def _prepare_rows(self, records: List[Tuple[str, int, int, str, Dict, List[float]]]) -> List[Dict]:
+        """Query parameters of UPSERT_QUERY for each (odoo_model, odoo_res_id, chunk_index, content_text, metadata, embedding)"""
         batch_data = []
         now = datetime.now()
         
@@ -68,17 +112,29 @@ class VectorLoader:
                 'content_text': content_text,
                 'metadata': metadata_str,
                 'embedding': embedding_str,
+                **self._filter_columns(odoo_model, metadata),
                 'created_at': now,
                 'updated_at': now
             })
+        return batch_data
+    
+    def _filter_columns(self, odoo_model: str, metadata: Dict) -> Dict:
+        """Typed copies of the prescription metadata used by filtered search"""
+        if odoo_model != 'prescription.order.knk':
+            return {'prescription_date': None, 'physician_id': None, 'diagnosis_codes': None}
         
-        # Execute batch insert
-        async with self.engine.begin() as conn:
-            for data in batch_data:
-                await conn.execute(text(query), data)
+        prescription_date = None
+        try:
+            prescription_date = date.fromisoformat(str(metadata.get('prescription_date', ''))[:10])
+        except ValueError:
+            pass
         
-        logger.info(f"Successfully loaded {len(records)} vectors")
-        return len(records)
+        physician_id = metadata.get('physician_id')
+        return {
+            'prescription_date': prescription_date,
+            'physician_id': int(physician_id) if str(physician_id).isdigit() else None,
+            'diagnosis_codes': sorted({str(code).upper() for code in metadata.get('diagnosis_codes') or []})
+        }
     
     async def delete_model_vectors(self, odoo_model: str, odoo_res_id: int = None):
         """
@@ -0,0 +1,161 @@
+"""
+ETL Worker
+Standalone process that consumes jobs from etl_jobs and runs the ETL pipeline,
+keeping embedding/indexing load off the API serving process.
+
+Run with: python -m app.etl.worker
+"""
+import os
+import socket
+import asyncio
+import argparse
+import logging
+
+from .pipeline import ETLPipeline
+from .job_queue import ETLJobQueue, ETLJobCancelled, COMPLETED, FAILED, CANCELLED
+
+logger = logging.getLogger(__name__)
+
+
+class ETLWorker:
+    """Polls the job queue and runs claimed jobs one at a time"""
+
+    def __init__(self, worker_id: str = None, poll_interval: float = None):
+        self.worker_id = worker_id or os.getenv('ETL_WORKER_ID', socket.gethostname())
+        self.poll_interval = poll_interval or float(os.getenv('ETL_WORKER_POLL_SECONDS', '5'))
+        self.pipeline = ETLPipeline()
+        self.queue = ETLJobQueue(self.pipeline.engine)
+
+    async def _estimate_total(self, job: dict) -> int:
+        """Estimate the number of records a job will index (for ETA)"""
+        total = 0
+        for model in job['models']:
+            try:
+                count = await self.pipeline.extractor.count_records(
+                    model,
+                    incremental=job['incremental'] and model != 'medical.disease'
+                )
+            except Exception as e:
+                logger.warning(f"Could not count {model} records for job {job['id']}: {e}")
+                count = None
+            if count is None:
+                continue
+            if job.get('record_limit'):
+                count = min(count, job['record_limit'])
+            total += count
+        return total
+
+    async def run_ingest_job(self, job: dict):
+        """Run a push-ingestion job that indexes only the given record IDs"""
+        job_id = job['id']
+        odoo_model = job['models'][0]
+        logger.info(f"Worker {self.worker_id} running ingest job {job_id}: {len(job['res_ids'])} {odoo_model}")
+
+        try:
+            result = await self.pipeline.run_ids_indexing(odoo_model, job['res_ids'])
+            await self.queue.update_progress(
+                job_id,
+                odoo_model,
+                result['records_indexed'],
+                result['chunks_created'],
+                len(job['res_ids'])
+            )
+            await self.queue.finish(job_id, COMPLETED, result={odoo_model: result})
+        except Exception as e:
+            logger.error(f"Ingest job {job_id} failed: {e}")
+            await self.queue.finish(job_id, FAILED, error=str(e))
+
+    async def run_job(self, job: dict):
+        """Run a single claimed job, reporting progress after every page"""
+        if job.get('res_ids'):
+            return await self.run_ingest_job(job)
+
+        job_id = job['id']
+        logger.info(f"Worker {self.worker_id} running ETL job {job_id}: {job['models']}")
+
+        total_records = await self._estimate_total(job)
+        await self.queue.update_progress(job_id, None, 0, 0, total_records or None)
+
+        # Totals of models finished earlier in this job
+        finished = {'records': 0, 'chunks': 0}
+        current = {'model': None, 'records': 0, 'chunks': 0}
+
+        async def on_page(odoo_model: str, records_indexed: int, chunks_created: int):
+            if current['model'] != odoo_model:
+                finished['records'] += current['records']
+                finished['chunks'] += current['chunks']
+                current['model'] = odoo_model
+            current['records'] = records_indexed
+            current['chunks'] = chunks_created
+
+            cancel_requested = await self.queue.update_progress(
+                job_id,
+                odoo_model,
+                finished['records'] + records_indexed,
+                finished['chunks'] + chunks_created
+            )
+            if cancel_requested:
+                raise ETLJobCancelled(f"ETL job {job_id} cancelled")
+
+        try:
+            results = await self.pipeline.run_full_indexing(
+                models=job['models'],
+                limit=job.get('record_limit'),
+                incremental=job['incremental'],
+                resume=job['resume'],
+                on_page=on_page
+            )
+            summary = {
+                model: {
+                    'records_indexed': r['records_indexed'],
+                    'chunks_created': r['chunks_created'],
+                    # Edited while indexing; left unsynced for the next incremental run
+                    'records_changed': r['records_changed']
+                }
+                for model, r in results.items()
+            }
+            await self.queue.finish(job_id, COMPLETED, result=summary)
+        except ETLJobCancelled as e:
+            logger.info(str(e))
+            await self.queue.finish(job_id, CANCELLED)
+        except Exception as e:
+            logger.error(f"ETL job {job_id} failed: {e}")
+            await self.queue.finish(job_id, FAILED, error=str(e))
+
+    async def run(self, once: bool = False):
+        """Poll for queued jobs until stopped (or until the queue is empty with once=True)"""
+        requeued = await self.queue.requeue_stale(self.worker_id)
+        if requeued:
+            logger.info(f"Requeued {requeued} interrupted jobs for resume")
+
+        logger.info(f"ETL worker {self.worker_id} started")
+        try:
+            while True:
+                job = await self.queue.claim_next(self.worker_id)
+                if job:
+                    await self.run_job(job)
+                    continue
+                if once:
+                    break
+                await asyncio.sleep(self.poll_interval)
+        finally:
+            await self.pipeline.close()
+
+
+async def main():
+    """CLI entry point"""
+    parser = argparse.ArgumentParser(description='ETL job worker')
+    parser.add_argument('--once', action='store_true',
+                        help='Exit once the queue is empty')
+    parser.add_argument('--worker-id', type=str, help='Worker identifier (default: hostname)')
+
+    args = parser.parse_args()
+
+    from app.core.db_init import init_database
+    worker = ETLWorker(worker_id=args.worker_id)
+    await init_database(worker.pipeline.engine)
+    await worker.run(once=args.once)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -3,7 +3,9 @@ from app.api.v1.api import api_router
 from app.services.embedding_service import EmbeddingService
 from app.services.llm_service import LLMService
 from app.services.rag_service import RAGService
+from app.services.chat_job_service import ChatJobService
 from app.etl.pipeline import ETLPipeline
+from app.etl.job_queue import ETLJobQueue
 from app.core.config import settings
 import app.api.v1.endpoints.rag as rag_endpoints
 import app.api.v1.endpoints.etl as etl_endpoints
@@ -51,7 +53,9 @@ async def startup_event():
     rag_endpoints.embedding_service = embedding_service
     rag_endpoints.llm_service = llm_service
     rag_endpoints.rag_service = rag_service
+    rag_endpoints.chat_jobs = ChatJobService(rag_service)
     etl_endpoints.etl_pipeline = etl_pipeline
+    etl_endpoints.job_queue = ETLJobQueue(etl_pipeline.engine)
     config_endpoints.llm_service = llm_service
     
     logger.info("RAG Healthcare Service ready")
@@ -61,6 +65,10 @@ async def shutdown_event():
     """Cleanup on shutdown"""
     logger.info("Shutting down RAG Healthcare Service...")
     
+    # Let running chat jobs deliver their answers
+    if rag_endpoints.chat_jobs:
+        await rag_endpoints.chat_jobs.close()
+    
     # Close ETL pipeline if needed
     if etl_endpoints.etl_pipeline:
         await etl_endpoints.etl_pipeline.close()
@@ -22,6 +22,14 @@ class IndexMedicalRequest(BaseModel):
         default=None,
         description="Only index records from last N days"
     )
+    resume: bool = Field(
+        default=False,
+        description="If True, continue an interrupted run from its last committed page"
+    )
+    wait: bool = Field(
+        default=False,
+        description="If True, index inline in the API process and return the results instead of a job"
+    )
 
 class IndexMedicalResponse(BaseModel):
     """Response from medical data indexing"""
@@ -30,6 +38,71 @@ class IndexMedicalResponse(BaseModel):
     total_records: int
     total_chunks: int
 
+class ETLJobRequest(BaseModel):
+    """Request to enqueue a background indexing job"""
+    models: List[str] = Field(
+        default=['wk.appointment', 'prescription.order.knk'],
+        description="List of Odoo models to index"
+    )
+    incremental: bool = Field(
+        default=True,
+        description="If True, only index new/modified records"
+    )
+    limit: Optional[int] = Field(
+        default=None,
+        description="Maximum number of records to index per model"
+    )
+    resume: bool = Field(
+        default=False,
+        description="If True, continue interrupted runs from their last committed page"
+    )
+
+class IngestRequest(BaseModel):
+    """Changed record IDs pushed from the Odoo change outbox"""
+    odoo_model: str = Field(..., description="Odoo model of the changed records")
+    res_ids: List[int] = Field(..., description="IDs of records created or modified in Odoo")
+
+class AttachmentIngestRequest(BaseModel):
+    """Extracted text of a chat attachment to chunk, embed and index"""
+    attachment_id: int = Field(..., description="ir.attachment ID in Odoo")
+    name: str = Field(..., description="File name, repeated at the top of every chunk")
+    text: str = Field(..., description="Text extracted from the attachment")
+    mimetype: Optional[str] = None
+    checksum: Optional[str] = None
+    patient_seq: Optional[str] = Field(
+        default=None,
+        description="Optional: Patient ID (seq) the document belongs to, when known"
+    )
+    channel_id: Optional[int] = Field(default=None, description="Discuss channel the file was posted in")
+
+class AttachmentIngestResponse(BaseModel):
+    """Result of indexing one attachment"""
+    attachment_id: int
+    chunks_created: int
+
+class ETLJobResponse(BaseModel):
+    """State and progress of a background indexing job"""
+    id: int
+    status: str
+    models: List[str]
+    res_ids: Optional[List[int]] = None
+    incremental: bool
+    resume: bool
+    cancel_requested: bool = False
+    current_model: Optional[str] = None
+    records_indexed: int = 0
+    chunks_created: int = 0
+    total_records: Optional[int] = None
+    records_per_sec: float = 0.0
+    chunks_per_sec: float = 0.0
+    elapsed_seconds: Optional[float] = None
+    eta_seconds: Optional[float] = None
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    created_at: Optional[str] = None
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+
 # --- Query Models ---
 
 class QueryRequest(BaseModel):
@@ -54,9 +127,36 @@ class ChatRequest(BaseModel):
     )
     chat_history: Optional[List[dict]] = Field(
         default=None,
-        description="Optional: Previous chat messages as context. Each entry has 'role' (user/assistant) and 'content'."
+        description="Deprecated: history is kept server-side per session_id. Only used to seed a session "
+                    "the service has no history for. Each entry has 'role' (user/assistant) and 'content'."
     )
 
+class ChatTurnRequest(BaseModel):
+    """A chat turn answered by the client itself, recorded in the session history"""
+    session_id: str = Field(..., description="Conversation the turn belongs to")
+    prompt: str = Field(..., description="User's message")
+    response: str = Field(..., description="Answer shown to the user")
+    patient_seq: Optional[str] = Field(default=None, description="Optional: Patient ID (seq) of the conversation")
+
+class ChatJobRequest(ChatRequest):
+    """Asynchronous conversational RAG request; the answer is POSTed to callback_url"""
+    callback_url: str = Field(..., description="JSON-RPC URL the finished answer is posted to")
+    callback_token: Optional[str] = Field(
+        default=None,
+        description="Opaque token echoed back in the callback so the caller can authenticate it"
+    )
+    job_ref: Optional[str] = Field(
+        default=None,
+        description="Caller's own job reference, echoed back in the callback"
+    )
+
+class ChatJobResponse(BaseModel):
+    """Accepted chat job"""
+    job_id: str
+    status: str
+    job_ref: Optional[str] = None
+    error: Optional[str] = None
+
 class PatientQueryRequest(BaseModel):
     """Request to query patient-specific medical history"""
     patient_seq: str = Field(
@@ -103,6 +203,18 @@ class PrescriptionQueryRequest(BaseModel):
         description="Maximum number of results"
     )
 
+class AttachmentSearchRequest(BaseModel):
+    """Retrieve the attachment chunks most relevant to a question"""
+    prompt: str = Field(..., description="Natural language question")
+    attachment_ids: List[int] = Field(..., description="Indexed ir.attachment IDs to search")
+    limit: int = Field(default=5, description="Maximum number of chunks")
+
+class AttachmentSearchResponse(BaseModel):
+    """Relevant attachment chunks, best match first"""
+    chunks: List[dict] = Field(
+        description="Each with attachment_id, name, chunk_index, content and similarity"
+    )
+
 class RAGQueryResponse(BaseModel):
     """Response from RAG query"""
     response: str = Field(
@@ -120,5 +232,7 @@ class IndexStatusResponse(BaseModel):
     """Response for index status check"""
     index_stats: dict
     etl_metadata: dict
+    checkpoints: dict = {}
     total_indexed_records: int
     total_chunks: int
+    index_version: str = ''  # Changes whenever the index contents change (used for response caching)
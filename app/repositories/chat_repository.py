@@ -0,0 +1,127 @@
+"""
+Chat History Repository - Server-side conversation state per session_id
+Stores recent turns verbatim in chat_messages and older turns as a rolling
+summary on the chat_sessions row.
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(content: str) -> int:
+    """Rough LLM token count (~4 characters per token), good enough for budgeting"""
+    return len(content or '') // 4 + 1
+
+
+class ChatHistoryRepository:
+    """Repository for chat_sessions / chat_messages (caller commits the session)"""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Conversation state of a session, or None if it has none"""
+        result = await self.session.execute(
+            text("""
+                SELECT patient_seq, summary, message_count
+                FROM chat_sessions WHERE session_id = :session_id
+            """),
+            {'session_id': session_id}
+        )
+        row = result.fetchone()
+        if row is None:
+            return None
+        return {'patient_seq': row[0], 'summary': row[1], 'message_count': row[2]}
+
+    async def get_messages(self, session_id: str) -> List[Dict[str, Any]]:
+        """Turns not yet folded into the summary, oldest first"""
+        result = await self.session.execute(
+            text("""
+                SELECT id, role, content, token_count
+                FROM chat_messages WHERE session_id = :session_id
+                ORDER BY id
+            """),
+            {'session_id': session_id}
+        )
+        return [
+            {'id': row[0], 'role': row[1], 'content': row[2], 'token_count': row[3]}
+            for row in result.fetchall()
+        ]
+
+    async def append(
+        self,
+        session_id: str,
+        messages: List[Dict[str, str]],
+        patient_seq: Optional[str] = None
+    ) -> int:
+        """
+        Append turns to a session, creating it if needed
+
+        Returns:
+            Total number of messages ever appended to the session
+        """
+        now = datetime.now()
+        result = await self.session.execute(
+            text("""
+                INSERT INTO chat_sessions (session_id, patient_seq, message_count, created_at, updated_at)
+                VALUES (:session_id, :patient_seq, :count, :now, :now)
+                ON CONFLICT (session_id) DO UPDATE SET
+                    patient_seq = COALESCE(EXCLUDED.patient_seq, chat_sessions.patient_seq),
+                    message_count = chat_sessions.message_count + EXCLUDED.message_count,
+                    updated_at = EXCLUDED.updated_at
+                RETURNING message_count
+            """),
+            {'session_id': session_id, 'patient_seq': patient_seq, 'count': len(messages), 'now': now}
+        )
+        message_count = result.scalar()
+
+        if messages:
+            await self.session.execute(
+                text("""
+                    INSERT INTO chat_messages (session_id, role, content, token_count, created_at)
+                    VALUES (:session_id, :role, :content, :token_count, :now)
+                """),
+                [
+                    {
+                        'session_id': session_id,
+                        'role': 'assistant' if msg.get('role') == 'assistant' else 'user',
+                        'content': msg.get('content', ''),
+                        'token_count': estimate_tokens(msg.get('content', '')),
+                        'now': now
+                    }
+                    for msg in messages
+                ]
+            )
+        return message_count
+
+    async def fold_into_summary(self, session_id: str, summary: str, through_id: int):
+        """Replace all turns up to through_id with the new rolling summary"""
+        await self.session.execute(
+            text("UPDATE chat_sessions SET summary = :summary WHERE session_id = :session_id"),
+            {'session_id': session_id, 'summary': summary}
+        )
+        await self.session.execute(
+            text("DELETE FROM chat_messages WHERE session_id = :session_id AND id <= :through_id"),
+            {'session_id': session_id, 'through_id': through_id}
+        )
+
+    async def reset(self, session_id: str):
+        """Forget a session's conversation (messages cascade)"""
+        await self.session.execute(
+            text("DELETE FROM chat_sessions WHERE session_id = :session_id"),
+            {'session_id': session_id}
+        )
+
+    async def prune(self, idle_days: int) -> int:
+        """Delete sessions idle for more than idle_days"""
+        result = await self.session.execute(
+            text("DELETE FROM chat_sessions WHERE updated_at < :cutoff"),
+            {'cutoff': datetime.now() - timedelta(days=idle_days)}
+        )
+        if result.rowcount:
+            logger.info(f"Pruned {result.rowcount} idle chat sessions")
+        return result.rowcount
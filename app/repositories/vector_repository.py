@@ -4,6 +4,7 @@ Queries the unified medical_rag_index table
 """
 import json
 import logging
+from datetime import date
 from typing import List, Dict, Any, Optional
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -23,7 +24,8 @@ class VectorRepository:
         self,
         query_embedding: List[float],
         limit: int = 5,
-        metadata_filter: Optional[Dict[str, Any]] = None
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        include_attachments: bool = False
     ) -> List[Dict[str, Any]]:
         """
         Search for similar vectors using cosine similarity
@@ -32,6 +34,8 @@ class VectorRepository:
             query_embedding: Query vector
             limit: Maximum number of results
             metadata_filter: Optional metadata filters
+            include_attachments: Also search chat attachment chunks ('ir.attachment'),
+                which belong to a Discuss channel and are otherwise excluded
             
         Returns:
             List of similar records with content, metadata, and similarity score
@@ -39,9 +43,10 @@ class VectorRepository:
         embedding_str = '[' + ','.join(map(str, query_embedding)) + ']'
         
         # Build WHERE clause for metadata filtering
-        where_clause = ""
+        conditions = []
+        if not include_attachments:
+            conditions.append("odoo_model <> 'ir.attachment'")
         if metadata_filter:
-            conditions = []
             for key, value in metadata_filter.items():
                 if key == 'patient_name':
                     # Fuzzy match for names
@@ -49,7 +54,7 @@ class VectorRepository:
                 else:
                     # Exact match for IDs and other fields
                     conditions.append(f"metadata->>'{key}' = '{value}'")
-            where_clause = "WHERE " + " AND ".join(conditions)
+        where_clause = "WHERE " + " AND ".join(conditions) if conditions else ""
         
         search_sql = f"""
         SELECT * FROM (
@@ -98,6 +103,184 @@ class VectorRepository:
         
         return results
         
+    async def search_prescriptions(
+        self,
+        query_embedding: List[float],
+        limit: int = 5,
+        diagnosis_code: Optional[str] = None,
+        physician_id: Optional[int] = None,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        medication: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Filtered similarity search over prescription chunks
+        
+        Filters run first on the promoted, indexed columns (prescription_date,
+        physician_id, GIN diagnosis_codes); only the matching chunks are ranked
+        by exact cosine distance. Without filters the HNSW index ranks directly.
+        Returns the best chunk per prescription.
+        """
+        conditions = ["odoo_model = 'prescription.order.knk'"]
+        params = {
+            'query_embedding': '[' + ','.join(map(str, query_embedding)) + ']',
+            # Over-fetch chunks so that `limit` distinct prescriptions remain
+            'limit': limit * 3
+        }
+        if diagnosis_code:
+            conditions.append("diagnosis_codes @> ARRAY[CAST(:diagnosis_code AS text)]")
+            params['diagnosis_code'] = diagnosis_code.upper()
+        if physician_id:
+            conditions.append("physician_id = :physician_id")
+            params['physician_id'] = physician_id
+        if date_from:
+            conditions.append("prescription_date >= :date_from")
+            params['date_from'] = date_from
+        if date_to:
+            conditions.append("prescription_date <= :date_to")
+            params['date_to'] = date_to
+        if medication:
+            conditions.append("content_text ILIKE :medication")
+            params['medication'] = f"%{medication}%"
+        
+        where_clause = " AND ".join(conditions)
+        if len(conditions) > 1:
+            # MATERIALIZED keeps the planner from pushing the filter below an ANN
+            # index scan, which could return fewer than `limit` matching rows
+            search_sql = f"""
+            WITH candidates AS MATERIALIZED (
+                SELECT id, content_text, metadata, odoo_model, odoo_res_id, embedding
+                FROM {TABLE_NAME}
+                WHERE {where_clause}
+            )
+            SELECT id, content_text, metadata, odoo_model, odoo_res_id,
+                   1 - (embedding <=> CAST(:query_embedding AS vector)) AS similarity
+            FROM candidates
+            ORDER BY embedding <=> CAST(:query_embedding AS vector)
+            LIMIT :limit
+            """
+        else:
+            search_sql = f"""
+            SELECT id, content_text, metadata, odoo_model, odoo_res_id,
+                   1 - (embedding <=> CAST(:query_embedding AS vector)) AS similarity
+            FROM {TABLE_NAME}
+            WHERE {where_clause}
+            ORDER BY embedding <=> CAST(:query_embedding AS vector)
+            LIMIT :limit
+            """
+        
+        result = await self.session.execute(text(search_sql), params)
+        
+        results = []
+        seen = set()
+        for row in result.fetchall():
+            if row[4] in seen:
+                continue
+            seen.add(row[4])
+            
+            metadata = row[2] if row[2] else {}
+            if isinstance(metadata, str):
+                try:
+                    metadata = json.loads(metadata)
+                except (json.JSONDecodeError, TypeError):
+                    metadata = {}
+            
+            results.append({
+                'id': row[0],
+                'content': row[1],
+                'metadata': metadata,
+                'source_model': row[3],
+                'source_id': row[4],
+                'similarity': float(row[5]) if row[5] else 0.0
+            })
+            if len(results) >= limit:
+                break
+        
+        return results
+        
+    async def search_attachments(
+        self,
+        query_embedding: List[float],
+        attachment_ids: List[int],
+        limit: int = 5
+    ) -> List[Dict[str, Any]]:
+        """
+        Similarity search restricted to the chunks of the given chat attachments
+        (odoo_model 'ir.attachment'), ranked by exact cosine distance
+        """
+        if not attachment_ids:
+            return []
+        
+        search_sql = f"""
+        WITH candidates AS MATERIALIZED (
+            SELECT id, content_text, metadata, odoo_res_id, chunk_index, embedding
+            FROM {TABLE_NAME}
+            WHERE odoo_model = 'ir.attachment' AND odoo_res_id = ANY(:attachment_ids)
+        )
+        SELECT id, content_text, metadata, odoo_res_id, chunk_index,
+               1 - (embedding <=> CAST(:query_embedding AS vector)) AS similarity
+        FROM candidates
+        ORDER BY embedding <=> CAST(:query_embedding AS vector)
+        LIMIT :limit
+        """
+        result = await self.session.execute(
+            text(search_sql),
+            {
+                'query_embedding': '[' + ','.join(map(str, query_embedding)) + ']',
+                'attachment_ids': list(attachment_ids),
+                'limit': limit
+            }
+        )
+        
+        results = []
+        for row in result.fetchall():
+            metadata = row[2] if row[2] else {}
+            if isinstance(metadata, str):
+                try:
+                    metadata = json.loads(metadata)
+                except (json.JSONDecodeError, TypeError):
+                    metadata = {}
+            
+            results.append({
+                'attachment_id': row[3],
+                'name': metadata.get('attachment_name'),
+                'chunk_index': row[4],
+                'content': row[1],
+                'similarity': float(row[5]) if row[5] else 0.0
+            })
+        return results
+        
+    async def get_patient_summary(self, patient_seq: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the precomputed summary row of a patient (see app.etl.patient_summary)
+        
+        Returns:
+            Summary dict, or None if the patient has no indexed prescriptions
+        """
+        query = """
+        SELECT patient_seq, patient_id, prescription_count, latest_prescription_id,
+               latest_prescription_date, latest_vitals, active_medications, diagnoses,
+               summary_text, updated_at
+        FROM patient_summaries
+        WHERE patient_seq = :patient_seq
+        """
+        result = await self.session.execute(text(query), {'patient_seq': patient_seq})
+        row = result.fetchone()
+        if not row:
+            return None
+        
+        summary = dict(row._mapping)
+        for key in ('latest_vitals', 'active_medications', 'diagnoses'):
+            if isinstance(summary[key], str):
+                try:
+                    summary[key] = json.loads(summary[key])
+                except (json.JSONDecodeError, TypeError):
+                    summary[key] = None
+        for key in ('latest_prescription_date', 'updated_at'):
+            if summary[key]:
+                summary[key] = summary[key].isoformat()
+        return summary
+        
     async def get_patient_records(self, patient_seq: Optional[str] = None, limit: int = 1000) -> List[Dict[str, Any]]:
         """
         Retrieve all raw indexed chunks directly from DB.
@@ -0,0 +1,152 @@
+"""
+Chat Job Service - Runs conversational RAG requests in the background and
+posts each finished answer to the caller's callback URL, so callers (Odoo)
+never hold a connection open for the LLM's latency.
+"""
+import os
+import uuid
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+import aiohttp
+
+from app.core.database import AsyncSessionLocal
+from app.models.schemas import ChatJobRequest
+from app.services.rag_service import RAGService
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DELIVERED = 'delivered'
+FAILED = 'failed'
+
+# Finished jobs kept for GET /rag/chat/jobs/{job_id}
+MAX_FINISHED_JOBS = 1000
+
+
+class ChatJobService:
+    """Bounded background runner for chat jobs, serialized per chat session"""
+
+    def __init__(self, rag_service: RAGService):
+        self.rag_service = rag_service
+        self.semaphore = asyncio.Semaphore(int(os.getenv('CHAT_JOB_CONCURRENCY', '8')))
+        self.callback_retries = int(os.getenv('CHAT_JOB_CALLBACK_RETRIES', '3'))
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self._session_locks: Dict[str, asyncio.Lock] = {}
+        self._session_users: Dict[str, int] = {}
+        self._tasks = set()
+        self._http: Optional[aiohttp.ClientSession] = None
+
+    def submit(
+        self,
+        request: ChatJobRequest,
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        system_instruction: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Queue a chat job and return its state immediately"""
+        job_id = uuid.uuid4().hex
+        job = {
+            'job_id': job_id,
+            'job_ref': request.job_ref,
+            'session_id': request.session_id,
+            'status': QUEUED,
+            'error': None,
+            'created_at': datetime.now().isoformat()
+        }
+        self.jobs[job_id] = job
+        task = asyncio.create_task(self._run(job, request, metadata_filter, system_instruction))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.jobs.get(job_id)
+
+    async def _run(
+        self,
+        job: Dict[str, Any],
+        request: ChatJobRequest,
+        metadata_filter: Optional[Dict[str, Any]],
+        system_instruction: Optional[str]
+    ):
+        # Turns of one session run in submission order (they share server-side history)
+        session_lock = self._acquire_session_lock(request.session_id)
+        payload = {'job_id': job['job_id'], 'job_ref': request.job_ref, 'token': request.callback_token}
+        try:
+            async with session_lock, self.semaphore:
+                job['status'] = RUNNING
+                async with AsyncSessionLocal() as session:
+                    result = await self.rag_service.chat(
+                        prompt=request.prompt,
+                        session_id=request.session_id,
+                        session=session,
+                        reset=request.reset,
+                        limit=5,
+                        metadata_filter=metadata_filter,
+                        system_instruction=system_instruction,
+                        chat_history=request.chat_history
+                    )
+            payload.update(status='success', response=result['response'], metadata=result['metadata'])
+        except Exception as e:
+            logger.error(f"Chat job {job['job_id']} failed: {e}")
+            payload.update(status='error', message=str(e))
+        finally:
+            self._release_session_lock(request.session_id)
+
+        delivered = await self._deliver(request.callback_url, payload)
+        job['status'] = DELIVERED if delivered else FAILED
+        if payload['status'] == 'error':
+            job['error'] = payload['message']
+        elif not delivered:
+            job['error'] = 'Callback delivery failed'
+        job['finished_at'] = datetime.now().isoformat()
+        self._prune()
+
+    async def _deliver(self, callback_url: str, params: Dict[str, Any]) -> bool:
+        """POST the result as a JSON-RPC call, retrying with backoff"""
+        body = {"jsonrpc": "2.0", "method": "call", "params": params}
+        for attempt in range(self.callback_retries):
+            try:
+                async with self._get_http().post(callback_url, json=body) as response:
+                    if response.status == 200:
+                        result = (await response.json()).get('result') or {}
+                        if result.get('status') == 'success':
+                            return True
+                        # Rejected by the caller (unknown job, bad token): retrying will not help
+                        logger.error(f"Callback for job {params['job_id']} rejected: {result.get('message')}")
+                        return False
+                    logger.warning(f"Callback for job {params['job_id']} returned HTTP {response.status}")
+            except Exception as e:
+                logger.warning(f"Callback for job {params['job_id']} failed (attempt {attempt + 1}): {e}")
+            await asyncio.sleep(2 ** attempt)
+        return False
+
+    def _get_http(self) -> aiohttp.ClientSession:
+        if self._http is None or self._http.closed:
+            self._http = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30))
+        return self._http
+
+    def _acquire_session_lock(self, session_id: str) -> asyncio.Lock:
+        self._session_users[session_id] = self._session_users.get(session_id, 0) + 1
+        return self._session_locks.setdefault(session_id, asyncio.Lock())
+
+    def _release_session_lock(self, session_id: str):
+        self._session_users[session_id] -= 1
+        if not self._session_users[session_id]:
+            del self._session_users[session_id]
+            del self._session_locks[session_id]
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job['status'] in (DELIVERED, FAILED)]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+
+    async def close(self):
+        """Wait briefly for running jobs, then close the callback HTTP session"""
+        if self._tasks:
+            await asyncio.wait(list(self._tasks), timeout=30)
+        if self._http and not self._http.closed:
+            await self._http.close()
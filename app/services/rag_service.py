@@ -1,15 +1,47 @@
 """
 RAG Service - Orchestrates Retrieval-Augmented Generation
 """
+import os
+import re
 import logging
+from datetime import date
 from typing import List, Dict, Any, Optional
 from app.services.embedding_service import EmbeddingService
 from app.services.llm_service import LLMService
 from app.repositories.vector_repository import VectorRepository
+from app.repositories.chat_repository import ChatHistoryRepository, estimate_tokens
 from sqlalchemy.ext.asyncio import AsyncSession
 
 logger = logging.getLogger(__name__)
 
+# Whole prompts asking for an overview, which the precomputed patient summary
+# answers on its own (no chunk retrieval), e.g. "summary", "give me an overview
+# of the patient", "what are the current conditions?"
+OVERVIEW_QUESTION = re.compile(r"""
+    (please\s+)?
+    (
+        summari[sz]e(\s+(the|this)\s+patient('s)?)?(\s+history)?
+      | (give\s+(me\s+)?|show\s+(me\s+)?|what\s+(is|are)\s+)?
+        (an?\s+|the\s+)?(patient'?s?\s+|(his|her|their)\s+)?
+        (overview|summary|current\s+(conditions?|diagnos[ie]s|status)
+         |active\s+(conditions?|diagnos[ie]s|problems)|(latest\s+)?vitals)
+        (\s+of\s+(the|this)\s+patient)?
+    )
+    \s*[?.!]*
+""", re.IGNORECASE | re.VERBOSE)
+
+# If filtering by patient, strictly confine LLM to their history
+PATIENT_SYSTEM_INSTRUCTION = (
+    "You are a medical AI assistant tailored to analyze a specific patient's context. "
+    "The provided context contains the known medical history for this patient. "
+    "If the user asks about a symptom or condition that is NOT explicitly mentioned "
+    "in the records, DO NOT simply say it's not present. Instead, analyze the patient's "
+    "existing medical history (e.g., past diseases, medications, chief complaints like heart issues) "
+    "and provide medical guidance on how the new symptom might be related to their known underlying conditions. "
+    "Offer plausible connections based on medical knowledge and strongly advise seeking immediate care "
+    "if their history warrants it."
+)
+
 class RAGService:
     """Service for orchestrating RAG pipeline: Embed -> Retrieve -> Generate"""
     
@@ -20,6 +52,9 @@ class RAGService:
     ):
         self.embedding_service = embedding_service
         self.llm_service = llm_service
+        # Verbatim chat history kept per session before older turns are summarized
+        self.chat_history_token_budget = int(os.getenv('CHAT_HISTORY_TOKEN_BUDGET', '2000'))
+        self.chat_retention_days = int(os.getenv('CHAT_HISTORY_RETENTION_DAYS', '30'))
     
     async def query(
         self,
@@ -96,6 +131,169 @@ class RAGService:
             }
         }
     
+    async def query_patient(
+        self,
+        prompt: str,
+        patient_seq: str,
+        session: AsyncSession,
+        limit: int = 5,
+        system_instruction: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Answer a question about one patient, starting from their precomputed summary
+        
+        Overview questions (current medications, diagnoses, latest vitals) are
+        answered from the summary row alone; other questions add the patient's
+        most similar chunks. Falls back to plain retrieval if no summary exists.
+        
+        Returns:
+            Dict with response, sources, and metadata
+        """
+        vector_repo = VectorRepository(session)
+        summary = await vector_repo.get_patient_summary(patient_seq)
+        if summary is None:
+            result = await self.query(
+                prompt=prompt,
+                session=session,
+                limit=limit,
+                metadata_filter={'patient_seq': patient_seq},
+                system_instruction=system_instruction
+            )
+            result['metadata']['summary_used'] = False
+            return result
+        
+        similar_docs = []
+        if not OVERVIEW_QUESTION.fullmatch(prompt.strip()):
+            query_embedding = await self.embedding_service.generate_embedding(prompt)
+            similar_docs = await vector_repo.search_similar(
+                query_embedding=query_embedding,
+                limit=limit,
+                metadata_filter={'patient_seq': patient_seq}
+            )
+        logger.info(f"Patient query for {patient_seq}: summary + {len(similar_docs)} chunks")
+        
+        context = summary['summary_text']
+        if similar_docs:
+            context += "\n\n" + self._build_context(similar_docs)
+        
+        try:
+            answer = await self.llm_service.generate_answer(
+                prompt=prompt,
+                context=context,
+                system_instruction=system_instruction
+            )
+        except Exception as llm_error:
+            logger.warning(f"LLM generation failed: {llm_error}")
+            answer = f"[LLM unavailable - showing retrieved medical context]\n\n{context}"
+        
+        sources = [{
+            'content': summary['summary_text'],
+            'metadata': {k: v for k, v in summary.items() if k != 'summary_text'},
+            'similarity': 1.0
+        }] + [
+            {
+                'content': doc['content'][:200] + '...' if len(doc['content']) > 200 else doc['content'],
+                'metadata': doc['metadata'],
+                'similarity': doc['similarity']
+            }
+            for doc in similar_docs
+        ]
+        
+        return {
+            'response': answer,
+            'sources': sources,
+            'metadata': {
+                'num_sources': len(sources),
+                'filters_applied': {'patient_seq': patient_seq},
+                'summary_used': True
+            }
+        }
+    
+    async def search_attachments(
+        self,
+        prompt: str,
+        attachment_ids: List[int],
+        session: AsyncSession,
+        limit: int = 5
+    ) -> List[Dict[str, Any]]:
+        """
+        Retrieve the chunks of indexed chat attachments most relevant to a
+        question, so callers send excerpts to their LLM instead of whole files
+        """
+        query_embedding = await self.embedding_service.generate_embedding(prompt)
+        vector_repo = VectorRepository(session)
+        return await vector_repo.search_attachments(
+            query_embedding=query_embedding,
+            attachment_ids=attachment_ids,
+            limit=limit
+        )
+    
+    async def query_prescriptions(
+        self,
+        prompt: str,
+        session: AsyncSession,
+        limit: int = 5,
+        diagnosis_code: Optional[str] = None,
+        physician_id: Optional[int] = None,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        medication: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Search prescriptions with structured filters, then answer from the matches
+        
+        Returns:
+            Dict with response, sources, and metadata
+        """
+        logger.info(f"Prescription query: {prompt[:100]}...")
+        
+        query_embedding = await self.embedding_service.generate_embedding(prompt)
+        
+        filters = {
+            'diagnosis_code': diagnosis_code,
+            'physician_id': physician_id,
+            'date_from': date_from,
+            'date_to': date_to,
+            'medication': medication
+        }
+        vector_repo = VectorRepository(session)
+        similar_docs = await vector_repo.search_prescriptions(
+            query_embedding=query_embedding,
+            limit=limit,
+            **filters
+        )
+        logger.debug(f"Retrieved {len(similar_docs)} prescriptions")
+        
+        context = self._build_context(similar_docs)
+        
+        try:
+            answer = await self.llm_service.generate_answer(prompt=prompt, context=context)
+        except Exception as llm_error:
+            logger.warning(f"LLM generation failed: {llm_error}")
+            answer = (
+                f"[LLM unavailable - showing retrieved medical context]\n\n"
+                f"Found {len(similar_docs)} matching prescriptions:\n\n"
+                f"{context}"
+            )
+        
+        sources = [
+            {
+                'content': doc['content'][:200] + '...' if len(doc['content']) > 200 else doc['content'],
+                'metadata': doc['metadata'],
+                'similarity': doc['similarity']
+            }
+            for doc in similar_docs
+        ]
+        
+        return {
+            'response': answer,
+            'sources': sources,
+            'metadata': {
+                'num_sources': len(similar_docs),
+                'filters_applied': {k: str(v) if isinstance(v, date) else v for k, v in filters.items() if v}
+            }
+        }
+    
     async def chat(
         self,
         prompt: str,
@@ -110,6 +308,9 @@ class RAGService:
         """
         Execute Conversational RAG query: embed question, retrieve context, append to session history
         
+        Conversation state lives server-side per session_id, so clients only send
+        the new turn.
+        
         Args:
             prompt: User's question
             session_id: Unique identifier for the conversation session
@@ -118,57 +319,52 @@ class RAGService:
             limit: Number of similar documents to retrieve
             metadata_filter: Optional filters for retrieval
             system_instruction: Optional system instruction for LLM
-            chat_history: Optional list of previous messages [{"role": "user"/"assistant", "content": "..."}]
+            chat_history: Previous messages from legacy clients; only used to seed a session
+                          the service has no history for yet
             
         Returns:
             Dict with response, sources, and metadata
         """
         logger.info(f"RAG chat (session {session_id}): {prompt[:100]}...")
-        if chat_history:
-            logger.info(f"Received {len(chat_history)} messages as chat history context")
+        history_repo = ChatHistoryRepository(session)
         
         # --- SESSION PERSISTENCE LOGIC ---
         current_patient_seq = metadata_filter.get('patient_seq') if metadata_filter else None
         
         if reset:
-            if session_id in self.llm_service.chat_sessions:
-                self.llm_service.chat_sessions[session_id]['patient_seq'] = None
+            await history_repo.reset(session_id)
+            state = None
         else:
-            if not current_patient_seq and session_id in self.llm_service.chat_sessions:
-                current_patient_seq = self.llm_service.chat_sessions[session_id].get('patient_seq')
-                if current_patient_seq:
-                    logger.info(f"Recovered patient_seq '{current_patient_seq}' from session '{session_id}'")
-                    if metadata_filter is None:
-                        metadata_filter = {}
-                    metadata_filter['patient_seq'] = current_patient_seq
-                    
-                    if system_instruction is None:
-                        system_instruction = (
-                            "You are a medical AI assistant tailored to analyze a specific patient's context. "
-                            "The provided context contains the known medical history for this patient. "
-                            "If the user asks about a symptom or condition that is NOT explicitly mentioned "
-                            "in the records, DO NOT simply say it's not present. Instead, analyze the patient's "
-                            "existing medical history (e.g., past diseases, medications, chief complaints like heart issues) "
-                            "and provide medical guidance on how the new symptom might be related to their known underlying conditions. "
-                            "Offer plausible connections based on medical knowledge and strongly advise seeking immediate care "
-                            "if their history warrants it."
-                        )
+            state = await history_repo.get_session(session_id)
+            if not current_patient_seq and state and state['patient_seq']:
+                current_patient_seq = state['patient_seq']
+                logger.info(f"Recovered patient_seq '{current_patient_seq}' from session '{session_id}'")
+                if metadata_filter is None:
+                    metadata_filter = {}
+                metadata_filter['patient_seq'] = current_patient_seq
+                
+                if system_instruction is None:
+                    system_instruction = PATIENT_SYSTEM_INSTRUCTION
 
         # In case it's a reset with no meaningful prompt
         if reset and not prompt.strip():
-            # Just reset the LLM memory
-            await self.llm_service.generate_chat_answer(
-                session_id=session_id,
-                prompt="Initialize",
-                reset=True,
-                patient_seq=current_patient_seq
-            )
+            await session.commit()
             return {
                 'response': "Conversation history cleared successfully.",
                 'sources': [],
                 'metadata': {'num_sources': 0, 'session_id': session_id, 'reset': True, 'context_preserved': False, 'message_count': 0}
             }
         
+        if state is None:
+            # New conversation: good moment to drop sessions nobody came back to
+            await history_repo.prune(self.chat_retention_days)
+            if chat_history and not reset:
+                logger.info(f"Seeding session {session_id} with {len(chat_history)} client-side messages")
+                await history_repo.append(session_id, chat_history, current_patient_seq)
+        summary = state['summary'] if state else None
+        history = await history_repo.get_messages(session_id)
+        await session.commit()
+        
         # Step 1: Generate embedding for the new user message
         query_embedding = await self.embedding_service.generate_embedding(prompt)
         
@@ -183,25 +379,28 @@ class RAGService:
         # Step 3: Parse and build medical document context string
         context = self._build_context(similar_docs)
         
-        # Step 4: Inject into LLM Chat Session
-        context_preserved = False
-        message_count = 1
+        # Step 4: Answer from summary + recent turns, then append the new turn
+        context_preserved = bool(summary or history)
+        message_count = state['message_count'] if state else len(history)
         try:
-            chat_result = await self.llm_service.generate_chat_answer(
-                session_id=session_id,
+            answer = await self.llm_service.generate_chat_answer(
                 prompt=prompt,
                 context=context,
                 system_instruction=system_instruction,
-                reset=reset,
-                patient_seq=current_patient_seq,
-                chat_history=chat_history,
+                summary=summary,
+                history=history
+            )
+            message_count = await history_repo.append(
+                session_id,
+                [{'role': 'user', 'content': prompt}, {'role': 'assistant', 'content': answer}],
+                current_patient_seq
             )
-            answer = chat_result['text']
-            context_preserved = chat_result.get('context_preserved', False)
-            message_count = chat_result.get('message_count', 1)
+            await self._compact_history(history_repo, session_id, summary, history, prompt, answer)
+            await session.commit()
             logger.info(f"Chat answer generated successfully for session {session_id} (context_preserved={context_preserved}, msg#{message_count})")
         except Exception as llm_error:
             logger.warning(f"LLM chat generation failed: {llm_error}")
+            await session.rollback()
             answer = (
                 f"[LLM unavailable - showing retrieved medical context]\n\n"
                 f"Found {len(similar_docs)} relevant medical records:\n\n"
@@ -228,10 +427,76 @@ class RAGService:
                 'reset_applied': reset,
                 'context_preserved': context_preserved,
                 'message_count': message_count,
-                'chat_history_length': len(chat_history) if chat_history else 0
+                'chat_history_length': len(history),
+                'summary_used': bool(summary)
             }
         }
     
+    async def record_chat_turn(
+        self,
+        session_id: str,
+        prompt: str,
+        answer: str,
+        session: AsyncSession,
+        patient_seq: Optional[str] = None
+    ) -> int:
+        """
+        Append a turn the client answered itself (e.g. from its response cache)
+        to the session history, so follow-up questions keep their context
+        
+        Returns:
+            Total number of messages of the session
+        """
+        history_repo = ChatHistoryRepository(session)
+        state = await history_repo.get_session(session_id)
+        history = await history_repo.get_messages(session_id)
+        message_count = await history_repo.append(
+            session_id,
+            [{'role': 'user', 'content': prompt}, {'role': 'assistant', 'content': answer}],
+            patient_seq
+        )
+        await self._compact_history(
+            history_repo, session_id, state['summary'] if state else None, history, prompt, answer
+        )
+        await session.commit()
+        return message_count
+    
+    async def _compact_history(
+        self,
+        history_repo: ChatHistoryRepository,
+        session_id: str,
+        summary: Optional[str],
+        history: List[Dict[str, Any]],
+        prompt: str,
+        answer: str
+    ):
+        """
+        Fold the oldest turns into the rolling summary once the verbatim history
+        exceeds the token budget, keeping the newest turns up to half the budget
+        """
+        total_tokens = sum(msg['token_count'] for msg in history) + estimate_tokens(prompt) + estimate_tokens(answer)
+        if total_tokens <= self.chat_history_token_budget or not history:
+            return
+        
+        # The new turn always stays verbatim; keep older turns newest-first while they fit
+        kept_tokens = estimate_tokens(prompt) + estimate_tokens(answer)
+        keep_from = len(history)
+        while keep_from > 0 and kept_tokens + history[keep_from - 1]['token_count'] <= self.chat_history_token_budget // 2:
+            keep_from -= 1
+            kept_tokens += history[keep_from]['token_count']
+        to_fold = history[:keep_from]
+        if not to_fold:
+            return
+        
+        try:
+            new_summary = await self.llm_service.summarize_conversation(to_fold, previous_summary=summary)
+        except Exception as e:
+            # History stays verbatim; folding is retried on the next turn
+            logger.warning(f"Could not summarize chat session {session_id}: {e}")
+            return
+        await history_repo.fold_into_summary(session_id, new_summary, through_id=to_fold[-1]['id'])
+        logger.info(f"Folded {len(to_fold)} messages of session {session_id} into its summary")
+    
     def _build_context(self, documents: List[Dict[str, Any]]) -> str:
         """
         Build context string from retrieved documents
@@ -19,7 +19,10 @@
 
     # always loaded
     'data': [
+        'security/ir.model.access.csv',
         'data/sequence.xml',
+        'data/gemini_prompt_job_cron.xml',
+        'data/gemini_attachment_text_cron.xml',
         'views/inherit_res_setting.xml'
     ],
 
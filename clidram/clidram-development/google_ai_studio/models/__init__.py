@@ -1 +1 @@
-from . import mail_channel,mail_message,inherit_res_config
\ No newline at end of file
+from . import mail_channel,mail_message,inherit_res_config,gemini_prompt_job,gemini_attachment_text,gemini_rag_client,ir_attachment
\ No newline at end of file
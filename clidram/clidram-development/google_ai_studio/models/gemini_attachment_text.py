@@ -0,0 +1,76 @@
+# models/gemini_attachment_text.py
+import logging
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+
+class GeminiAttachmentText(models.Model):
+    _name = 'gemini.attachment.text'
+    _description = 'Gemini Attachment Text Cache'
+    _order = 'last_used_at desc'
+
+    checksum = fields.Char(string='Checksum', required=True, index=True)
+    mimetype = fields.Char(string='Mime Type', required=True)
+    text = fields.Text(string='Extracted Text')
+    page_count = fields.Integer(string='Pages')
+    truncated = fields.Boolean(string='Truncated', help='Only the first pages, up to the page limit, were parsed')
+    size = fields.Integer(string='Size (bytes)', help='Size of the extracted text, counted for eviction')
+    last_used_at = fields.Datetime(string='Last Used', default=fields.Datetime.now, index=True)
+
+    _sql_constraints = [
+        ('checksum_mimetype_unique', 'unique(checksum, mimetype)',
+         'Text is already cached for this attachment content.'),
+    ]
+
+    @api.model
+    def _lookup(self, attachment):
+        """Cached extraction for the attachment's content, or None"""
+        if not attachment.checksum:
+            return None
+        entry = self.sudo().search([
+            ('checksum', '=', attachment.checksum),
+            ('mimetype', '=', attachment.mimetype),
+        ], limit=1)
+        if not entry:
+            return None
+        self.env.cr.execute(
+            "UPDATE gemini_attachment_text SET last_used_at = now() AT TIME ZONE 'UTC' WHERE id = %s", [entry.id]
+        )
+        return entry
+
+    @api.model
+    def _store(self, attachment, text, page_count=0, truncated=False):
+        """Cache a complete extraction; truncated only flags the page limit, which is the same on every run"""
+        if not attachment.checksum:
+            return
+        try:
+            with self.env.cr.savepoint():
+                self.sudo().create({
+                    'checksum': attachment.checksum,
+                    'mimetype': attachment.mimetype,
+                    'text': text,
+                    'page_count': page_count,
+                    'truncated': truncated,
+                    'size': len((text or '').encode()),
+                })
+        except Exception:
+            # Another worker extracted the same content concurrently
+            pass
+
+    @api.model
+    def _cron_evict(self):
+        """Drop least recently used texts beyond discuss_gemini_integration.extraction_cache_max_mb"""
+        max_mb = int(self.env['ir.config_parameter'].sudo().get_param(
+            'discuss_gemini_integration.extraction_cache_max_mb', '100') or 0)
+        self.env.cr.execute("""
+            DELETE FROM gemini_attachment_text WHERE id IN (
+                SELECT id FROM (
+                    SELECT id, sum(size) OVER (ORDER BY last_used_at DESC, id DESC) AS running_size
+                    FROM gemini_attachment_text
+                ) ranked WHERE running_size > %s
+            )
+        """, [max(max_mb, 0) * 1024 * 1024])
+        if self.env.cr.rowcount:
+            _logger.info("Attachment text cache: evicted %s entries", self.env.cr.rowcount)
+        self.invalidate_model()
@@ -0,0 +1,204 @@
+# models/gemini_prompt_job.py
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import partial
+from odoo import api, fields, models
+
+from ..streaming import MessageStreamer
+
+_logger = logging.getLogger(__name__)
+
+# One worker pool per Odoo process, sized from the settings on first use
+_pool_lock = threading.Lock()
+_pool = {}
+
+# Body of a streamed reply until the first chunk arrives
+STREAM_PLACEHOLDER = '<p>…</p>'
+
+# Running jobs older than this are assumed lost with their worker
+RUNNING_TIMEOUT = timedelta(minutes=15)
+
+
+def _get_pool(max_workers):
+    with _pool_lock:
+        if 'executor' not in _pool:
+            _pool['executor'] = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='gemini_prompt')
+        return _pool['executor']
+
+
+class GeminiPromptJob(models.Model):
+    _name = 'gemini.prompt.job'
+    _description = 'Gemini Prompt Job'
+    _order = 'id'
+
+    message_id = fields.Many2one('mail.message', string='Prompt Message', required=True, ondelete='cascade',
+                                 index=True)
+    channel_id = fields.Many2one('mail.channel', string='Channel', ondelete='cascade')
+    state = fields.Selection([
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('ready', 'Ready to Post'),
+        ('done', 'Done'),
+    ], string='State', default='queued', required=True, index=True)
+    replies = fields.Text(string='Replies', help='JSON list of message bodies to post, in order')
+    reply_message_id = fields.Many2one('mail.message', string='Streamed Reply', ondelete='set null',
+                                       help='Bot message posted up front and updated as the answer streams in')
+    started_at = fields.Datetime(string='Started At')
+
+    @api.model
+    def _get_max_workers(self):
+        return int(self.env['ir.config_parameter'].sudo().get_param(
+            'discuss_gemini_integration.max_workers', '4') or 4)
+
+    @api.model
+    def _get_stream_settings(self):
+        """(min_interval seconds, min_tokens) between streamed updates; interval 0 disables streaming"""
+        params = self.env['ir.config_parameter'].sudo()
+        interval_ms = int(params.get_param('discuss_gemini_integration.stream_interval_ms', '300') or 0)
+        min_tokens = int(params.get_param('discuss_gemini_integration.stream_min_tokens', '100') or 100)
+        return interval_ms / 1000.0, min_tokens
+
+    @api.model
+    def _enqueue(self, messages):
+        """Queue trigger messages; workers pick them up once the transaction commits"""
+        jobs = self.sudo().create([{'message_id': message.id} for message in messages])
+        self._dispatch(jobs.ids)
+        return jobs
+
+    @api.model
+    def _dispatch(self, job_ids):
+        pool = _get_pool(self._get_max_workers())
+        for job_id in job_ids:
+            self.env.cr.postcommit.add(partial(pool.submit, self._run_job, job_id))
+
+    @api.model
+    def _run_job(self, job_id):
+        """
+        Worker pool task. The prompt is read and the replies are posted in two
+        short transactions; no cursor is held while attachments are indexed
+        and searched in the RAG service and while Gemini generates. When
+        streaming, the reply message is posted up front and rewritten over the
+        bus as chunks arrive (each debounced update in its own transaction).
+        """
+        try:
+            with self.env.registry.cursor() as cr:
+                env = api.Environment(cr, self.env.uid, self.env.context)
+                message_model = env['mail.message']
+                job = env['gemini.prompt.job'].browse(job_id)
+                request = job._start()
+                stream_message_id = job.reply_message_id.id
+                min_interval, min_tokens = job._get_stream_settings()
+            if request is False:
+                return
+
+            streamer = None
+            if stream_message_id:
+                streamer = MessageStreamer(
+                    partial(self._update_streamed_reply, stream_message_id), min_interval, min_tokens
+                )
+            indexed_ids = []
+            reply = None
+            if request:
+                indexed_ids = message_model._retrieve_attachment_excerpts(request)
+                reply = message_model._generate_gemini_reply(request, streamer)
+
+            with self.env.registry.cursor() as cr:
+                env = api.Environment(cr, self.env.uid, self.env.context)
+                env['ir.attachment'].sudo().browse(indexed_ids).exists().write({'gemini_rag_indexed': True})
+                jobs = env['gemini.prompt.job']
+                jobs.browse(job_id)._finish(reply)
+                jobs._post_ready()
+        except Exception as e:
+            _logger.error("Error processing Gemini prompt job %s: %s", job_id, e)
+
+    def _start(self):
+        """
+        Claim a queued job and read what the Gemini call needs.
+
+        Returns:
+            False if the job was already claimed, None if there is nothing to
+            send to Gemini, else the request for _generate_gemini_reply
+        """
+        self.ensure_one()
+        self.env.cr.execute("""
+            UPDATE gemini_prompt_job SET state = 'running', started_at = now() AT TIME ZONE 'UTC'
+            WHERE id = %s AND state = 'queued' RETURNING id
+        """, [self.id])
+        if not self.env.cr.fetchone():
+            return False
+        self.invalidate_recordset(['state', 'started_at'])
+
+        message_model = self.env['mail.message']
+        channel, request, replies = message_model._prepare_gemini_request(self.message_id)
+        vals = {
+            'channel_id': channel.id if channel else False,
+            'replies': json.dumps(replies),
+            'state': 'running' if request else 'ready',
+        }
+        if request and self._get_stream_settings()[0] > 0:
+            # Post the pending replies and the message the answer streams into
+            message_model._post_gemini_replies(channel, replies)
+            vals.update(
+                replies='[]',
+                reply_message_id=message_model._post_gemini_replies(channel, [STREAM_PLACEHOLDER]).id,
+            )
+        self.write(vals)
+        return request
+
+    @api.model
+    def _update_streamed_reply(self, message_id, text):
+        """Streamer callback: show the partial answer, in a transaction of its own"""
+        with self.env.registry.cursor() as cr:
+            env = api.Environment(cr, self.env.uid, self.env.context)
+            message_model = env['mail.message']
+            body = message_model._format_llm_text_to_html(message_model._clean_markdown(text))
+            message_model._update_gemini_reply(message_model.browse(message_id), body)
+
+    def _finish(self, reply=None):
+        self.ensure_one()
+        if self.state != 'running':
+            # Already failed by the cron as stuck
+            return
+        replies = json.loads(self.replies or '[]')
+        if reply and self.reply_message_id:
+            # Replace the streamed text with the final answer (or error)
+            self.env['mail.message']._update_gemini_reply(self.reply_message_id, reply)
+        elif reply:
+            replies.append(reply)
+        self.write({'state': 'ready', 'replies': json.dumps(replies)})
+
+    @api.model
+    def _post_ready(self):
+        """Post the replies of every finished job in one transaction, oldest first"""
+        self.env.cr.execute("""
+            SELECT id FROM gemini_prompt_job WHERE state = 'ready'
+            ORDER BY id FOR UPDATE SKIP LOCKED
+        """)
+        jobs = self.sudo().browse([row[0] for row in self.env.cr.fetchall()])
+        message_model = self.env['mail.message']
+        for job in jobs:
+            if job.channel_id:
+                message_model._post_gemini_replies(job.channel_id, json.loads(job.replies or '[]'))
+        jobs.write({'state': 'done'})
+        return jobs
+
+    @api.model
+    def _cron_process(self):
+        """
+        Re-dispatch jobs lost with their worker process (restart, recycling),
+        post finished replies and drop jobs done for more than 7 days
+        """
+        now = fields.Datetime.now()
+        queued = self.search([('state', '=', 'queued'), ('create_date', '<', now - timedelta(minutes=2))])
+        stuck = self.search([('state', '=', 'running'), ('started_at', '<', now - RUNNING_TIMEOUT)])
+        error_text = self.env['mail.message']._format_error_message('processing_error')
+        for job in stuck:
+            job._finish(error_text)
+        if queued or stuck:
+            _logger.warning("Gemini prompt jobs: re-dispatching %s queued, failing %s stuck", len(queued), len(stuck))
+        self._dispatch(queued.ids)
+        self._post_ready()
+        self.search([('state', '=', 'done'), ('create_date', '<', now - timedelta(days=7))]).unlink()
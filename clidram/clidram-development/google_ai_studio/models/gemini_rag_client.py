@@ -0,0 +1,67 @@
+# models/gemini_rag_client.py
+import logging
+import requests
+from odoo import api, models
+
+_logger = logging.getLogger(__name__)
+
+
+class GeminiRagClient(models.AbstractModel):
+    _name = 'gemini.rag.client'
+    _description = 'Gemini RAG Attachment Index Client'
+
+    @api.model
+    def _get_api_url(self):
+        url = self.env['ir.config_parameter'].sudo().get_param('discuss_gemini_integration.rag_api_url')
+        return url.rstrip('/') if url else None
+
+    @api.model
+    def _is_enabled(self):
+        """Attachments are indexed in the RAG service instead of inlined when its URL is set"""
+        return bool(self._get_api_url())
+
+    @api.model
+    def _get_settings(self):
+        """URL and key of the RAG service, read up front: the calls below make no database access"""
+        return {
+            'url': self._get_api_url(),
+            'api_key': self.env['ir.config_parameter'].sudo().get_param('discuss_gemini_integration.rag_api_key'),
+        }
+
+    @api.model
+    def _post(self, settings, endpoint, payload, timeout=60):
+        headers = {'Content-Type': 'application/json', 'Accept': 'application/json'}
+        if settings.get('api_key'):
+            headers['Authorization'] = f"Bearer {settings['api_key']}"
+        response = requests.post(f"{settings['url']}{endpoint}", json=payload, headers=headers, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+
+    @api.model
+    def index_attachment(self, settings, attachment, text, patient_seq=None, channel_id=None):
+        """
+        Chunk and embed an attachment's text into medical_rag_index (odoo_model 'ir.attachment')
+
+        attachment is a dict with the id, name, mimetype and checksum of the ir.attachment
+        """
+        result = self._post(settings, '/api/v1/etl/attachments', {
+            'attachment_id': attachment['id'],
+            'name': attachment['name'],
+            'text': text,
+            'mimetype': attachment['mimetype'],
+            'checksum': attachment['checksum'],
+            'patient_seq': patient_seq,
+            'channel_id': channel_id,
+        }, timeout=300)
+        _logger.info("Indexed attachment %s into %s chunks", attachment['id'], result.get('chunks_created'))
+        return result
+
+    @api.model
+    def search_attachments(self, settings, prompt, attachment_ids, limit=5):
+        """Chunks of the given indexed attachments most relevant to the prompt"""
+        result = self._post(settings, '/api/v1/rag/search-attachments', {
+            'prompt': prompt,
+            'attachment_ids': list(attachment_ids),
+            'limit': limit,
+        })
+        return result.get('chunks', [])
@@ -27,6 +27,13 @@ class ResConfigSettings(models.TransientModel):
         help="Maximum number of previous messages to include as context."
     )
 
+    context_token_budget = fields.Integer(
+        string="Context Token Budget",
+        config_parameter='discuss_gemini_integration.context_token_budget',
+        default=2000,
+        help="Older context messages are dropped once the latest ones reach this many tokens (0 for no limit)."
+    )
+
     # Model selection
     gemini_model = fields.Selection([
         ('gemini-pro', 'Gemini Pro'),
@@ -55,4 +62,73 @@ class ResConfigSettings(models.TransientModel):
         help="Flag to indicate if the gemini response has been added to the channel."
     )
 
+    # Prompt processing
+    sync_prompts = fields.Boolean(
+        string="Answer Prompts Synchronously",
+        config_parameter='discuss_gemini_integration.sync_prompts',
+        help="Answer @gemma prompts while the user's message is being posted instead of on the worker pool."
+    )
+
+    gemini_max_workers = fields.Integer(
+        string="Prompt Workers",
+        config_parameter='discuss_gemini_integration.max_workers',
+        default=4,
+        help="Prompts answered in parallel per Odoo process. Requires a restart."
+    )
+
+    stream_interval_ms = fields.Integer(
+        string="Streaming Interval (ms)",
+        config_parameter='discuss_gemini_integration.stream_interval_ms',
+        default=300,
+        help="Answers appear progressively, updated at most this often. Set to 0 to post complete answers only."
+    )
+
+    stream_min_tokens = fields.Integer(
+        string="Streaming Update Size (tokens)",
+        config_parameter='discuss_gemini_integration.stream_min_tokens',
+        default=100,
+        help="Update the streamed answer early once this many new tokens arrived."
+    )
+
+    # Attachments
+    extraction_cache_max_mb = fields.Integer(
+        string="Attachment Text Cache (MB)",
+        config_parameter='discuss_gemini_integration.extraction_cache_max_mb',
+        default=100,
+        help="Text extracted from attachments is reused for identical files; least recently used text "
+             "beyond this size is evicted."
+    )
+
+    pdf_max_pages = fields.Integer(
+        string="PDF Page Limit",
+        config_parameter='discuss_gemini_integration.pdf_max_pages',
+        default=100,
+        help="Only the first pages of larger PDFs are read."
+    )
+
+    pdf_timeout = fields.Integer(
+        string="PDF Parsing Timeout (seconds)",
+        config_parameter='discuss_gemini_integration.pdf_timeout',
+        default=30,
+        help="Pages of large PDFs not parsed within this time are left out."
+    )
+
+    rag_api_url = fields.Char(
+        string="RAG API URL",
+        config_parameter='discuss_gemini_integration.rag_api_url',
+        help="When set, document attachments are indexed in the medical RAG service and prompts receive "
+             "only their relevant excerpts instead of the whole files."
+    )
+
+    rag_api_key = fields.Char(
+        string="RAG API Key",
+        config_parameter='discuss_gemini_integration.rag_api_key',
+    )
+
+    rag_excerpt_limit = fields.Integer(
+        string="Document Excerpts per Prompt",
+        config_parameter='discuss_gemini_integration.rag_excerpt_limit',
+        default=5,
+    )
+
     google_ai_api_key = fields.Char(string="Google AI API Key", config_parameter="google_ai_studio.google_ai_api_key")
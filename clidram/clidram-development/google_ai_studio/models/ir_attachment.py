@@ -0,0 +1,13 @@
+# models/ir_attachment.py
+from odoo import fields, models
+
+
+class IrAttachment(models.Model):
+    _inherit = 'ir.attachment'
+
+    gemini_rag_indexed = fields.Boolean(
+        string="Indexed for Gemini",
+        copy=False,
+        index=True,
+        help="The extracted text is chunked into the RAG index; prompts receive only its relevant excerpts."
+    )
@@ -73,37 +73,8 @@ class MailChannel(models.Model):
         """
         Retrieve and format conversation context from previous messages
         """
-        max_messages = self._get_max_context_messages()
-
-        # Get previous messages in the channel, excluding system messages and bot messages
-        domain = [
-            ('model', '=', 'mail.channel'),
-            ('res_id', '=', self.id),
-            ('id', '!=', current_message_id),
-            ('message_type', '=', 'comment'),
-        ]
-
         # Exclude messages from Gemini bot
-        gemini_partner = self._get_gemini_partner()
-        if gemini_partner:
-            domain.append(('author_id', '!=', gemini_partner.id))
-
-        # Get messages in chronological order (oldest first)
-        messages = self.env['mail.message'].sudo().search(
-            domain,
-            order='id asc',
-            limit=max_messages
-        )
-
-        # Format messages for context
-        context_parts = []
-        for msg in messages:
-            author_name = msg.author_id.name if msg.author_id else "Unknown"
-            body = html2plaintext(msg.body).strip()
-            if body:  # Only include non-empty messages
-                context_parts.append(f"{author_name}: {body}")
-
-        return "\n".join(context_parts)
+        return self.env['mail.message']._get_conversation_context(self, current_message_id, exclude_gemini=True)
 
     def _format_prompt_with_context(self, prompt, context):
         """
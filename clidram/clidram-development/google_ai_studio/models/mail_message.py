@@ -1,21 +1,23 @@
 # models/mail_message.py
-import base64
 import os
 # from google import genai
 import google.generativeai as genai
 from google.genai import types
 import PIL.Image
 from io import BytesIO
-from odoo import api, models, _
+from odoo import api, models, tools, _
 from odoo.tools import html2plaintext
 from odoo.exceptions import UserError
 import logging
 import re
-import pdfplumber
+import threading
+from collections import OrderedDict
 import docx2txt
 import pandas as pd
 from markupsafe import Markup
 
+from ..pdf_text import extract_pdf_text
+
 _logger = logging.getLogger(__name__)
 
 # Constants
@@ -29,6 +31,11 @@ ERROR_MESSAGES = {
     "attachment_error": "Error processing attachment: {}",
 }
 
+# Plaintext of message bodies keyed on (id, write_date), per worker process
+PLAINTEXT_CACHE_SIZE = 5000
+_plaintext_lock = threading.Lock()
+_plaintext_cache = OrderedDict()
+
 # Supported attachment types
 SUPPORTED_IMAGE_TYPES = ['image/jpeg', 'image/png', 'image/gif', 'image/webp']
 SUPPORTED_DOCUMENT_TYPES = [
@@ -93,15 +100,26 @@ class MailMessage(models.Model):
         clean_text = html2plaintext(message_body).strip()
         return clean_text.replace(GEMINI_TRIGGER, "", 1).strip()
 
+    @api.model
+    def _is_gemini_sync(self):
+        """Check if prompts are answered inside mail.message.create instead of the worker pool"""
+        return self.env['ir.config_parameter'].sudo().get_param('discuss_gemini_integration.sync_prompts')
+
+    @api.model
+    def _format_error_message(self, error_key, error_param=None):
+        """Text of an error message, with its parameter filled in"""
+        error_text = ERROR_MESSAGES[error_key]
+        if error_param:
+            error_text = error_text.format(error_param)
+        return error_text
+
     @api.model
     def _post_error_message(self, channel, error_key, error_param=None):
         """Post an error message to the channel as the Gemini partner"""
         gemini_partner = self._get_gemini_partner()
         if not channel or not gemini_partner:
             return
-        error_text = ERROR_MESSAGES[error_key]
-        if error_param:
-            error_text = error_text.format(error_param)
+        error_text = self._format_error_message(error_key, error_param)
         channel.message_post(
             body=error_text,
             author_id=gemini_partner.id,
@@ -126,39 +144,88 @@ class MailMessage(models.Model):
                 return document.channel_ids[0]
         return None
 
+    def init(self):
+        # Latest messages of a channel are read newest first (see _get_conversation_context)
+        tools.create_index(self._cr, 'mail_message_channel_res_id_id_idx', self._table,
+                           ['res_id', 'id DESC'], where="model = 'mail.channel'")
+
+    @api.model
+    def _get_context_token_budget(self):
+        """Get the conversation context token budget from system parameters"""
+        return int(self.env['ir.config_parameter'].sudo().get_param(
+            'discuss_gemini_integration.context_token_budget', '2000') or 0)
+
     @api.model
-    def _get_conversation_context(self, channel, current_message_id):
+    def _get_plaintext_bodies(self, rows):
+        """Plaintext of each message body, converted once per message version"""
+        bodies = {}
+        missing = []
+        with _plaintext_lock:
+            for row in rows:
+                key = (row['id'], str(row['write_date']))
+                if key in _plaintext_cache:
+                    _plaintext_cache.move_to_end(key)
+                    bodies[row['id']] = _plaintext_cache[key]
+                else:
+                    missing.append(key)
+        if not missing:
+            return bodies
+
+        for message in self.sudo().browse([key[0] for key in missing]):
+            bodies[message.id] = html2plaintext(message.body or '').strip()
+        with _plaintext_lock:
+            for key in missing:
+                _plaintext_cache[key] = bodies[key[0]]
+            while len(_plaintext_cache) > PLAINTEXT_CACHE_SIZE:
+                _plaintext_cache.popitem(last=False)
+        return bodies
+
+    @api.model
+    def _get_conversation_context(self, channel, current_message_id, exclude_gemini=None):
         """
-        Retrieve and format conversation context from previous messages
+        Retrieve and format conversation context from the latest messages before
+        the current one, newest kept first when trimming to the token budget
         """
         max_messages = self._get_max_context_messages()
         # Get previous messages in the channel, excluding system messages and bot messages
         domain = [
             ('model', '=', 'mail.channel'),
             ('res_id', '=', channel.id),
-            ('id', '!=', current_message_id),
+            ('id', '<', current_message_id),
             ('message_type', '=', 'comment'),
         ]
         # Exclude messages from Gemini bot
         gemini_partner = self._get_gemini_partner()
-        will_add_gemini = self.env['ir.config_parameter'].sudo().get_param(
-            'discuss_gemini_integration.is_gemini_response_added')
-        if gemini_partner and not will_add_gemini:
+        if exclude_gemini is None:
+            exclude_gemini = not self.env['ir.config_parameter'].sudo().get_param(
+                'discuss_gemini_integration.is_gemini_response_added')
+        if gemini_partner and exclude_gemini:
             domain.append(('author_id', '!=', gemini_partner.id))
-        # Get messages in chronological order (oldest first)
-        messages = self.env['mail.message'].sudo().search(
+        # Latest messages first: an index scan on (res_id, id desc), never the whole history
+        rows = self.env['mail.message'].sudo().search_read(
             domain,
-            order='id asc',
+            ['author_id', 'write_date'],
+            order='id desc',
             limit=max_messages
         )
-        # Format messages for context
+        bodies = self._get_plaintext_bodies(rows)
+
+        # Keep the newest messages that fit the token budget (~4 characters per token)
+        budget = self._get_context_token_budget()
+        used = 0
         context_parts = []
-        for msg in messages:
-            author_name = msg.author_id.name if msg.author_id else "Unknown"
-            body = html2plaintext(msg.body).strip()
-            if body:  # Only include non-empty messages
-                context_parts.append(f"{author_name}: {body}")
-        return "\n".join(context_parts)
+        for row in rows:
+            body = bodies.get(row['id'])
+            if not body:  # Only include non-empty messages
+                continue
+            author_name = row['author_id'][1] if row['author_id'] else "Unknown"
+            line = f"{author_name}: {body}"
+            used += len(line) // 4 + 1
+            if budget and used > budget and context_parts:
+                break
+            context_parts.append(line)
+        # Format messages for context, oldest first
+        return "\n".join(reversed(context_parts))
 
     def _clean_markdown(self, text):
         """Convert markdown to HTML for better display"""
@@ -197,8 +264,7 @@ class MailMessage(models.Model):
     def _extract_image_bytes(self, attachment):
         """Extract image bytes from attachment for the Google API"""
         try:
-            # Decode the base64 content to get raw bytes
-            image_bytes = base64.b64decode(attachment.datas)
+            image_bytes = attachment.raw
 
             # Return the image bytes and mime type for the Google API
             return {
@@ -214,8 +280,7 @@ class MailMessage(models.Model):
     def _extract_pdf_bytes(self, attachment):
         """Extract PDF bytes from attachment for the Google API"""
         try:
-            # Decode the base64 content to get raw bytes
-            pdf_bytes = base64.b64decode(attachment.datas)
+            pdf_bytes = attachment.raw
 
             # Return the PDF bytes and mime type for the Google API
             return {
@@ -229,18 +294,18 @@ class MailMessage(models.Model):
 
     @api.model
     def _extract_pdf_content(self, attachment):
-        """Extract text content from PDF attachment for text inclusion"""
-        try:
-            pdf_data = base64.b64decode(attachment.datas)
-            text_content = ""
-
-            with pdfplumber.open(BytesIO(pdf_data)) as pdf:
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text_content += page_text + "\n"
+        """
+        Extract text content from PDF attachment for text inclusion; large PDFs
+        are parsed page-parallel, capped by the pdf_max_pages / pdf_timeout settings
 
-            return text_content.strip()
+        Returns:
+            (text, page_count, truncated, complete)
+        """
+        params = self.env['ir.config_parameter'].sudo()
+        max_pages = int(params.get_param('discuss_gemini_integration.pdf_max_pages', '100') or 100)
+        timeout = int(params.get_param('discuss_gemini_integration.pdf_timeout', '30') or 30)
+        try:
+            return extract_pdf_text(attachment.raw, max_pages=max_pages, timeout=timeout)
         except Exception as e:
             _logger.error("Error processing PDF attachment %s: %s", attachment.name, e)
             raise Exception(f"Failed to process PDF: {str(e)}")
@@ -249,7 +314,7 @@ class MailMessage(models.Model):
     def _extract_docx_content(self, attachment):
         """Extract text content from DOCX attachment"""
         try:
-            docx_data = base64.b64decode(attachment.datas)
+            docx_data = attachment.raw
             text = docx2txt.process(BytesIO(docx_data))
             return text.strip()
         except Exception as e:
@@ -260,7 +325,7 @@ class MailMessage(models.Model):
     def _extract_text_content(self, attachment):
         """Extract text content from plain text attachment"""
         try:
-            text_data = base64.b64decode(attachment.datas)
+            text_data = attachment.raw
             return text_data.decode('utf-8').strip()
         except Exception as e:
             _logger.error("Error processing text attachment %s: %s", attachment.name, e)
@@ -270,7 +335,7 @@ class MailMessage(models.Model):
     def _extract_excel_content(self, attachment):
         """Extract content from Excel attachment"""
         try:
-            excel_data = base64.b64decode(attachment.datas)
+            excel_data = attachment.raw
             # Read Excel file
             df = pd.read_excel(BytesIO(excel_data))
             # Convert to markdown table format
@@ -283,7 +348,7 @@ class MailMessage(models.Model):
     def _extract_csv_content(self, attachment):
         """Extract content from CSV attachment"""
         try:
-            csv_data = base64.b64decode(attachment.datas)
+            csv_data = attachment.raw
             # Read CSV file
             df = pd.read_csv(BytesIO(csv_data))
             # Convert to markdown table format
@@ -292,10 +357,27 @@ class MailMessage(models.Model):
             _logger.error("Error processing CSV attachment %s: %s", attachment.name, e)
             raise Exception(f"Failed to process CSV file: {str(e)}")
 
+    @api.model
+    def _get_attachment_text(self, attachment, extract):
+        """
+        Text of an attachment from the extraction cache (keyed on its checksum),
+        parsed only on a miss. Text left partial by a timeout or a failed page
+        range is not cached, the next prompt extracts it again.
+        """
+        cache = self.env['gemini.attachment.text']
+        entry = cache._lookup(attachment)
+        if entry:
+            return entry.text
+        result = extract(attachment)
+        text, page_count, truncated, complete = result if isinstance(result, tuple) else (result, 0, False, True)
+        if complete:
+            cache._store(attachment, text, page_count, truncated)
+        return text
+
     @api.model
     def _extract_attachment_content(self, attachment):
         """Extract content from attachment based on its type"""
-        if not attachment.datas:
+        if attachment.type != 'binary' or not attachment.file_size:
             return None
 
         # Process based on mimetype
@@ -310,32 +392,32 @@ class MailMessage(models.Model):
             return {
                 'type': 'pdf',
                 'bytes': self._extract_pdf_bytes(attachment),
-                'text': self._extract_pdf_content(attachment),
+                'text': self._get_attachment_text(attachment, self._extract_pdf_content),
                 'name': attachment.name
             }
         elif attachment.mimetype == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document':
             return {
                 'type': 'text',
-                'data': self._extract_docx_content(attachment),
+                'data': self._get_attachment_text(attachment, self._extract_docx_content),
                 'name': attachment.name
             }
         elif attachment.mimetype == 'text/plain':
             return {
                 'type': 'text',
-                'data': self._extract_text_content(attachment),
+                'data': self._get_attachment_text(attachment, self._extract_text_content),
                 'name': attachment.name
             }
         elif attachment.mimetype in ['application/vnd.ms-excel',
                                      'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet']:
             return {
                 'type': 'text',
-                'data': self._extract_excel_content(attachment),
+                'data': self._get_attachment_text(attachment, self._extract_excel_content),
                 'name': attachment.name
             }
         elif attachment.mimetype == 'text/csv':
             return {
                 'type': 'text',
-                'data': self._extract_csv_content(attachment),
+                'data': self._get_attachment_text(attachment, self._extract_csv_content),
                 'name': attachment.name
             }
         else:
@@ -364,6 +446,9 @@ Current question: {prompt}"""
                 if att['type'] == 'text':
                     # Include text content directly in the prompt
                     attachment_info.append(f"Attached document '{att['name']}':\n{att['data']}")
+                elif att['type'] == 'excerpt':
+                    # Chunk of an indexed document retrieved for this prompt
+                    attachment_info.append(f"Excerpt from '{att['name']}':\n{att['data']}")
                 elif att['type'] == 'image':
                     # Add image as a byte part
                     img_data = att['data']
@@ -403,36 +488,35 @@ Current question: {prompt}"""
         return content
 
     @api.model
-    def _process_gemini_prompt(self, message_id):
-        """Process a Gemini prompt and post the response as the Gemini partner"""
-        # Fetch the message in the current environment
-        message = self.browse(message_id)
-        if not message.exists():
-            return
+    def _prepare_gemini_request(self, message):
+        """
+        Read everything the Gemini call needs from the database
 
+        Returns:
+            (channel, request, replies): request is None when nothing should be
+            sent to Gemini; replies are error messages to post to the channel
+        """
         # Get the channel
         channel = self._get_message_channel(message)
         if not channel:
-            _logger.info("Message %s is not associated with any channel, skipping Gemini processing", message_id)
-            return
+            _logger.info("Message %s is not associated with any channel, skipping Gemini processing", message.id)
+            return None, None, []
 
         # Get Gemini partner for posting responses
         gemini_partner = self._get_gemini_partner()
         if not gemini_partner:
             _logger.warning("Gemini partner is not configured. Please set it in Settings.")
-            return
+            return None, None, []
 
         # Check API key
         api_key = self._get_gemini_api_key()
         if not api_key:
-            self._post_error_message(channel, "no_api_key")
-            return
+            return channel, None, [self._format_error_message("no_api_key")]
 
         # Extract and validate prompt
         prompt = self._extract_prompt(message.body)
         if not prompt:
-            self._post_error_message(channel, "empty_prompt")
-            return
+            return channel, None, [self._format_error_message("empty_prompt")]
 
         # Get conversation context
         try:
@@ -442,32 +526,128 @@ Current question: {prompt}"""
             context = None
 
         # Process attachments
+        replies = []
         attachments = []
         if hasattr(message, 'attachment_ids') and message.attachment_ids:
             for attachment in message.attachment_ids:
                 try:
                     attachment_content = self._extract_attachment_content(attachment)
                     if attachment_content:
+                        attachment_content['attachment_id'] = attachment.id
                         attachments.append(attachment_content)
                 except Exception as e:
                     _logger.error("Error processing attachment %s: %s", attachment.name, e)
-                    self._post_error_message(channel, "attachment_error", f"{attachment.name}: {str(e)}")
+                    replies.append(self._format_error_message("attachment_error", f"{attachment.name}: {str(e)}"))
+
+        # Determine which model to use based on attachments
+        has_image_or_pdf = any(att['type'] in ['image', 'pdf'] for att in attachments)
+        # model_name = self._get_gemini_vision_model() if has_image_or_pdf else self._get_gemini_model()
+        model_name = "gemma-3-27b-it"
+
+        request = {
+            'api_key': api_key,
+            'model': model_name,
+            'prompt': prompt,
+            'context': context,
+            'attachments': attachments,
+            # Document text goes to the RAG index; only its relevant excerpts are sent
+            'rag': self._prepare_attachment_retrieval(channel, prompt, attachments)
+            if self.env['gemini.rag.client']._is_enabled() else None,
+        }
+        return channel, request, replies
+
+    @api.model
+    def _extract_patient_seq(self, prompt):
+        """Patient written in the prompt as 'patient_id: <seq>', if any"""
+        match = re.search(r'patient_id:\s*(\S+)', prompt, re.IGNORECASE)
+        return match.group(1) if match else None
 
-        # Get Gemini response using the new API approach
+    @api.model
+    def _prepare_attachment_retrieval(self, channel, prompt, attachments):
+        """
+        Read what _retrieve_attachment_excerpts needs: the RAG service settings,
+        the documents of the message not indexed yet and the channel's indexed
+        documents.
+        """
+        documents = []
+        for att in attachments:
+            if not ((att['type'] == 'text' and att['data']) or (att['type'] == 'pdf' and att['text'])):
+                continue
+            att['rag_document'] = True
+            record = self.env['ir.attachment'].sudo().browse(att['attachment_id'])
+            if not record.gemini_rag_indexed:
+                documents.append({
+                    'id': record.id,
+                    'name': record.name,
+                    'mimetype': record.mimetype,
+                    'checksum': record.checksum,
+                    'text': att['data'] if att['type'] == 'text' else att['text'],
+                })
+        indexed = self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', 'mail.channel'),
+            ('res_id', '=', channel.id),
+            ('gemini_rag_indexed', '=', True),
+        ])
+        return {
+            'settings': self.env['gemini.rag.client']._get_settings(),
+            'channel_id': channel.id,
+            'patient_seq': self._extract_patient_seq(prompt),
+            'documents': documents,
+            'indexed_ids': indexed.ids,
+            'limit': int(self.env['ir.config_parameter'].sudo().get_param(
+                'discuss_gemini_integration.rag_excerpt_limit', '5') or 5),
+        }
+
+    @api.model
+    def _retrieve_attachment_excerpts(self, request):
+        """
+        Index the text of newly posted documents into the RAG service (linked to
+        the patient when the prompt names one), then replace every document of
+        the request with the excerpts of the channel's indexed documents
+        relevant to the prompt. Images, and PDFs without text, are still sent
+        whole. Documents are inlined as before if the RAG service is unavailable.
+        Makes no database access, so workers call it without holding a cursor.
+
+        Returns:
+            ids of the attachments indexed, to flag as gemini_rag_indexed
+        """
+        rag = request.get('rag')
+        if not rag:
+            return []
+        client = self.env['gemini.rag.client']
+        newly_indexed = []
         try:
-            # Create client
-            client = genai.Client(api_key=api_key)
+            for document in rag['documents']:
+                client.index_attachment(rag['settings'], document, document['text'],
+                                        patient_seq=rag['patient_seq'], channel_id=rag['channel_id'])
+                newly_indexed.append(document['id'])
+            indexed_ids = rag['indexed_ids'] + newly_indexed
+            chunks = client.search_attachments(
+                rag['settings'], request['prompt'], indexed_ids, limit=rag['limit']
+            ) if indexed_ids else []
+        except Exception as e:
+            _logger.warning("Attachment retrieval unavailable, inlining documents: %s", e)
+            return newly_indexed
 
-            # Determine which model to use based on attachments
-            has_image_or_pdf = any(att['type'] in ['image', 'pdf'] for att in attachments)
-            # model_name = self._get_gemini_vision_model() if has_image_or_pdf else self._get_gemini_model()
-            model_name = "gemma-3-27b-it"
+        request['attachments'] = [att for att in request['attachments'] if not att.get('rag_document')] + [
+            {'type': 'excerpt', 'name': chunk.get('name') or 'document', 'data': chunk['content']}
+            for chunk in chunks
+        ]
+        return newly_indexed
 
-            # Log the model being used for debugging
-            _logger.info(f"Using Gemini model: {model_name}")
+    @api.model
+    def _generate_gemini_reply(self, request, streamer=None):
+        """
+        Call Gemini and return the formatted reply (or the error message).
+        Makes no database access, so workers call it without holding a cursor;
+        chunks are fed to the optional streamer as they arrive.
+        """
+        try:
+            # Create client
+            client = genai.Client(api_key=request['api_key'])
 
-            # Build the content with text and byte parts
-            content = self._build_gemini_content(prompt, attachments, context)
+            # Log the model being used for debugging
+            _logger.info(f"Using Gemini model: {request['model']}")
 
             # Generate content config without thinking_config to avoid errors
             generate_content_config = types.GenerateContentConfig()
@@ -475,27 +655,60 @@ Current question: {prompt}"""
             # Generate response using streaming
             response_text = ""
             for chunk in client.models.generate_content_stream(
-                    model=model_name,
-                    contents=[content],
+                    model=request['model'],
+                    contents=[self._build_gemini_content(request['prompt'], request['attachments'],
+                                                         request['context'])],
                     config=generate_content_config,
             ):
                 if hasattr(chunk, 'text') and chunk.text:
                     response_text += chunk.text
+                    if streamer:
+                        streamer.feed(chunk.text)
 
             # Clean and format the response
             clean_text = self._clean_markdown(response_text)
-            formatted_html = self._format_llm_text_to_html(clean_text)
+            return self._format_llm_text_to_html(clean_text)
+        except Exception as e:
+            _logger.error("Error calling Gemini API: %s", e)
+            return ERROR_MESSAGES["api_error"].format(str(e))
 
-            # Post response as the Gemini partner
-            channel.with_user(gemini_partner.user_ids[0] if gemini_partner.user_ids else self.env.user).message_post(
-                body=formatted_html,
+    @api.model
+    def _post_gemini_replies(self, channel, replies):
+        """Post replies to the channel as the Gemini partner"""
+        gemini_partner = self._get_gemini_partner()
+        if not channel or not gemini_partner:
+            return self.browse()
+        author_user = gemini_partner.user_ids[0] if gemini_partner.user_ids else self.env.user
+        posted = self.browse()
+        for body in replies:
+            posted |= channel.with_user(author_user).message_post(
+                body=body,
                 author_id=gemini_partner.id,
                 message_type='comment',
                 subtype_xmlid='mail.mt_comment'
             )
-        except Exception as e:
-            _logger.error("Error calling Gemini API: %s", e)
-            self._post_error_message(channel, "api_error", str(e))
+        return posted
+
+    @api.model
+    def _update_gemini_reply(self, message, body):
+        """Rewrite a posted reply; the bus pushes the new body to open Discuss clients"""
+        channel = self.env['mail.channel'].sudo().browse(message.res_id)
+        channel._message_update_content(message.sudo(), body, strict=False)
+
+    @api.model
+    def _process_gemini_prompt(self, message_id):
+        """Process a Gemini prompt and post the response as the Gemini partner"""
+        # Fetch the message in the current environment
+        message = self.browse(message_id)
+        if not message.exists():
+            return
+
+        channel, request, replies = self._prepare_gemini_request(message)
+        if request:
+            indexed_ids = self._retrieve_attachment_excerpts(request)
+            self.env['ir.attachment'].sudo().browse(indexed_ids).exists().write({'gemini_rag_indexed': True})
+            replies.append(self._generate_gemini_reply(request))
+        self._post_gemini_replies(channel, replies)
 
     @api.model_create_multi
     def create(self, vals_list):
@@ -507,19 +720,23 @@ Current question: {prompt}"""
         if not self._is_gemini_enabled():
             return messages
 
-        # Process each message
-        for message in messages:
-            # Check if message meets criteria for Gemini processing
-            if (message.author_id and
-                    message.body and
-                    self._is_gemini_trigger(message.body)):
-                try:
-                    # Use a new cursor to avoid long transactions
-                    with self.env.registry.cursor() as new_cr:
-                        new_env = self.env(cr=new_cr)
-                        self._process_gemini_prompt(message.id)
-                except Exception as e:
-                    _logger.error("Error processing Gemini prompt: %s", e)
-                    channel = self._get_message_channel(message)
-                    self._post_error_message(channel, "processing_error")
-        return messages
\ No newline at end of file
+        # Check which messages meet criteria for Gemini processing
+        triggers = messages.filtered(
+            lambda message: message.author_id and message.body and self._is_gemini_trigger(message.body)
+        )
+        if not triggers:
+            return messages
+
+        # Answer on the worker pool once the user's message is committed
+        if not self._is_gemini_sync():
+            self.env['gemini.prompt.job']._enqueue(triggers)
+            return messages
+
+        for message in triggers:
+            try:
+                self._process_gemini_prompt(message.id)
+            except Exception as e:
+                _logger.error("Error processing Gemini prompt: %s", e)
+                channel = self._get_message_channel(message)
+                self._post_error_message(channel, "processing_error")
+        return messages
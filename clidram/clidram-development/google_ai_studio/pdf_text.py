@@ -0,0 +1,90 @@
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait
+from io import BytesIO
+
+import pdfplumber
+
+from odoo.modules.module import initialize_sys_path
+
+_logger = logging.getLogger(__name__)
+
+# PDFs up to this many pages are parsed in the calling thread
+PARALLEL_THRESHOLD = 8
+MAX_PROCESSES = min(4, os.cpu_count() or 1)
+
+# One process pool per Odoo process, created on the first large PDF
+_pool_lock = threading.Lock()
+_pool = {}
+
+
+def _get_pool():
+    with _pool_lock:
+        if 'executor' not in _pool:
+            # Spawned rather than forked from the threaded server; a worker reads
+            # the server configuration on import and needs the addons paths to
+            # unpickle extract_pages
+            _pool['executor'] = ProcessPoolExecutor(max_workers=MAX_PROCESSES,
+                                                    mp_context=multiprocessing.get_context('spawn'),
+                                                    initializer=initialize_sys_path)
+        return _pool['executor']
+
+
+def extract_pages(path, start, stop):
+    """Text of pages [start, stop) of the PDF file at path, one string per page (process pool task)"""
+    with pdfplumber.open(path) as pdf:
+        return [pdf.pages[index].extract_text() or '' for index in range(start, stop)]
+
+
+def extract_pdf_text(pdf_bytes, max_pages=100, timeout=30):
+    """
+    Extract the text of a PDF, page-parallel in a process pool when it is large
+
+    Only the first max_pages pages are parsed, and page ranges not finished
+    within timeout seconds are left out. The PDF is written once to a
+    temporary file that the workers open, instead of being sent to each task.
+
+    Returns:
+        (text, page_count, truncated, complete) where truncated means the
+        max_pages cap applied and complete is False when page ranges timed
+        out or failed
+    """
+    with pdfplumber.open(BytesIO(pdf_bytes)) as pdf:
+        page_count = len(pdf.pages)
+        parsed = min(page_count, max_pages)
+        if parsed <= PARALLEL_THRESHOLD:
+            pages = [pdf.pages[index].extract_text() or '' for index in range(parsed)]
+            return '\n'.join(page for page in pages if page).strip(), page_count, parsed < page_count, True
+
+    pool = _get_pool()
+    step = max(PARALLEL_THRESHOLD // 2, -(-parsed // (MAX_PROCESSES * 2)))
+    fd, path = tempfile.mkstemp(prefix='gemini_pdf_', suffix='.pdf')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(pdf_bytes)
+        futures = [pool.submit(extract_pages, path, start, min(start + step, parsed))
+                   for start in range(0, parsed, step)]
+        done, not_done = wait(futures, timeout=timeout)
+        for future in not_done:
+            future.cancel()
+    finally:
+        os.unlink(path)
+    if not_done:
+        _logger.warning("PDF text extraction timed out after %ss, %s of %s page ranges parsed",
+                        timeout, len(done), len(futures))
+
+    pages = []
+    failed = 0
+    for future in futures:
+        if future not in done:
+            continue
+        if future.exception():
+            _logger.error("PDF page range extraction failed: %s", future.exception())
+            failed += 1
+            continue
+        pages.extend(future.result())
+    complete = not not_done and not failed
+    return '\n'.join(page for page in pages if page).strip(), page_count, parsed < page_count, complete
@@ -0,0 +1,43 @@
+import time
+
+
+class MessageStreamer:
+    """
+    Debounced progressive update of a posted bot message.
+
+    Streamed chunks are accumulated and handed to update(text) with the full
+    text so far, at most once per min_interval seconds unless min_tokens
+    (estimated at ~4 characters each) arrived since the last update, and once
+    more by close(). A long answer costs a handful of writes and bus
+    notifications instead of one per chunk.
+    """
+
+    def __init__(self, update, min_interval=0.3, min_tokens=100):
+        self.update = update
+        self.min_interval = min_interval
+        self.min_chars = min_tokens * 4
+        self.text = ''
+        self.updates = 0
+        self._flushed_len = 0
+        self._flushed_at = time.monotonic()
+
+    def feed(self, chunk):
+        if not chunk:
+            return
+        self.text += chunk
+        if (time.monotonic() - self._flushed_at >= self.min_interval
+                or len(self.text) - self._flushed_len >= self.min_chars):
+            self.flush()
+
+    def flush(self):
+        if len(self.text) == self._flushed_len:
+            return
+        self.update(self.text)
+        self.updates += 1
+        self._flushed_len = len(self.text)
+        self._flushed_at = time.monotonic()
+
+    def close(self):
+        """Push whatever is left and return the complete text"""
+        self.flush()
+        return self.text
@@ -14,6 +14,9 @@ It adds API endpoints and configuration settings for seamless query execution an
     'data': [
         'security/ir.model.access.csv',
         'data/rag_bot_data.xml',
+        'data/rag_index_outbox_cron.xml',
+        'data/rag_response_cache_cron.xml',
+        'data/rag_chat_job_cron.xml',
         'views/res_config_settings_views.xml',
         'views/res_partner_inherit_views.xml',
     ],
@@ -1,3 +1,4 @@
+import hmac
 from odoo import http
 from odoo.http import request
 import logging
@@ -76,13 +77,13 @@ class RagIntegrationController(http.Controller):
         return {'status': 'success', 'message': 'pong'}
 
     @http.route('/api/rag/appointments/fetch_all', type='json', auth='public', methods=['POST'])
-    def api_appointments_fetch_all(self, domain=None, limit=None, offset=None, **kwargs):
+    def api_appointments_fetch_all(self, domain=None, limit=None, offset=None, order=None, **kwargs):
         """Bulk fetch appointments with details"""
         auth_res = self._check_api_key(kwargs)
         if auth_res: return auth_res
         try:
             domain = domain or []
-            records = request.env['wk.appointment'].sudo().search(domain, limit=limit, offset=offset)
+            records = request.env['wk.appointment'].sudo().search(domain, limit=limit, offset=offset, order=order)
             data = [self._prepare_appointment_data(r) for r in records]
             return {'status': 'success', 'data': data}
         except Exception as e:
@@ -90,27 +91,27 @@ class RagIntegrationController(http.Controller):
             return {'status': 'error', 'message': str(e)}
 
     @http.route('/api/rag/prescriptions/fetch_all', type='json', auth='public', methods=['POST'])
-    def api_prescriptions_fetch_all(self, domain=None, limit=None, offset=None, **kwargs):
+    def api_prescriptions_fetch_all(self, domain=None, limit=None, offset=None, order=None, **kwargs):
         """Bulk fetch prescriptions with full nested details"""
         auth_res = self._check_api_key(kwargs)
         if auth_res: return auth_res
         try:
             domain = domain or []
-            records = request.env['prescription.order.knk'].sudo().search(domain, limit=limit, offset=offset)
-            data = [self._prepare_prescription_data(r) for r in records]
+            records = request.env['prescription.order.knk'].sudo().search(domain, limit=limit, offset=offset, order=order)
+            data = self._prepare_prescriptions_data(records)
             return {'status': 'success', 'data': data}
         except Exception as e:
             logger.error(f"Error in prescriptions/fetch_all: {str(e)}")
             return {'status': 'error', 'message': str(e)}
 
     @http.route('/api/rag/patients/fetch_all', type='json', auth='public', methods=['POST'])
-    def api_patients_fetch_all(self, domain=None, limit=None, offset=None, **kwargs):
+    def api_patients_fetch_all(self, domain=None, limit=None, offset=None, order=None, **kwargs):
         """Bulk fetch patient profiles"""
         auth_res = self._check_api_key(kwargs)
         if auth_res: return auth_res
         try:
             domain = [('partner_type', '=', 'patient')] + (domain or [])
-            records = request.env['res.partner'].sudo().search(domain, limit=limit, offset=offset)
+            records = request.env['res.partner'].sudo().search(domain, limit=limit, offset=offset, order=order)
             data = [self._prepare_patient_data(r) for r in records]
             return {'status': 'success', 'data': data}
         except Exception as e:
@@ -118,13 +119,13 @@ class RagIntegrationController(http.Controller):
             return {'status': 'error', 'message': str(e)}
 
     @http.route('/api/rag/diseases/fetch_all', type='json', auth='public', methods=['POST'])
-    def api_diseases_fetch_all(self, domain=None, limit=None, offset=None, **kwargs):
+    def api_diseases_fetch_all(self, domain=None, limit=None, offset=None, order=None, **kwargs):
         """Bulk fetch disease definitions"""
         auth_res = self._check_api_key(kwargs)
         if auth_res: return auth_res
         try:
             domain = domain or []
-            records = request.env['medical.disease'].sudo().search(domain, limit=limit, offset=offset)
+            records = request.env['medical.disease'].sudo().search(domain, limit=limit, offset=offset, order=order)
             data = [self._prepare_disease_data(r) for r in records]
             return {'status': 'success', 'data': data}
         except Exception as e:
@@ -139,27 +140,56 @@ class RagIntegrationController(http.Controller):
 
         try:
             domain = domain or []
-            records = request.env[model].sudo().search(domain, limit=limit, offset=offset)
-
-            result_list = []
-            for record in records:
-                if model == 'prescription.order.knk':
-                    result_list.append(self._prepare_prescription_data(record))
-                elif model == 'res.partner':
-                    result_list.append(self._prepare_patient_data(record))
-                elif model == 'wk.appointment':
-                    result_list.append(self._prepare_appointment_data(record))
-                elif model == 'medical.disease':
-                    result_list.append(self._prepare_disease_data(record))
-                else:
-                    fields = request.env[model]._fields.keys()
-                    result_list.append(record.read(list(fields))[0])
+            Model = request.env[model].sudo()
+            if model not in ('prescription.order.knk', 'res.partner', 'wk.appointment', 'medical.disease'):
+                # Other models: one projected search_read (requested or stored scalar fields)
+                fields = kwargs.get('fields') or [
+                    name for name, field in Model._fields.items()
+                    if field.store and field.type not in ('binary', 'one2many', 'many2many')
+                ]
+                columns, rows = self._export_rows(Model, fields, domain, limit=limit, offset=offset)
+                return {'status': 'success', 'data': [dict(zip(columns, row)) for row in rows]}
+
+            records = Model.search(domain, limit=limit, offset=offset)
+            if model == 'prescription.order.knk':
+                result_list = self._prepare_prescriptions_data(records)
+            elif model == 'res.partner':
+                result_list = [self._prepare_patient_data(r) for r in records]
+            elif model == 'wk.appointment':
+                result_list = [self._prepare_appointment_data(r) for r in records]
+            else:
+                result_list = [self._prepare_disease_data(r) for r in records]
 
             return {'status': 'success', 'data': result_list}
         except Exception as e:
             logger.error(f"Error in api_get_all_details for {model}: {str(e)}")
             return {'status': 'error', 'message': str(e)}
 
+    @http.route('/api/rag/export', type='json', auth='public', methods=['POST'])
+    def api_export(self, model, fields, domain=None, after_id=None, limit=None, **kwargs):
+        """
+        Column-projected bulk export for ETL extraction.
+
+        fields may contain plain fields or one-level many2one paths such as
+        'customer.seq'; a page is one search_read in ascending ID order after
+        the after_id cursor, plus one read per related model. Rows are returned
+        as lists aligned with 'fields' (always starting with 'id'), and
+        next_after_id is set while more pages may follow.
+        """
+        auth_res = self._check_api_key(kwargs)
+        if auth_res: return auth_res
+
+        try:
+            domain = list(domain or [])
+            if after_id:
+                domain.append(('id', '>', int(after_id)))
+            columns, rows = self._export_rows(request.env[model].sudo(), fields, domain, limit=limit)
+            next_after_id = rows[-1][0] if rows and limit and len(rows) == limit else None
+            return {'status': 'success', 'fields': columns, 'rows': rows, 'next_after_id': next_after_id}
+        except Exception as e:
+            logger.error(f"Error in export for {model}: {str(e)}")
+            return {'status': 'error', 'message': str(e)}
+
     @http.route('/api/rag/list_ids', type='json', auth='public', methods=['POST'])
     def api_list_ids(self, model, domain=None, limit=None, offset=None, **kwargs):
         """Generic endpoint to list IDs for any model with domain filters"""
@@ -174,6 +204,20 @@ class RagIntegrationController(http.Controller):
             logger.error(f"Error listing IDs for {model}: {str(e)}")
             return {'status': 'error', 'message': str(e)}
 
+    @http.route('/api/rag/count', type='json', auth='public', methods=['POST'])
+    def api_count(self, model, domain=None, **kwargs):
+        """Generic endpoint to count records for any model with domain filters"""
+        auth_res = self._check_api_key(kwargs)
+        if auth_res: return auth_res
+
+        try:
+            domain = domain or []
+            count = request.env[model].sudo().search_count(domain)
+            return {'status': 'success', 'count': count}
+        except Exception as e:
+            logger.error(f"Error counting {model}: {str(e)}")
+            return {'status': 'error', 'message': str(e)}
+
     @http.route('/api/rag/get_patient', type='json', auth='public', methods=['POST'])
     def api_get_patient(self, patient_id, **kwargs):
         """Fetch full patient details"""
@@ -223,110 +267,243 @@ class RagIntegrationController(http.Controller):
             return {'status': 'error', 'message': str(e)}
 
     # Internal helper methods for data preparation
+    # Scalar fields read from prescription.order.knk in one query per page
+    _PRESCRIPTION_FIELDS = [
+        'name', 'patient_id', 'patient_seq', 'physician_id', 'date', 'state', 'disease', 'description',
+        'v_weight', 'v_height', 'v_bmi', 'blood_presure', 'blood_presure_2', 'v_pulse', 'v_respiratory_rate',
+        'temperature', 'spo2', 'rbs', 'pain_score', 'dyspnea', 'cardiac_rythm', 'nihss', 'motor_power',
+        'pupil_reaction', 'pupil_reaction_right', 'glassgow_coma_scale', 'symptom_status', 'medication_adherence',
+        'performance_status_update', 'counseling_behavioral_response', 'side_effects', 'investigation_result',
+        'procedure_result', 'general', 'heent', 'cvs', 'respiratory', 'abdomen', 'msk', 'cns', 'patient_history',
+        'notes_line_id', 'patient_details', 'extra_notes', 'additional_comments', 'next_visit_days',
+        'write_date',
+    ]
+
+    # Relations of prescription.order.knk and the line fields serialized for each
+    _PRESCRIPTION_RELATIONS = {
+        'order_line_new_ids': ['product_id', 'quantity', 'days', 'short_comment'],
+        'diagnosis_ids': ['disease_id', 'disease_short_code_id'],
+        'complaint_id': ['complaint_list_id', 'period', 'location_id'],
+        'sign_ids': ['sign_list_id', 'name', 'location'],
+        'investigation_ids': ['investigation_list_id'],
+        'procedure_line_ids': ['procedure_config_id'],
+        'physical_examination_ids': ['general', 'heent', 'cvs', 'respiratory', 'abdomen', 'msk', 'cns'],
+        'gcs_score_line_ids': ['total_score', 'motor_response_id', 'verbal_response_id', 'eye_response_id'],
+        'bmi_line_ids': ['v_weight', 'v_height', 'v_bmi'],
+        'excercise_ids': ['name', 'part_location', 'move2', 'type_of_test2'],
+        'ortho_ids': ['name', 'side', 'location'],
+        'history_id': ['history_category_id', 'history_period', 'progression'],
+        'medical_history_ids': ['name', 'date', 'medication'],
+        'past_medical_history_line_ids': ['symptom_id', 'result_id'],
+        'medication_history_line_ids': ['medicine_id'],
+        'family_history_line_ids': ['family_history_config_id', 'family_history_result_id'],
+        'social_history_line_ids': ['social_history_config_id', 'social_history_result_id'],
+    }
+
     def _prepare_prescription_data(self, prescription):
+        return self._prepare_prescriptions_data(prescription)[0]
+
+    def _prepare_prescriptions_data(self, prescriptions):
+        """
+        Serialize a page of prescriptions.
+        Each relation is read once for the whole recordset and many2one names once
+        per comodel, so the query count depends on the number of relations, not records.
+        """
+        if not prescriptions:
+            return []
+        names = {}
+        fields = [f for f in self._PRESCRIPTION_FIELDS + list(self._PRESCRIPTION_RELATIONS) if f in prescriptions._fields]
+        rows = prescriptions.read(fields, load=None)
+        for row in rows:
+            # Kept as ids for the RAG patient and physician filters, before names replace the many2ones
+            row['patient_res_id'] = row.get('patient_id') or None
+            row['physician_res_id'] = row.get('physician_id') or None
+        self._resolve_many2one_names(prescriptions, rows, fields, names)
+        lines = {
+            relation: self._read_relation_lines(prescriptions, rows, relation, line_fields, names)
+            for relation, line_fields in self._PRESCRIPTION_RELATIONS.items()
+        }
+        return [self._assemble_prescription_data(row, {relation: by_id[row['id']] for relation, by_id in lines.items()})
+                for row in rows]
+
+    def _read_relation_lines(self, records, rows, relation, fields, names):
+        """Read the lines of a relation for all records at once: {record_id: [line values]}"""
+        field = records._fields.get(relation)
+        if not field:
+            return {row['id']: [] for row in rows}
+        Lines = records.env[field.comodel_name]
+        fields = [f for f in fields if f in Lines._fields]
+        line_ids = {row['id']: self._as_ids(row.get(relation)) for row in rows}
+        all_ids = sorted({i for ids in line_ids.values() for i in ids})
+        lines = {}
+        if all_ids:
+            line_rows = Lines.browse(all_ids).read(fields, load=None)
+            self._resolve_many2one_names(Lines, line_rows, fields, names)
+            lines = {line['id']: line for line in line_rows}
+        return {record_id: [lines[i] for i in ids if i in lines] for record_id, ids in line_ids.items()}
+
+    def _resolve_many2one_names(self, model, rows, fields, names):
+        """Replace many2one ids in rows by the related record names (one read per comodel, cached in names)"""
+        for fname in fields:
+            field = model._fields.get(fname)
+            if not field or field.type != 'many2one':
+                continue
+            cache = names.setdefault(field.comodel_name, {})
+            missing = {row[fname] for row in rows if row.get(fname)} - set(cache)
+            if missing:
+                for related in model.env[field.comodel_name].browse(sorted(missing)).read(['name']):
+                    cache[related['id']] = related['name']
+            for row in rows:
+                row[fname] = cache.get(row[fname], '') if row.get(fname) else ''
+
+    def _export_rows(self, Model, fields, domain, limit=None, offset=None):
+        """
+        Read a projection of Model: one search_read for the own columns and one
+        read per many2one comodel for dotted paths ('customer.seq').
+        Returns (columns, rows) with rows as value lists in column order.
+        """
+        columns = ['id'] + [f for f in fields if f != 'id']
+        related = {}
+        boolean_columns = set()
+        for path in columns[1:]:
+            fname, _dot, subfield = path.partition('.')
+            field = Model._fields.get(fname)
+            if not field:
+                raise ValueError(f"Unknown field {fname} on {Model._name}")
+            if subfield:
+                if field.type != 'many2one' or subfield not in Model.env[field.comodel_name]._fields:
+                    raise ValueError(f"Cannot export {path} from {Model._name}")
+                related.setdefault(fname, set()).add(subfield)
+                field = Model.env[field.comodel_name]._fields[subfield]
+            if field.type == 'boolean':
+                boolean_columns.add(path)
+
+        own_fields = sorted({path.partition('.')[0] for path in columns[1:]})
+        records = Model.search_read(domain, own_fields, limit=limit, offset=offset or 0, order='id asc', load=None)
+
+        related_values = {}
+        for fname, subfields in related.items():
+            ids = sorted({row[fname] for row in records if row.get(fname)})
+            comodel = Model.env[Model._fields[fname].comodel_name]
+            related_values[fname] = {r['id']: r for r in comodel.browse(ids).read(sorted(subfields), load=None)} if ids else {}
+
+        rows = []
+        for record in records:
+            row = []
+            for path in columns:
+                fname, _dot, subfield = path.partition('.')
+                value = record.get(fname)
+                if subfield:
+                    value = related_values[fname].get(value, {}).get(subfield) if value else None
+                row.append(bool(value) if path in boolean_columns else self._export_value(value))
+            rows.append(row)
+        return columns, rows
+
+    def _export_value(self, value):
+        """JSON-friendly value: dates as ISO strings, Odoo's False for empty (non-boolean) values as None"""
+        if value is False:
+            return None
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        return value
+
+    def _as_ids(self, value):
+        if isinstance(value, (list, tuple)):
+            return list(value)
+        return [value] if value else []
+
+    def _assemble_prescription_data(self, p, lines):
         return {
-            'id': prescription.id,
-            'name': prescription.name,
-            'patient': prescription.patient_id.name if prescription.patient_id else '',
-            'physician': prescription.physician_id.name if prescription.physician_id else '',
-            'date': prescription.date.isoformat() if prescription.date else '',
-            'state': prescription.state,
-            'disease': prescription.disease,
-            'description': prescription.description,
+            'id': p['id'],
+            'name': p.get('name'),
+            'patient': p.get('patient_id') or '',
+            'patient_seq': p.get('patient_seq') or '',
+            'patient_res_id': p.get('patient_res_id'),
+            'physician': p.get('physician_id') or '',
+            'physician_res_id': p.get('physician_res_id'),
+            'date': p['date'].isoformat() if p.get('date') else '',
+            'state': p.get('state'),
+            'disease': p.get('disease'),
+            'description': p.get('description'),
             'vitals': {
-                'weight': prescription.v_weight,
-                'height': prescription.v_height,
-                'bmi': prescription.v_bmi,
-                'blood_pressure': f"{prescription.blood_presure}/{prescription.blood_presure_2}" if prescription.blood_presure else "",
-                'pulse': prescription.v_pulse,
-                'respiratory_rate': prescription.v_respiratory_rate,
-                'temperature': prescription.temperature,
-                'spo2': prescription.spo2,
-                'rbs': prescription.rbs,
+                'weight': p.get('v_weight'),
+                'height': p.get('v_height'),
+                'bmi': p.get('v_bmi'),
+                'blood_pressure': f"{p.get('blood_presure')}/{p.get('blood_presure_2')}" if p.get('blood_presure') else "",
+                'pulse': p.get('v_pulse'),
+                'respiratory_rate': p.get('v_respiratory_rate'),
+                'temperature': p.get('temperature'),
+                'spo2': p.get('spo2'),
+                'rbs': p.get('rbs'),
             },
             'clinical_scores': {
-                'pain_score': prescription.pain_score,
-                'dyspnea': prescription.dyspnea,
-                'cardiac_rythm': prescription.cardiac_rythm,
-                'nihss': prescription.nihss,
-                'motor_power': prescription.motor_power,
-                'pupil_reaction': prescription.pupil_reaction,
-                'pupil_reaction_right': prescription.pupil_reaction_right,
-                'glassgow_coma_scale': prescription.glassgow_coma_scale,
+                'pain_score': p.get('pain_score'),
+                'dyspnea': p.get('dyspnea'),
+                'cardiac_rythm': p.get('cardiac_rythm'),
+                'nihss': p.get('nihss'),
+                'motor_power': p.get('motor_power'),
+                'pupil_reaction': p.get('pupil_reaction'),
+                'pupil_reaction_right': p.get('pupil_reaction_right'),
+                'glassgow_coma_scale': p.get('glassgow_coma_scale'),
             },
             'status_updates': {
-                'symptom_status': prescription.symptom_status,
-                'medication_adherence': prescription.medication_adherence,
-                'performance_status_update': prescription.performance_status_update,
-                'counseling_behavioral_response': prescription.counseling_behavioral_response,
-                'side_effects': prescription.side_effects,
+                'symptom_status': p.get('symptom_status'),
+                'medication_adherence': p.get('medication_adherence'),
+                'performance_status_update': p.get('performance_status_update'),
+                'counseling_behavioral_response': p.get('counseling_behavioral_response'),
+                'side_effects': p.get('side_effects'),
             },
-            'medications': [
-                {'name': m.product_id.name, 'quantity': m.quantity, 'days': m.days, 'instruction': m.short_comment} for
-                m in prescription.order_line_new_ids],
-            'diagnoses': [{'name': d.disease_id.name if d.disease_id else ''} for d in prescription.diagnosis_ids],
-            'complaints': [{'name': c.complaint_list_id.name if c.complaint_list_id else '',
-                            'period': c.period.name if c.period else '',
-                            'location': c.location_id.name if c.location_id else ''} for c in
-                           prescription.complaint_id],
-            'signs': [{'name': s.sign_list_id.name if hasattr(s, 'sign_list_id') and s.sign_list_id else s.name,
-                       'location': s.location.name if hasattr(s, 'location') and s.location else ''} for s in
-                      prescription.sign_ids],
-            'investigations': [{'name': i.investigation_list_id.name if hasattr(i,
-                                                                                'investigation_list_id') and i.investigation_list_id else ''}
-                               for i in prescription.investigation_ids],
-            'investigation_result': prescription.investigation_result,
-            'procedures': [{'name': p.procedure_config_id.name if hasattr(p,
-                                                                          'procedure_config_id') and p.procedure_config_id else ''}
-                           for p in prescription.procedure_line_ids],
-            'procedure_result': prescription.procedure_result,
+            'medications': [{'name': m.get('product_id'), 'quantity': m.get('quantity'), 'days': m.get('days'),
+                             'instruction': m.get('short_comment')} for m in lines['order_line_new_ids']],
+            'diagnoses': [{'name': d.get('disease_id') or '', 'disease_code': d.get('disease_short_code_id') or ''}
+                          for d in lines['diagnosis_ids']],
+            'complaints': [{'name': c.get('complaint_list_id') or '', 'period': c.get('period') or '',
+                            'location': c.get('location_id') or ''} for c in lines['complaint_id']],
+            'signs': [{'name': s.get('sign_list_id') or s.get('name'), 'location': s.get('location') or ''}
+                      for s in lines['sign_ids']],
+            'investigations': [{'name': i.get('investigation_list_id') or ''} for i in lines['investigation_ids']],
+            'investigation_result': p.get('investigation_result'),
+            'procedures': [{'name': pr.get('procedure_config_id') or ''} for pr in lines['procedure_line_ids']],
+            'procedure_result': p.get('procedure_result'),
             'physical_examinations': {
-                'general': prescription.general,
-                'heent': prescription.heent,
-                'cvs': prescription.cvs,
-                'respiratory': prescription.respiratory,
-                'abdomen': prescription.abdomen,
-                'msk': prescription.msk,
-                'cns': prescription.cns,
-                'boards': [{'general': pe.general, 'heent': pe.heent, 'cvs': pe.cvs, 'respiratory': pe.respiratory,
-                            'abdomen': pe.abdomen, 'msk': pe.msk, 'cns': pe.cns} for pe in
-                           prescription.physical_examination_ids]
+                'general': p.get('general'),
+                'heent': p.get('heent'),
+                'cvs': p.get('cvs'),
+                'respiratory': p.get('respiratory'),
+                'abdomen': p.get('abdomen'),
+                'msk': p.get('msk'),
+                'cns': p.get('cns'),
+                'boards': [{'general': pe.get('general'), 'heent': pe.get('heent'), 'cvs': pe.get('cvs'),
+                            'respiratory': pe.get('respiratory'), 'abdomen': pe.get('abdomen'), 'msk': pe.get('msk'),
+                            'cns': pe.get('cns')} for pe in lines['physical_examination_ids']]
             },
-            'gcs_scores': [{'total': g.total_score, 'motor': g.motor_response_id.name if hasattr(g,
-                                                                                                 'motor_response_id') and g.motor_response_id else '',
-                            'verbal': g.verbal_response_id.name if hasattr(g,
-                                                                           'verbal_response_id') and g.verbal_response_id else '',
-                            'eye': g.eye_response_id.name if hasattr(g,
-                                                                     'eye_response_id') and g.eye_response_id else ''}
-                           for g in prescription.gcs_score_line_ids],
-            'bmi_records': [{'weight': b.v_weight, 'height': b.v_height, 'bmi': b.v_bmi} for b in
-                            prescription.bmi_line_ids],
-            'exercises': [{'name': e.name, 'location': e.part_location.name if e.part_location else '', 'move': e.move2,
-                           'reps': e.type_of_test2} for e in prescription.excercise_ids],
-            'ortho_items': [{'name': o.name, 'side': o.side, 'location': o.location.name if o.location else ''} for o in
-                            prescription.ortho_ids],
-            'old_history': [{'name': h.history_category_id.name if h.history_category_id else '',
-                             'period': h.history_period.name if h.history_period else '', 'progression': h.progression}
-                            for h in prescription.history_id],
-            'medical_history': [{'name': m.name, 'date': str(m.date) if m.date else '', 'medication': m.medication} for
-                                m in prescription.medical_history_ids],
-            'past_medical_history': [{'symptom': p.symptom_id.name if p.symptom_id else '',
-                                      'result': p.result_id.name if p.result_id else ''} for p in
-                                     prescription.past_medical_history_line_ids],
-            'medication_history': [{'medicine': m.medicine_id.name if m.medicine_id else ''} for m in
-                                   prescription.medication_history_line_ids],
-            'family_history': [{'condition': f.family_history_config_id.name if f.family_history_config_id else '',
-                                'result': f.family_history_result_id.name if f.family_history_result_id else ''} for f
-                               in prescription.family_history_line_ids],
-            'social_history': [{'habit': s.social_history_config_id.name if s.social_history_config_id else '',
-                                'result': s.social_history_result_id.name if s.social_history_result_id else ''} for s
-                               in prescription.social_history_line_ids],
-            'patient_history': prescription.patient_history,
-            'advice_notes': prescription.notes_line_id.name if prescription.notes_line_id else '',
-            'patient_details': prescription.patient_details,
-            'followup_notes': prescription.extra_notes,
-            'additional_comments': prescription.additional_comments,
-            'next_visit_days': prescription.next_visit_days,
+            'gcs_scores': [{'total': g.get('total_score'), 'motor': g.get('motor_response_id') or '',
+                            'verbal': g.get('verbal_response_id') or '', 'eye': g.get('eye_response_id') or ''}
+                           for g in lines['gcs_score_line_ids']],
+            'bmi_records': [{'weight': b.get('v_weight'), 'height': b.get('v_height'), 'bmi': b.get('v_bmi')}
+                            for b in lines['bmi_line_ids']],
+            'exercises': [{'name': e.get('name'), 'location': e.get('part_location') or '', 'move': e.get('move2'),
+                           'reps': e.get('type_of_test2')} for e in lines['excercise_ids']],
+            'ortho_items': [{'name': o.get('name'), 'side': o.get('side'), 'location': o.get('location') or ''}
+                            for o in lines['ortho_ids']],
+            'old_history': [{'name': h.get('history_category_id') or '', 'period': h.get('history_period') or '',
+                             'progression': h.get('progression')} for h in lines['history_id']],
+            'medical_history': [{'name': m.get('name'), 'date': str(m['date']) if m.get('date') else '',
+                                 'medication': m.get('medication')} for m in lines['medical_history_ids']],
+            'past_medical_history': [{'symptom': pm.get('symptom_id') or '', 'result': pm.get('result_id') or ''}
+                                     for pm in lines['past_medical_history_line_ids']],
+            'medication_history': [{'medicine': m.get('medicine_id') or ''} for m in lines['medication_history_line_ids']],
+            'family_history': [{'condition': f.get('family_history_config_id') or '',
+                                'result': f.get('family_history_result_id') or ''} for f in lines['family_history_line_ids']],
+            'social_history': [{'habit': s.get('social_history_config_id') or '',
+                                'result': s.get('social_history_result_id') or ''} for s in lines['social_history_line_ids']],
+            'patient_history': p.get('patient_history'),
+            'advice_notes': p.get('notes_line_id') or '',
+            'patient_details': p.get('patient_details'),
+            'followup_notes': p.get('extra_notes'),
+            'additional_comments': p.get('additional_comments'),
+            'next_visit_days': p.get('next_visit_days'),
+            'write_date': p['write_date'].isoformat() if p.get('write_date') else '',
         }
 
     def _prepare_patient_data(self, patient):
@@ -368,18 +545,51 @@ class RagIntegrationController(http.Controller):
         }
 
     @http.route('/api/rag/mark_synced', type='json', auth='public', methods=['POST'])
-    def api_mark_synced(self, model, res_ids, **kwargs):
-        """Mark records as synced in Odoo"""
+    def api_mark_synced(self, model, res_ids=None, versions=None, **kwargs):
+        """
+        Mark records as synced in Odoo with one SQL update, bypassing the ORM
+        (no write() override, recomputes, tracking or write_date bump).
+
+        versions is a list of [id, write_date] pairs captured at extraction: a
+        record is only flagged if its write_date is exactly unchanged, so edits
+        made while it was being indexed, even within the same second, are not lost. Those ids are returned as
+        changed_ids and stay unsynced for the next incremental run.
+        Plain res_ids (no guard) are still accepted from older ETL clients.
+        """
         auth_res = self._check_api_key(kwargs)
         if auth_res: return auth_res
 
         try:
-            records = request.env[model].sudo().browse(res_ids)
-            if hasattr(request.env[model], 'is_rag_synced'):
-                records.write({'is_rag_synced': True})
-                return {'status': 'success', 'count': len(res_ids)}
-            else:
+            Model = request.env[model].sudo()
+            if 'is_rag_synced' not in Model._fields:
                 return {'status': 'error', 'message': f'Model {model} has no is_rag_synced column'}
+
+            # Make sure pending ORM writes reach the table before updating it directly
+            Model.flush_model(['is_rag_synced', 'write_date'])
+            cr = request.env.cr
+            if versions is not None:
+                ids = [int(res_id) for res_id, _write_date in versions]
+                write_dates = [write_date or None for _res_id, write_date in versions]
+                # Exact match: write_date is extracted with isoformat(), microseconds included
+                cr.execute(f"""
+                    UPDATE "{Model._table}" AS t SET is_rag_synced = TRUE
+                    FROM unnest(%s::int[], %s::timestamp[]) AS v(id, write_date)
+                    WHERE t.id = v.id AND t.write_date = v.write_date
+                    RETURNING t.id
+                """, [ids, write_dates])
+            else:
+                ids = [int(res_id) for res_id in res_ids or []]
+                cr.execute(
+                    f'UPDATE "{Model._table}" SET is_rag_synced = TRUE WHERE id = ANY(%s) RETURNING id',
+                    [ids]
+                )
+            synced_ids = {row[0] for row in cr.fetchall()}
+            Model.browse(ids).invalidate_recordset(['is_rag_synced'])
+
+            changed_ids = sorted(set(ids) - synced_ids)
+            if changed_ids:
+                logger.info(f"{len(changed_ids)} {model} records changed since extraction, left unsynced")
+            return {'status': 'success', 'count': len(synced_ids), 'changed_ids': changed_ids}
         except Exception as e:
             logger.error(f"Error marking {model} synced: {str(e)}")
             return {'status': 'error', 'message': str(e)}
@@ -402,7 +612,8 @@ class RagIntegrationController(http.Controller):
     @http.route('/api/rag/trigger_indexing', type='json', auth='user', methods=['POST'])
     def api_trigger_index(self, models_list=None, incremental=False, limit=None, **kwargs):
         """
-        JSON-RPC endpoint to trigger manual tracking
+        JSON-RPC endpoint to trigger manual tracking; returns the queued
+        indexing job, poll it with /api/rag/indexing_job
         """
         # Ensure user is admin to run this
         if not request.env.user.has_group('base.group_erp_manager'):
@@ -420,6 +631,21 @@ class RagIntegrationController(http.Controller):
             logger.error(f"Error triggering index: {str(e)}")
             return {'status': 'error', 'message': str(e)}
 
+    @http.route('/api/rag/indexing_job', type='json', auth='user', methods=['POST'])
+    def api_indexing_job(self, job_id, **kwargs):
+        """
+        JSON-RPC endpoint to poll an indexing job queued by trigger_indexing
+        """
+        if not request.env.user.has_group('base.group_erp_manager'):
+            return {'status': 'error', 'message': 'Access Denied: Only Administrator can follow indexing'}
+
+        try:
+            result = request.env['rag.api.client'].get_indexing_job(job_id)
+            return {'status': 'success', 'data': result}
+        except Exception as e:
+            logger.error(f"Error fetching indexing job {job_id}: {str(e)}")
+            return {'status': 'error', 'message': str(e)}
+
     @http.route('/api/rag/status', type='json', auth='user', methods=['POST'])
     def api_get_status(self, **kwargs):
         """
@@ -433,8 +659,39 @@ class RagIntegrationController(http.Controller):
             logger.error(f"Error fetching status: {str(e)}")
             return {'status': 'error', 'message': str(e)}
 
+    @http.route('/api/rag/dispatcher_metrics', type='json', auth='user', methods=['POST'])
+    def api_dispatcher_metrics(self, **kwargs):
+        """
+        JSON-RPC endpoint exposing chat worker pool load: pending tasks,
+        queue wait and RAG round-trip timings of this Odoo process
+        """
+        if not request.env.user.has_group('base.group_erp_manager'):
+            return {'status': 'error', 'message': 'Access Denied'}
+        dispatcher = request.env['mail.channel']._get_rag_dispatcher()
+        return {'status': 'success', 'data': dispatcher.stats()}
+
+    @http.route('/api/rag/chat/callback', type='json', auth='public', methods=['POST'])
+    def api_chat_callback(self, job_ref=None, token=None, status=None, response=None, message=None, **kwargs):
+        """
+        Receives finished chat jobs from the RAG service and posts the answer into
+        the job's channel. Authenticated by the per-job token sent at submission.
+        """
+        try:
+            job = request.env['rag.chat.job'].sudo().browse(int(job_ref or 0)).exists()
+            if not job or not token or not hmac.compare_digest(job.token, token):
+                return {'status': 'error', 'message': 'Unknown chat job'}
+            if job.state == 'done':
+                # Retried delivery of an answer already posted
+                return {'status': 'success'}
+            # A late answer is still posted after the job timed out
+            job._complete(status, response=response, message=message)
+            return {'status': 'success'}
+        except Exception as e:
+            logger.error(f"Error handling RAG chat callback for job {job_ref}: {str(e)}")
+            return {'status': 'error', 'message': str(e)}
+
     @http.route('/api/rag/chat', type='json', auth='user', methods=['POST'])
-    def api_chat(self, prompt, session_id, patient_seq=None, reset=False, chat_history=None, **kwargs):
+    def api_chat(self, prompt, session_id, patient_seq=None, reset=False, **kwargs):
         """
         JSON-RPC endpoint to handle Conversation RAG directly
         """
@@ -445,7 +702,6 @@ class RagIntegrationController(http.Controller):
                 session_id=session_id,
                 patient_seq=patient_seq,
                 reset=reset,
-                chat_history=chat_history,
             )
             return {'status': 'success', 'data': result}
         except Exception as e:
@@ -0,0 +1,131 @@
+import logging
+import queue
+import threading
+import time
+from collections import deque
+
+_logger = logging.getLogger(__name__)
+
+
+class DispatchMetrics:
+    """Thread-safe rolling timings (seconds) per metric name"""
+
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self._window = window
+        self._samples = {}
+        self._counters = {}
+
+    def observe(self, name, seconds):
+        with self._lock:
+            self._samples.setdefault(name, deque(maxlen=self._window)).append(seconds)
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def snapshot(self):
+        with self._lock:
+            result = dict(self._counters)
+            for name, samples in self._samples.items():
+                ordered = sorted(samples)
+                count = len(ordered)
+                result[name] = {
+                    'count': count,
+                    'avg_ms': round(sum(ordered) / count * 1000, 1),
+                    'p50_ms': round(ordered[count // 2] * 1000, 1),
+                    'p95_ms': round(ordered[min(count - 1, int(count * 0.95))] * 1000, 1),
+                    'max_ms': round(ordered[-1] * 1000, 1),
+                }
+            return result
+
+
+class KeyedDispatcher:
+    """
+    Bounded thread pool running tasks in FIFO order per key.
+
+    At most one task per key runs at a time (so messages of one channel are
+    answered in order), at most max_workers tasks run overall, and submit()
+    refuses new tasks once max_pending are waiting.
+    """
+
+    def __init__(self, name, max_workers=4, max_pending=100):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.metrics = DispatchMetrics()
+        self._lock = threading.Lock()
+        self._ready = queue.Queue()
+        self._tasks = {}
+        self._scheduled = set()
+        self._pending = 0
+        self._workers = []
+
+    def is_full(self):
+        with self._lock:
+            return self._pending >= self.max_pending
+
+    def submit(self, key, fn, *args):
+        """Queue fn(*args) behind earlier tasks of the same key. Returns False when the queue is full."""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.metrics.incr('rejected')
+                _logger.warning("%s queue full, rejected task for %s", self.name, key)
+                return False
+            self._tasks.setdefault(key, deque()).append((fn, args, time.monotonic()))
+            self._pending += 1
+            if key not in self._scheduled:
+                self._scheduled.add(key)
+                self._ready.put(key)
+            if len(self._workers) < self.max_workers:
+                worker = threading.Thread(
+                    target=self._run, name=f"{self.name}-{len(self._workers)}", daemon=True
+                )
+                self._workers.append(worker)
+                worker.start()
+        self.metrics.incr('submitted')
+        return True
+
+    def stats(self):
+        with self._lock:
+            state = {
+                'workers': len(self._workers),
+                'max_workers': self.max_workers,
+                'pending': self._pending,
+                'max_pending': self.max_pending,
+                'active_keys': len(self._scheduled),
+            }
+        state.update(self.metrics.snapshot())
+        return state
+
+    def _run(self):
+        while True:
+            key = self._ready.get()
+            with self._lock:
+                fn, args, enqueued_at = self._tasks[key].popleft()
+                self._pending -= 1
+            self.metrics.observe('queue_wait', time.monotonic() - enqueued_at)
+            try:
+                fn(*args)
+            except Exception:
+                self.metrics.incr('failed')
+                _logger.exception("%s task for %s failed", self.name, key)
+            with self._lock:
+                if self._tasks[key]:
+                    # Next task of this key goes to the back of the line
+                    self._ready.put(key)
+                else:
+                    del self._tasks[key]
+                    self._scheduled.discard(key)
+
+
+_dispatchers = {}
+_dispatchers_lock = threading.Lock()
+
+
+def get_dispatcher(name, max_workers=4, max_pending=100):
+    """Process-wide dispatcher by name; sizes apply when it is first created"""
+    with _dispatchers_lock:
+        if name not in _dispatchers:
+            _dispatchers[name] = KeyedDispatcher(name, max_workers=max_workers, max_pending=max_pending)
+        return _dispatchers[name]
@@ -1,6 +1,9 @@
 from . import res_config_settings
 from . import rag_api_client
 from . import rag_chat_message
+from . import rag_chat_job
+from . import rag_index_outbox
+from . import rag_response_cache
 from . import medical_models_inherit
 from . import mail_channel_inherit
 from . import res_partner_inherit
@@ -1,10 +1,12 @@
 import logging
-import threading
 import re
 import time
+from functools import partial
 from odoo import api, models, _
 from odoo.tools import html2plaintext
 
+from ..dispatcher import get_dispatcher
+
 _logger = logging.getLogger(__name__)
 
 class MailChannel(models.Model):
@@ -76,7 +78,9 @@ class MailChannel(models.Model):
         return "".join(html_parts)
 
     def _post_rag_response(self, response_text, is_error=False):
-        """Post the LLM's response or an error message back into the Odoo Discuss channel as the RAG Bot."""
+        """
+        Post the LLM's response or an error message back into the Odoo Discuss channel as the RAG Bot.
+        """
         rag_partner = self._get_rag_partner()
         if not rag_partner:
             _logger.error("Cannot post response: RAG partner not found.")
@@ -96,6 +100,26 @@ class MailChannel(models.Model):
         except Exception as e:
             _logger.error("Failed to post RAG bot response: %s", e)
 
+    def _deliver_rag_answer(self, prompt, response_text, session_id, patient_seq=None, cache=True):
+        """Record the assistant's answer, cache it and post it into the channel"""
+        self.ensure_one()
+        ChatMessage = self.env['rag.chat.message'].sudo()
+        # Only answers to an opening question are cached: follow-ups depend on the conversation
+        opening = ChatMessage.search_count([('session_id', '=', session_id)]) <= 1
+        ChatMessage.create({
+            'channel_id': self.id,
+            'session_id': session_id,
+            'role': 'assistant',
+            'content': response_text,
+            'patient_seq': patient_seq or '',
+        })
+        # Fallback answers (LLM down) only show retrieved context: not worth caching
+        if cache and opening and not response_text.startswith('[LLM unavailable'):
+            self.env['rag.response.cache']._store(prompt, patient_seq, response_text)
+
+        clean_text = self._clean_markdown(response_text)
+        self._post_rag_response(self._format_llm_text_to_html(clean_text))
+
     def _notify_thread(self, message, msg_vals=False, **kwargs):
         """
         Core Odoo mail interceptor:
@@ -126,20 +150,59 @@ class MailChannel(models.Model):
             except Exception:
                 pass
 
-        # 6. Spin up a background thread to fetch the LLM response without freezing the Odoo UI
-        # We pass self.id to easily reconstruct the channel in the new thread
-        threading.Thread(
-            target=self._async_call_rag_api,
-            args=(prompt, self.id, patient_seq)
-        ).start()
+        # 6. Queue the RAG call on the bounded worker pool without freezing the Odoo UI.
+        # Messages of one channel are answered in order; when the queue is full the
+        # user is asked to retry instead of piling up threads and DB connections.
+        dispatcher = self._get_rag_dispatcher()
+        if dispatcher.is_full():
+            self._post_rag_busy()
+            return result
+
+        # Submit once the user's message is committed; we pass self.id to
+        # easily reconstruct the channel in the worker thread
+        self.env.cr.postcommit.add(partial(self._submit_rag_turn, dispatcher, prompt, self.id, patient_seq))
 
         return result
 
+    def _post_rag_busy(self):
+        self._post_rag_response(
+            "The assistant is busy right now, please send your question again in a moment.",
+            is_error=True
+        )
+
+    @api.model
+    def _submit_rag_turn(self, dispatcher, prompt, channel_id, patient_seq=None):
+        """
+        Post-commit hook queuing a turn on the worker pool. The queue may have
+        filled up since the message was posted: the user is then told to retry
+        from a new cursor, the request's one being already committed.
+        """
+        if dispatcher.submit(f"channel_{channel_id}", self._async_call_rag_api, prompt, channel_id, patient_seq):
+            return
+        with self.env.registry.cursor() as cr:
+            env = api.Environment(cr, self.env.uid, self.env.context)
+            env['mail.channel'].browse(channel_id)._post_rag_busy()
+
+    @api.model
+    def _get_rag_dispatcher(self):
+        """Worker pool shared by all channels of this Odoo process"""
+        params = self.env['ir.config_parameter'].sudo()
+        return get_dispatcher(
+            'rag_chat',
+            max_workers=int(params.get_param('rag_controller.max_workers', '4') or 4),
+            max_pending=int(params.get_param('rag_controller.max_pending', '100') or 100),
+        )
+
     @api.model
     def _async_call_rag_api(self, prompt, channel_id, patient_seq=None):
         """
-        Background thread execution with retry logic for database concurrency.
-        Now includes chat history persistence and configurable context.
+        Worker pool task with retry logic for database concurrency.
+        Chat messages are kept in rag.chat.message for the record; the RAG
+        service keeps the conversation state used as LLM context.
+
+        By default the turn is submitted as a RAG chat job and answered later
+        through the /api/rag/chat/callback route, so no worker waits on the LLM.
+        With rag_controller.sync_chat set the answer is awaited here instead.
         """
         max_retries = 3
         for attempt in range(max_retries):
@@ -149,20 +212,15 @@ class MailChannel(models.Model):
                     env = api.Environment(cr, self.env.uid, self.env.context)
                     rag_client = env['rag.api.client']
                     channel = env['mail.channel'].browse(channel_id)
-                    ChatMessage = env['rag.chat.message']
                     
                     # The session_id maps cleanly to the unique channel ID for context tracking
                     session_id = f"odoo_channel_{channel_id}"
                     
-                    # --- Read configurable context limit (default 3) ---
-                    context_limit = int(
-                        env['ir.config_parameter'].sudo().get_param(
-                            'rag_controller.context_message_limit', '3'
-                        ) or '3'
-                    )
-                    
                     # --- Save the user's message ---
-                    ChatMessage.sudo().create({
+                    ChatMessage = env['rag.chat.message'].sudo()
+                    # A follow-up ("and why?") depends on the conversation: never answer it from the cache
+                    has_history = bool(ChatMessage.search([('session_id', '=', session_id)], limit=1))
+                    ChatMessage.create({
                         'channel_id': channel_id,
                         'session_id': session_id,
                         'role': 'user',
@@ -170,68 +228,41 @@ class MailChannel(models.Model):
                         'patient_seq': patient_seq or '',
                     })
                     
-                    # --- Build chat_history from last N messages ---
-                    chat_history = []
-                    if context_limit > 0:
-                        # Fetch the last N messages BEFORE the current one
-                        # (the current user message is already saved, so we skip it)
-                        previous_messages = ChatMessage.sudo().search(
-                            [('session_id', '=', session_id)],
-                            order='create_date desc',
-                            limit=context_limit + 1,  # +1 because the current msg is included
+                    # --- Same opening question about the same patient answered recently: reuse it ---
+                    cached_text = None if has_history else env['rag.response.cache']._lookup(prompt, patient_seq)
+                    if cached_text is not None:
+                        channel._get_rag_dispatcher().metrics.incr('cache_hits')
+                        # The RAG service keeps the history: record the turn there for later follow-ups
+                        rag_client.record_chat_turn(prompt, cached_text, session_id, patient_seq)
+                        channel._deliver_rag_answer(prompt, cached_text, session_id, patient_seq, cache=False)
+                    elif not env['ir.config_parameter'].sudo().get_param('rag_controller.sync_chat'):
+                        # --- Submit the turn as a job; the answer is posted from the callback ---
+                        job = env['rag.chat.job']._create_job(channel, prompt, session_id, patient_seq)
+                        env.cr.commit()
+                        job._submit()
+                    else:
+                        # --- Proxy the new turn to the FastAPI application (it keeps the history) ---
+                        started = time.monotonic()
+                        result = rag_client.chat(
+                            prompt=prompt,
+                            session_id=session_id,
+                            patient_seq=patient_seq,
                         )
-                        # Reverse to chronological order, skip the most recent (current user msg)
-                        previous_messages = list(reversed(previous_messages))
-                        # Exclude the last one (the message we just saved above)
-                        if previous_messages and previous_messages[-1].role == 'user' and previous_messages[-1].content == prompt:
-                            previous_messages = previous_messages[:-1]
+                        channel._get_rag_dispatcher().metrics.observe('rag_round_trip', time.monotonic() - started)
                         
-                        # Only keep the last context_limit messages
-                        previous_messages = previous_messages[-context_limit:]
+                        # The FastAPI backend directly returns the RAGQueryResponse dictionary
+                        response_text = None
+                        if result and 'response' in result:
+                            response_text = result.get('response', '')
+                        elif result and result.get('status') == 'success':
+                            # Fallback for nested payloads if legacy routing was involved
+                            response_text = result['data'].get('response', '')
                         
-                        chat_history = [
-                            {'role': msg.role, 'content': msg.content}
-                            for msg in previous_messages
-                        ]
-                        
-                        if chat_history:
-                            _logger.info(
-                                f"Including {len(chat_history)} previous messages as context "
-                                f"for session {session_id} (limit={context_limit})"
-                            )
-                    
-                    # --- Proxy the request to the FastAPI application ---
-                    result = rag_client.chat(
-                        prompt=prompt,
-                        session_id=session_id,
-                        patient_seq=patient_seq,
-                        chat_history=chat_history if chat_history else None,
-                    )
-                    
-                    # The FastAPI backend directly returns the RAGQueryResponse dictionary
-                    response_text = None
-                    if result and 'response' in result:
-                        response_text = result.get('response', '')
-                    elif result and result.get('status') == 'success':
-                        # Fallback for nested payloads if legacy routing was involved
-                        response_text = result['data'].get('response', '')
-                    
-                    if response_text:
-                        # --- Save the assistant's response ---
-                        ChatMessage.sudo().create({
-                            'channel_id': channel_id,
-                            'session_id': session_id,
-                            'role': 'assistant',
-                            'content': response_text,
-                            'patient_seq': patient_seq or '',
-                        })
-                        
-                        clean_text = channel._clean_markdown(response_text)
-                        formatted_response = channel._format_llm_text_to_html(clean_text)
-                        channel._post_rag_response(formatted_response)
-                    else:
-                        error_msg = result.get('message', 'Unknown error connecting to RAG system.') if result else 'No response from RAG system.'
-                        channel._post_rag_response(f"API Error: {error_msg}", is_error=True)
+                        if response_text:
+                            channel._deliver_rag_answer(prompt, response_text, session_id, patient_seq)
+                        else:
+                            error_msg = result.get('message', 'Unknown error connecting to RAG system.') if result else 'No response from RAG system.'
+                            channel._post_rag_response(f"API Error: {error_msg}", is_error=True)
                     
                     env.cr.commit()  # Ensure the background thread saves the message_post to the DB!
                     return # Exit successfully if commit succeeds
@@ -11,13 +11,19 @@ class WkAppointment(models.Model):
             if 'is_rag_synced' not in vals:
                 vals['is_rag_synced'] = False
         records = super(WkAppointment, self).create(vals_list)
+        self.env['rag.index.outbox']._enqueue(self._name, records.ids)
         return records
 
     def write(self, vals):
         # If any field changes (except the sync flag itself), reset the sync flag
-        if 'is_rag_synced' not in vals:
+        # and push the records to the RAG ingestion outbox
+        content_changed = 'is_rag_synced' not in vals
+        if content_changed:
             vals['is_rag_synced'] = False
-        return super(WkAppointment, self).write(vals)
+        res = super(WkAppointment, self).write(vals)
+        if content_changed:
+            self.env['rag.index.outbox']._enqueue(self._name, self.ids)
+        return res
 
 
 class PrescriptionOrderKnk(models.Model):
@@ -31,10 +37,16 @@ class PrescriptionOrderKnk(models.Model):
             if 'is_rag_synced' not in vals:
                 vals['is_rag_synced'] = False
         records = super(PrescriptionOrderKnk, self).create(vals_list)
+        self.env['rag.index.outbox']._enqueue(self._name, records.ids)
         return records
 
     def write(self, vals):
         # If any field changes (except the sync flag itself), reset the sync flag
-        if 'is_rag_synced' not in vals:
+        # and push the records to the RAG ingestion outbox
+        content_changed = 'is_rag_synced' not in vals
+        if content_changed:
             vals['is_rag_synced'] = False
-        return super(PrescriptionOrderKnk, self).write(vals)
+        res = super(PrescriptionOrderKnk, self).write(vals)
+        if content_changed:
+            self.env['rag.index.outbox']._enqueue(self._name, self.ids)
+        return res
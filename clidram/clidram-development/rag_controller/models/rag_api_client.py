@@ -1,11 +1,46 @@
 import requests
 import json
 import logging
+import threading
+import time
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from odoo import models, api
 from odoo.exceptions import UserError
 
 logger = logging.getLogger(__name__)
 
+# One pooled session per Odoo worker process, shared by all threads
+_session = None
+_session_lock = threading.Lock()
+
+
+def _get_session():
+    """
+    Return the shared requests.Session, retrying connection failures with
+    backoff, and gateway errors for GET only. Read timeouts and POSTs that
+    reached the server are never retried: it may still be processing them, and
+    replaying a POST would duplicate LLM calls, history turns and ingests.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                retry = Retry(
+                    total=3,
+                    read=0,
+                    backoff_factor=0.5,
+                    status_forcelist=(502, 503, 504),
+                    allowed_methods=frozenset(['GET']),
+                    raise_on_status=False,
+                )
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+                session = requests.Session()
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session = session
+    return _session
+
 class RagApiClient(models.AbstractModel):
     _name = 'rag.api.client'
     _description = 'RAG API Client'
@@ -33,12 +68,13 @@ class RagApiClient(models.AbstractModel):
             headers['Authorization'] = f"Bearer {api_key}"
             
         try:
+            session = _get_session()
             if method == 'POST':
-                response = requests.post(full_url, json=payload, headers=headers, timeout=30)
+                response = session.post(full_url, json=payload, headers=headers, timeout=30)
             elif method == 'GET':
-                response = requests.get(full_url, params=payload, headers=headers, timeout=30)
+                response = session.get(full_url, params=payload, headers=headers, timeout=30)
             elif method == 'PUT':
-                response = requests.put(full_url, json=payload, headers=headers, timeout=30)
+                response = session.put(full_url, json=payload, headers=headers, timeout=30)
             else:
                 raise ValueError(f"Unsupported HTTP method: {method}")
                 
@@ -76,8 +112,11 @@ class RagApiClient(models.AbstractModel):
         return self._make_request('/api/v1/rag/query-prescriptions', payload=payload)
         
     @api.model
-    def trigger_indexing(self, models_list=None, incremental=False, limit=None):
-        """Trigger ETL indexing"""
+    def trigger_indexing(self, models_list=None, incremental=False, limit=None, wait=False, timeout=600):
+        """
+        Queue an ETL indexing job, run by the RAG ETL worker, and return it.
+        With wait, poll the job until it finishes or timeout seconds pass.
+        """
         if models_list is None:
             models_list = ["wk.appointment", "prescription.order.knk", "res.partner", "medical.disease"]
             
@@ -88,15 +127,34 @@ class RagApiClient(models.AbstractModel):
         if limit:
             payload["limit"] = limit
             
-        return self._make_request('/api/v1/etl/index-medical', payload=payload)
+        job = self._make_request('/api/v1/etl/index-medical', payload=payload)
+        deadline = time.monotonic() + timeout
+        while wait and job.get('status') not in ('completed', 'failed', 'cancelled') and time.monotonic() < deadline:
+            time.sleep(2)
+            job = self.get_indexing_job(job['id'])
+        return job
+
+    @api.model
+    def get_indexing_job(self, job_id):
+        """Progress of an ETL indexing job: records/chunks indexed, throughput and ETA"""
+        return self._make_request(f'/api/v1/etl/jobs/{int(job_id)}', method='GET')
         
+    @api.model
+    def ingest_records(self, odoo_model, res_ids):
+        """Push changed record IDs for targeted (re)indexing"""
+        payload = {
+            "odoo_model": odoo_model,
+            "res_ids": res_ids
+        }
+        return self._make_request('/api/v1/etl/ingest', payload=payload)
+
     @api.model
     def get_index_status(self):
         """Get ETL index status"""
         return self._make_request('/api/v1/etl/index-status', method='GET')
     @api.model
-    def chat(self, prompt, session_id, patient_seq=None, reset=False, chat_history=None):
-        """Conversational chat endpoint with optional chat history context"""
+    def chat(self, prompt, session_id, patient_seq=None, reset=False):
+        """Conversational chat endpoint; the RAG service keeps the history of session_id"""
         payload = {
             "prompt": prompt,
             "session_id": session_id,
@@ -104,7 +162,33 @@ class RagApiClient(models.AbstractModel):
         }
         if patient_seq:
             payload["patient_seq"] = patient_seq
-        if chat_history:
-            payload["chat_history"] = chat_history
-            
+
         return self._make_request('/api/v1/rag/chat', payload=payload)
+
+    @api.model
+    def record_chat_turn(self, prompt, response, session_id, patient_seq=None):
+        """Add a turn answered without the RAG service (response cache) to the history of session_id"""
+        payload = {
+            "prompt": prompt,
+            "response": response,
+            "session_id": session_id,
+        }
+        if patient_seq:
+            payload["patient_seq"] = patient_seq
+
+        return self._make_request('/api/v1/rag/chat/turns', payload=payload)
+
+    @api.model
+    def submit_chat_job(self, prompt, session_id, callback_url, callback_token, job_ref, patient_seq=None):
+        """Asynchronous chat: returns the job id at once, the answer is POSTed to callback_url"""
+        payload = {
+            "prompt": prompt,
+            "session_id": session_id,
+            "callback_url": callback_url,
+            "callback_token": callback_token,
+            "job_ref": job_ref,
+        }
+        if patient_seq:
+            payload["patient_seq"] = patient_seq
+
+        return self._make_request('/api/v1/rag/chat/jobs', payload=payload)
@@ -0,0 +1,91 @@
+import logging
+import secrets
+from datetime import timedelta
+from odoo import models, fields, api
+
+logger = logging.getLogger(__name__)
+
+
+class RagChatJob(models.Model):
+    _name = 'rag.chat.job'
+    _description = 'RAG Chat Job'
+    _order = 'id desc'
+
+    channel_id = fields.Many2one('mail.channel', string='Channel', ondelete='cascade', index=True)
+    session_id = fields.Char(string='Session ID', required=True)
+    prompt = fields.Text(string='Prompt', required=True)
+    patient_seq = fields.Char(string='Patient Sequence')
+    token = fields.Char(string='Callback Token', required=True, copy=False, groups='base.group_system')
+    remote_job_id = fields.Char(string='RAG Job ID', index=True)
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string='State', default='pending', required=True, index=True)
+    error = fields.Text(string='Error')
+
+    @api.model
+    def _get_callback_url(self):
+        params = self.env['ir.config_parameter'].sudo()
+        base_url = params.get_param('rag_controller.callback_base_url') or params.get_param('web.base.url')
+        return f"{base_url.rstrip('/')}/api/rag/chat/callback"
+
+    @api.model
+    def _create_job(self, channel, prompt, session_id, patient_seq=None):
+        """Record a chat turn to submit; commit it before _submit so the callback can find it"""
+        return self.sudo().create({
+            'channel_id': channel.id,
+            'session_id': session_id,
+            'prompt': prompt,
+            'patient_seq': patient_seq or '',
+            'token': secrets.token_urlsafe(32),
+        })
+
+    def _submit(self):
+        """Hand the chat turn to the RAG service; the answer arrives later on the callback route"""
+        self.ensure_one()
+        try:
+            result = self.env['rag.api.client'].submit_chat_job(
+                prompt=self.prompt,
+                session_id=self.session_id,
+                patient_seq=self.patient_seq or None,
+                callback_url=self._get_callback_url(),
+                callback_token=self.token,
+                job_ref=str(self.id),
+            )
+        except Exception as e:
+            logger.error(f"Could not submit RAG chat job {self.id}: {e}")
+            self.write({'state': 'failed', 'error': str(e)})
+            self.channel_id._post_rag_response(f"API Error: {e}", is_error=True)
+            return
+        self.remote_job_id = result.get('job_id')
+
+    def _complete(self, status, response=None, message=None):
+        """Post the callback's answer (or error) into the job's channel"""
+        self.ensure_one()
+        channel = self.channel_id
+        elapsed = (fields.Datetime.now() - self.create_date).total_seconds()
+        channel._get_rag_dispatcher().metrics.observe('rag_round_trip', elapsed)
+
+        if status == 'success' and response:
+            self.write({'state': 'done'})
+            channel._deliver_rag_answer(self.prompt, response, self.session_id, self.patient_seq or None)
+        else:
+            self.write({'state': 'failed', 'error': message or 'Empty response'})
+            channel._post_rag_response(f"API Error: {message or 'No response from RAG system.'}", is_error=True)
+
+    @api.model
+    def _cron_expire(self):
+        """Fail jobs whose callback never arrived, telling the channel, and drop old finished jobs"""
+        timeout = int(self.env['ir.config_parameter'].sudo().get_param('rag_controller.chat_job_timeout', '300') or 300)
+        now = fields.Datetime.now()
+        stale = self.search([('state', '=', 'pending'), ('create_date', '<', now - timedelta(seconds=timeout))])
+        for job in stale:
+            job.write({'state': 'failed', 'error': 'Timed out waiting for the RAG service'})
+            if job.channel_id:
+                job.channel_id._post_rag_response(
+                    "The assistant did not answer in time, please send your question again.", is_error=True
+                )
+        if stale:
+            logger.warning(f"{len(stale)} RAG chat jobs timed out")
+        self.search([('state', '!=', 'pending'), ('create_date', '<', now - timedelta(days=7))]).unlink()
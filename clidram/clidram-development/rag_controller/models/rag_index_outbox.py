@@ -0,0 +1,84 @@
+import logging
+from odoo import models, fields, api
+
+logger = logging.getLogger(__name__)
+
+
+class RagIndexOutbox(models.Model):
+    _name = 'rag.index.outbox'
+    _description = 'RAG Index Outbox'
+    _order = 'id asc'
+
+    odoo_model = fields.Char(string='Model', required=True, index=True)
+    res_id = fields.Integer(string='Record ID', required=True)
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('failed', 'Failed'),
+    ], string='State', default='pending', required=True, index=True)
+    attempts = fields.Integer(string='Attempts', default=0)
+    last_error = fields.Text(string='Last Error')
+
+    _MAX_ATTEMPTS = 5
+    _BATCH_SIZE = 500
+
+    def init(self):
+        # One pending row per record, so concurrent transactions cannot queue it twice
+        self.env.cr.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS rag_index_outbox_pending_uniq
+            ON rag_index_outbox (odoo_model, res_id) WHERE state = 'pending'
+        """)
+
+    @api.model
+    def _enqueue(self, odoo_model, res_ids):
+        """
+        Record changed records so the dispatcher pushes them to the RAG ingestion
+        endpoint; records already pending are skipped by the insert itself.
+        The dispatch cron is triggered once per transaction.
+        """
+        res_ids = sorted(set(res_ids))
+        if not res_ids:
+            return
+        self.env.cr.execute("""
+            INSERT INTO rag_index_outbox
+                (odoo_model, res_id, state, attempts, create_uid, create_date, write_uid, write_date)
+            SELECT %s, res_id, 'pending', 0, %s, now() AT TIME ZONE 'UTC', %s, now() AT TIME ZONE 'UTC'
+            FROM unnest(%s::int[]) AS res_id
+            ON CONFLICT (odoo_model, res_id) WHERE state = 'pending' DO NOTHING
+        """, [odoo_model, self.env.uid, self.env.uid, res_ids])
+        if not self.env.cr.precommit.data.get('rag_index_outbox.trigger'):
+            self.env.cr.precommit.data['rag_index_outbox.trigger'] = True
+            self.env.cr.precommit.add(self.sudo()._trigger_dispatch)
+
+    @api.model
+    def _trigger_dispatch(self):
+        cron = self.env.ref('rag_controller.ir_cron_rag_index_outbox', raise_if_not_found=False)
+        if cron:
+            cron._trigger()
+
+    @api.model
+    def _cron_dispatch(self):
+        """Batch-POST pending changes per model to /api/v1/etl/ingest"""
+        pending = self.search([('state', '=', 'pending')], limit=self._BATCH_SIZE)
+        if not pending:
+            return
+
+        client = self.env['rag.api.client']
+        for odoo_model in set(pending.mapped('odoo_model')):
+            rows = pending.filtered(lambda r: r.odoo_model == odoo_model)
+            try:
+                client.ingest_records(odoo_model, sorted(set(rows.mapped('res_id'))))
+            except Exception as e:
+                logger.error(f"RAG outbox dispatch failed for {odoo_model}: {e}")
+                for row in rows:
+                    attempts = row.attempts + 1
+                    row.write({
+                        'attempts': attempts,
+                        'last_error': str(e),
+                        'state': 'failed' if attempts >= self._MAX_ATTEMPTS else 'pending',
+                    })
+                continue
+            rows.unlink()
+            logger.info(f"Pushed {len(rows)} {odoo_model} changes to RAG ingestion")
+
+        if len(pending) == self._BATCH_SIZE:
+            self.env.ref('rag_controller.ir_cron_rag_index_outbox')._trigger()
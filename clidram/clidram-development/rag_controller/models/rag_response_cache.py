@@ -0,0 +1,122 @@
+import hashlib
+import logging
+import re
+import threading
+import time
+from datetime import timedelta
+from odoo import models, fields, api
+
+logger = logging.getLogger(__name__)
+
+# Index version is fetched from /etl/index-status at most once per _VERSION_TTL seconds per worker
+_VERSION_TTL = 60
+_version_lock = threading.Lock()
+_index_version = {'value': None, 'fetched_at': 0.0}
+
+
+class RagResponseCache(models.Model):
+    _name = 'rag.response.cache'
+    _description = 'RAG Response Cache'
+    _order = 'id desc'
+
+    key = fields.Char(string='Key', required=True, index=True)
+    prompt = fields.Text(string='Normalized Prompt')
+    patient_seq = fields.Char(string='Patient Sequence')
+    index_version = fields.Char(string='Index Version')
+    response = fields.Text(string='Response', required=True)
+    hit_count = fields.Integer(string='Hits', default=0)
+    expires_at = fields.Datetime(string='Expires At', required=True, index=True)
+
+    _sql_constraints = [
+        ('key_unique', 'unique(key)', 'A cached response already exists for this key.'),
+    ]
+
+    @api.model
+    def _normalize_prompt(self, prompt):
+        """Case, whitespace and trailing punctuation do not change the question"""
+        return re.sub(r'\s+', ' ', prompt or '').strip().rstrip('?!. ').lower()
+
+    @api.model
+    def _get_ttl(self):
+        return int(self.env['ir.config_parameter'].sudo().get_param('rag_controller.response_cache_ttl', '300') or 0)
+
+    @api.model
+    def _get_index_version(self):
+        """Current index version from the RAG service (None if unavailable: caching is skipped)"""
+        with _version_lock:
+            if time.monotonic() - _index_version['fetched_at'] < _VERSION_TTL:
+                return _index_version['value']
+        try:
+            status = self.env['rag.api.client'].get_index_status() or {}
+            value = status.get('index_version') or None
+        except Exception as e:
+            logger.warning(f"Could not fetch RAG index version: {e}")
+            value = None
+        with _version_lock:
+            _index_version.update(value=value, fetched_at=time.monotonic())
+        return value
+
+    @api.model
+    def _make_key(self, prompt, patient_seq, index_version):
+        raw = '\x1f'.join([self._normalize_prompt(prompt), patient_seq or '', index_version])
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    @api.model
+    def _lookup(self, prompt, patient_seq=None):
+        """Return the cached answer for this question, or None"""
+        if self._get_ttl() <= 0:
+            return None
+        index_version = self._get_index_version()
+        if not index_version:
+            return None
+        entry = self.sudo().search([
+            ('key', '=', self._make_key(prompt, patient_seq, index_version)),
+            ('expires_at', '>', fields.Datetime.now()),
+        ], limit=1)
+        if not entry:
+            return None
+        self.env.cr.execute("UPDATE rag_response_cache SET hit_count = hit_count + 1 WHERE id = %s", [entry.id])
+        return entry.response
+
+    @api.model
+    def _store(self, prompt, patient_seq, response):
+        """Cache an answer for the response cache TTL"""
+        ttl = self._get_ttl()
+        index_version = self._get_index_version()
+        if ttl <= 0 or not index_version or not response:
+            return
+        key = self._make_key(prompt, patient_seq, index_version)
+        vals = {
+            'prompt': self._normalize_prompt(prompt),
+            'patient_seq': patient_seq or '',
+            'index_version': index_version,
+            'response': response,
+            'expires_at': fields.Datetime.now() + timedelta(seconds=ttl),
+        }
+        entry = self.sudo().search([('key', '=', key)], limit=1)
+        if entry:
+            entry.write(vals)
+            return
+        try:
+            with self.env.cr.savepoint():
+                self.sudo().create(dict(vals, key=key))
+        except Exception:
+            # Another worker cached the same question concurrently
+            pass
+
+    @api.model
+    def _cron_evict(self):
+        """Delete expired entries and keep at most rag_controller.response_cache_max_entries"""
+        self.env.cr.execute("DELETE FROM rag_response_cache WHERE expires_at <= %s", [fields.Datetime.now()])
+        expired = self.env.cr.rowcount
+        max_entries = int(self.env['ir.config_parameter'].sudo().get_param(
+            'rag_controller.response_cache_max_entries', '1000'
+        ) or 0)
+        self.env.cr.execute("""
+            DELETE FROM rag_response_cache WHERE id IN (
+                SELECT id FROM rag_response_cache ORDER BY expires_at DESC OFFSET %s
+            )
+        """, [max(max_entries, 0)])
+        if expired or self.env.cr.rowcount:
+            logger.info(f"RAG response cache: evicted {expired} expired and {self.env.cr.rowcount} excess entries")
+        self.invalidate_model()
@@ -22,10 +22,53 @@ class ResConfigSettings(models.TransientModel):
         help='Select the Partner profile that will act as the RAG Assistant in Discuss.'
     )
 
-    context_message_limit = fields.Integer(
-        string='Chat History Context Limit',
-        config_parameter='rag_controller.context_message_limit',
-        default=3,
-        help='Number of previous chat messages to include as context when sending a request '
-             'to the RAG system. If set to 0, no previous context is sent. Default is 3.'
+    response_cache_ttl = fields.Integer(
+        string='Response Cache TTL (seconds)',
+        config_parameter='rag_controller.response_cache_ttl',
+        default=300,
+        help='How long an answer is reused for the same question about the same patient '
+             '(while the RAG index is unchanged). Set to 0 to disable the cache.'
+    )
+
+    response_cache_max_entries = fields.Integer(
+        string='Response Cache Size',
+        config_parameter='rag_controller.response_cache_max_entries',
+        default=1000,
+        help='Maximum number of cached answers kept; the oldest are evicted first.'
+    )
+
+    rag_max_workers = fields.Integer(
+        string='RAG Chat Workers',
+        config_parameter='rag_controller.max_workers',
+        default=4,
+        help='Maximum number of RAG chat requests processed in parallel by each Odoo worker. '
+             'Messages of one channel are always answered in order. Requires a restart.'
+    )
+
+    rag_max_pending = fields.Integer(
+        string='RAG Chat Queue Size',
+        config_parameter='rag_controller.max_pending',
+        default=100,
+        help='Maximum number of RAG chat requests waiting for a worker. When the queue is full '
+             'users are asked to retry. Requires a restart.'
+    )
+
+    rag_sync_chat = fields.Boolean(
+        string='Synchronous RAG Chat',
+        config_parameter='rag_controller.sync_chat',
+        help='Wait for each RAG answer on an Odoo worker instead of submitting a job answered '
+             'through the callback route. Use when the RAG service cannot reach Odoo.'
+    )
+
+    rag_callback_base_url = fields.Char(
+        string='RAG Callback Base URL',
+        config_parameter='rag_controller.callback_base_url',
+        help='Odoo URL the RAG service posts chat answers to. Defaults to web.base.url.'
+    )
+
+    chat_job_timeout = fields.Integer(
+        string='RAG Chat Job Timeout (seconds)',
+        config_parameter='rag_controller.chat_job_timeout',
+        default=300,
+        help='Chat jobs without an answer after this long are reported as failed in the channel.'
     )
@@ -0,0 +1,61 @@
+from odoo.tests import TransactionCase, tagged
+
+from odoo.addons.rag_controller.controllers.main import RagIntegrationController
+
+
+@tagged('post_install', '-at_install')
+class TestPrescriptionExport(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        Partner = cls.env['res.partner']
+        cls.physician = Partner.create({'name': 'Dr. Test', 'partner_type': 'physician', 'gender': 'female'})
+        cls.disease = cls.env['medical.disease'].create({'name': 'Test Disease'})
+        cls.medicines = cls.env['product.product'].create([
+            {'name': 'Test Medicine A', 'is_medication_knk': True},
+            {'name': 'Test Medicine B', 'is_medication_knk': True},
+        ])
+        cls.complaint = cls.env['complaint.list'].create({'name': 'Test Complaint'})
+        cls.period = cls.env['period.record'].create({'name': '3 days'})
+        cls.location = cls.env['location.location'].create({'name': 'Chest'})
+        cls.test_item = cls.env['investigation.list'].create({'name': 'Test Blood Count'})
+        cls.prescriptions = cls.env['prescription.order.knk']
+        for index in range(12):
+            patient = Partner.create({'name': f'Patient {index}', 'partner_type': 'patient', 'gender': 'male'})
+            cls.prescriptions |= cls.prescriptions.create({
+                'patient_id': patient.id,
+                'physician_id': cls.physician.id,
+                'diagnosis_ids': [(0, 0, {'disease_id': cls.disease.id})],
+                'order_line_new_ids': [
+                    (0, 0, {'product_id': medicine.id, 'quantity': 2, 'days': 5, 'short_comment': 'After meals'})
+                    for medicine in cls.medicines
+                ],
+                'complaint_id': [(0, 0, {'complaint_list_id': cls.complaint.id, 'period': cls.period.id,
+                                         'location_id': cls.location.id})],
+                'investigation_ids': [(0, 0, {'investigation_list_id': cls.test_item.id})],
+            })
+
+    def _count_queries(self, prescriptions):
+        self.env.flush_all()
+        self.env.invalidate_all()
+        count = self.cr.sql_log_count
+        RagIntegrationController()._prepare_prescriptions_data(prescriptions)
+        self.env.flush_all()
+        return self.cr.sql_log_count - count
+
+    def test_prepare_prescriptions_query_count(self):
+        """Serializing a page costs the same number of queries for 2 or 12 prescriptions"""
+        controller = RagIntegrationController()
+        expected = self._count_queries(self.prescriptions[:2])
+        self.env.invalidate_all()
+        with self.assertQueryCount(expected):
+            data = controller._prepare_prescriptions_data(self.prescriptions)
+        self.assertEqual(len(data), 12)
+        self.assertEqual({row['physician_res_id'] for row in data}, {self.physician.id})
+        for row in data[:2]:
+            self.assertEqual(row['diagnoses'][0]['name'], 'Test Disease')
+            self.assertEqual([m['name'] for m in row['medications']], ['Test Medicine A', 'Test Medicine B'])
+            self.assertEqual(row['medications'][0]['instruction'], 'After meals')
+            self.assertEqual(row['complaints'], [{'name': 'Test Complaint', 'period': '3 days', 'location': 'Chest'}])
+            self.assertEqual(row['investigations'], [{'name': 'Test Blood Count'}])
@@ -18,6 +18,10 @@ Showing WhatsApp Chat History, Configure WhatsApp Templates in Particular User v
         'security/whatsapp_security.xml',
         'security/ir.model.access.csv',
         'data/cron.xml',
+        'data/whatsapp_webhook_event_cron.xml',
+        'data/res_partner_phone_e164_cron.xml',
+        'data/whatsapp_media_download_cron.xml',
+        'data/whatsapp_bulk_send_cron.xml',
         'data/wa_template.xml',
         'wizard/wa_compose_message_view.xml',
         'views/res_config_settings_views.xml',
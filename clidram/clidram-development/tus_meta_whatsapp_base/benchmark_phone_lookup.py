@@ -0,0 +1,68 @@
+"""
+Partner Phone Lookup Benchmark
+Measures webhook partner resolution on a large res_partner table: the old
+OR domain on raw phone/mobile versus one equality search on the indexed
+phone_e164 column.
+
+Synthetic partners are inserted with SQL inside a savepoint that is rolled
+back at the end, so the database is left untouched.
+
+Run from an Odoo shell (odoo-bin shell -d <db>):
+    from odoo.addons.tus_meta_whatsapp_base.benchmark_phone_lookup import benchmark
+    benchmark(env, partners=500000, lookups=200)
+"""
+import random
+import time
+
+# Synthetic numbers: Saudi mobiles, 9665XXXXXXXX
+PREFIX = 966500000000
+
+
+def _insert_partners(cr, partners, template_id):
+    """Insert partners with SQL, copying NOT NULL columns other addons add from a template partner"""
+    cr.execute("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_name = 'res_partner' AND is_nullable = 'NO' AND column_default IS NULL
+    """)
+    copied = [row[0] for row in cr.fetchall() if row[0] not in ('name', 'mobile', 'phone_e164', 'active')]
+    columns = ''.join(', "%s"' % column for column in copied)
+    cr.execute("""
+        INSERT INTO res_partner (name, mobile, phone_e164, active%s)
+        SELECT 'Benchmark ' || n, (%%s + n)::text, '+' || (%%s + n)::text, true%s
+        FROM generate_series(1, %%s) AS n, res_partner template
+        WHERE template.id = %%s
+    """ % (columns, ''.join(', template."%s"' % column for column in copied)),
+        [PREFIX, PREFIX, partners, template_id])
+    cr.execute("ANALYZE res_partner")
+
+
+def benchmark(env, partners=500000, lookups=200):
+    """Print and return milliseconds per lookup for each strategy"""
+    Partner = env['res.partner'].sudo().with_context(active_test=False)
+    numbers = [str(PREFIX + random.randint(1, partners)) for _ in range(lookups)]
+
+    def timed(lookup):
+        start = time.perf_counter()
+        for number in numbers:
+            found = lookup(number)
+            assert found, "benchmark partner %s not found" % number
+        return (time.perf_counter() - start) / lookups * 1000
+
+    env.cr.execute("SAVEPOINT phone_lookup_benchmark")
+    try:
+        _insert_partners(env.cr, partners, env.user.partner_id.id)
+        env.invalidate_all()
+        results = {
+            'phone/mobile OR domain': timed(
+                lambda number: Partner.search(['|', ('phone', '=', number), ('mobile', '=', number)])),
+            'indexed phone_e164': timed(
+                lambda number: Partner.search([('phone_e164', '=', '+' + number)])),
+        }
+    finally:
+        env.cr.execute("ROLLBACK TO SAVEPOINT phone_lookup_benchmark")
+        env.invalidate_all()
+
+    print("%s partners, %s lookups" % (partners, lookups))
+    for name, ms in results.items():
+        print("%-24s %8.2f ms/lookup" % (name, ms))
+    return results
@@ -9,6 +9,7 @@ from odoo.exceptions import UserError, ValidationError
 from phonenumbers.phonenumberutil import (
     region_code_for_country_code,
 )
+from ..models.res_partner import phone_to_e164
 
 class WebHook(http.Controller):
 
@@ -22,9 +23,9 @@ class WebHook(http.Controller):
             partner_to.append(provider.user_id.partner_id.id)
         channel = False
 
-        provider_channel_id = partner.channel_provider_line_ids.filtered(lambda s: s.provider_id == provider)
+        provider_channel_id = provider._get_partner_channel_id(partner.id)
         if provider_channel_id:
-            channel = provider_channel_id.channel_id
+            channel = request.env['mail.channel'].sudo().browse(provider_channel_id).exists()
             if request.env.user.partner_id.id not in channel.channel_partner_ids.ids and request.env.user.has_group(
                     'base.group_user'):
                 channel.sudo().write({'channel_partner_ids': [(4, request.env.user.partner_id.id)]})
@@ -76,8 +77,9 @@ class WebHook(http.Controller):
                     number = chat_number[0].strip('+').replace(" ", "")
                     if chat_number[1] == 'c.us':
                         wa_dict.update({'chat': True})
-                        partners = request.env['res.partner'].sudo().search(
-                            ['|', ('phone', '=', number), ('mobile', '=', number)])
+                        e164 = phone_to_e164(number)
+                        partners = request.env['res.partner'].sudo()._find_by_wa_numbers([e164] if e164 else []).get(
+                            e164, request.env['res.partner'].sudo())
                         wa_dict.update({'partners': partners})
                         if not partners:
                             pn = phonenumbers.parse('+' + number)
@@ -1,16 +1,8 @@
 from odoo.http import request
 from odoo import http, _, tools
-import requests
 import json
-import base64
-import phonenumbers
-import datetime
-from odoo.exceptions import UserError, ValidationError
-from phonenumbers.phonenumberutil import (
-    region_code_for_country_code,
-)
+from odoo.exceptions import ValidationError
 import hashlib
-import base64
 
 
 class WebHook2(http.Controller):
@@ -32,9 +24,9 @@ class WebHook2(http.Controller):
             partner_to.append(provider.user_id.partner_id.id)
         channel = False
 
-        provider_channel_id = partner.channel_provider_line_ids.filtered(lambda s: s.provider_id == provider)
+        provider_channel_id = provider._get_partner_channel_id(partner.id) if provider else False
         if provider_channel_id:
-            channel = provider_channel_id.channel_id
+            channel = request.env['mail.channel'].sudo().browse(provider_channel_id).exists()
             if request.env.user.partner_id.id not in channel.channel_partner_ids.ids and request.env.user.has_group(
                     'base.group_user'):
                 channel.sudo().write({'channel_partner_ids': [(4, request.env.user.partner_id.id)]})
@@ -58,280 +50,23 @@ class WebHook2(http.Controller):
         return channel
 
 
-    def get_url(self, provider, media_id, phone_number_id):
-        if provider.graph_api_authenticated:
-            url = provider.graph_api_url + media_id + "?phone_number_id=" + phone_number_id + "&access_token=" + provider.graph_api_token
-            headers = {'Content-type': 'application/json'}
-            payload = {}
-            try:
-                answer = requests.request("GET", url, headers=headers, data=payload)
-            except requests.exceptions.ConnectionError:
-                raise UserError(
-                    ("please check your internet connection."))
-            return answer
-        else:
-            raise UserError(
-                ("please authenticated your whatsapp."))
-
-    def get_media_data(self, url, provider):
-        payload = {}
-        headers = {
-            'Authorization': 'Bearer ' + provider.graph_api_token
-        }
-        response = requests.request("GET", url, headers=headers, data=payload)
-        decoded = base64.b64encode(response.content)
-        return decoded
-
-    def _get_received_attachment(self, message_obj, provider, mail_message, history):
-        attachment_value = {}
-        media_id = ''
-        if message_obj.get('type') == 'image':
-            media_id = message_obj.get('image').get('id')
-            attachment_value.update({'name': media_id,
-                                     'type': 'binary',
-                                     'mimetype': message_obj.get('image').get('mime_type') if message_obj.get(
-                                         'image') and message_obj.get('image').get('mime_type') else 'image/jpeg'})
-            mail_message.update({'body': message_obj.get('image').get(
-                'caption') if 'image' in message_obj and 'caption' in message_obj.get(
-                'image') else ''})
-            history.update({'message': message_obj.get('image').get(
-                'caption') if 'image' in message_obj and 'caption' in message_obj.get(
-                'image') else ''})
-        elif message_obj.get('type') == 'video':
-            media_id = message_obj.get('video').get('id')
-            attachment_value.update({'name': 'whatsapp_video',
-                                     'type': 'binary',
-                                     'mimetype': message_obj.get('video').get('mime_type') if message_obj.get(
-                                         'video') and message_obj.get('video').get('mime_type') else 'video/mp4'})
-            mail_message.update({'body': message_obj.get('video').get(
-                'caption') if 'video' in message_obj and 'caption' in message_obj.get(
-                'video') else ''})
-            history.update({'message': message_obj.get('video').get(
-                'caption') if 'video' in message_obj and 'caption' in message_obj.get(
-                'video') else ''})
-        elif message_obj.get('type') == 'document':
-            media_id = message_obj.get('document').get('id')
-            attachment_value.update({'name': message_obj.get('document').get('filename'),
-                                     'type': 'binary',
-                                     'mimetype': message_obj.get('document').get('mime_type') if message_obj.get(
-                                         'document') and message_obj.get('document').get(
-                                         'mime_type') else 'application/pdf'})
-            mail_message.update({'body': message_obj.get('document').get(
-                'caption') if 'document' in message_obj and 'caption' in message_obj.get(
-                'document') else ''})
-            history.update({'message': message_obj.get('document').get(
-                'caption') if 'document' in message_obj and 'caption' in message_obj.get(
-                'document') else ''})
-        elif message_obj.get('type') == 'audio':
-            media_id = message_obj.get('audio').get('id')
-            attachment_value.update({'name': 'whatsapp_audio',
-                                     'type': 'binary',
-                                     'mimetype': message_obj.get('audio').get('mime_type') if message_obj.get(
-                                         'audio') and message_obj.get('audio').get('mime_type') else 'audio/mpeg'})
-            mail_message.update({'body': message_obj.get('audio').get(
-                'caption') if 'audio' in message_obj and 'caption' in message_obj.get(
-                'audio') else ''})
-            history.update({'message': message_obj.get('audio').get(
-                'caption') if 'audio' in message_obj and 'caption' in message_obj.get(
-                'audio') else ''})
-        elif message_obj.get('type') == 'sticker':
-            media_id = message_obj.get('sticker').get('id')
-            attachment_value.update({'name': 'whatsapp_sticker',
-                                     'type': 'binary',
-                                     'mimetype': message_obj.get('sticker').get('mime_type') if message_obj.get(
-                                         'sticker') and message_obj.get('sticker').get('mime_type') else 'image/webp'})
-            mail_message.update({'body': message_obj.get('sticker').get(
-                'caption') if 'sticker' in message_obj and 'caption' in message_obj.get(
-                'sticker') else ''})
-            history.update({'message': message_obj.get('sticker').get(
-                'caption') if 'sticker' in message_obj and 'caption' in message_obj.get(
-                'sticker') else ''})
-        if media_id:
-            geturl = self.get_url(provider, media_id, provider.graph_api_instance_id)
-            dict = json.loads(geturl.text)
-            decoded = self.get_media_data(dict.get('url'), provider)
-            attachment_value.update({'datas': decoded})
-            attachment = request.env['ir.attachment'].sudo().create(attachment_value)
-
-            return attachment, mail_message, history
-
     @http.route(_meta_fb_url, type='json', methods=['GET', 'POST'], auth='public', csrf=False)
     def meta_webhook(self, **kw):
+        """
+        Acknowledge Meta right away: the raw body is queued and applied in
+        batches by the whatsapp.webhook.event cron, which Meta's retries of
+        the same message ids cannot duplicate.
+        """
         wa_dict = {}
         is_tus_discuss_installed = request.env['ir.module.module'].sudo().search(
             [('state', '=', 'installed'), ('name', '=', 'tus_meta_wa_discuss')])
         if not is_tus_discuss_installed:
             return wa_dict
-        data = json.loads(request.httprequest.data.decode('utf-8'))
+        payload = request.httprequest.data.decode('utf-8')
+        data = json.loads(payload)
         wa_dict.update({'messages': data.get('messages')})
-        provider = request.env['provider'].sudo()
-        data_value_obj = data and data.get('entry') and data.get('entry')[0].get('changes') and \
-                         data.get('entry')[0].get('changes')[0].get('value', False)
-
-        if data_value_obj:
-            if data_value_obj.get('metadata') and \
-                    data_value_obj.get('metadata').get(
-                        'phone_number_id'):
-                phone_number_id = data_value_obj.get('metadata').get(
-                    'phone_number_id')
-                provider |= provider.search(
-                    [('graph_api_authenticated', '=', True),
-                     ('graph_api_instance_id', '=', phone_number_id)],
-                    limit=1)
-                wa_dict.update({'provider': provider})
-                if not provider:
-                    return wa_dict
-
-            if data_value_obj.get('statuses'):
-                channel = request.env['mail.channel']
-                for acknowledgment in data_value_obj.get('statuses'):
-                    wp_msgs = request.env['whatsapp.history'].sudo().search(
-                        [('message_id', '=', acknowledgment.get('id'))], limit=1)
-                    partner = provider.user_id.partner_id.sudo().search(
-                        ['|', ('phone', '=', acknowledgment.get('recipient_id')),
-                         ('mobile', '=', acknowledgment.get('recipient_id'))], limit=1)
-                    if partner:
-                        channel |= provider.get_channel_whatsapp(partner, provider.user_id)
-                    if wp_msgs:
-                        wa_mail_message = request.env['mail.message'].sudo().search(
-                            [('wa_message_id', '=', acknowledgment.get('id'))], limit=1)
-                        if wp_msgs and wp_msgs.type != acknowledgment.get('status'):
-                            if acknowledgment.get('status') in ['sent', 'delivered', 'read']:
-                                wp_msgs.sudo().write({'type': acknowledgment.get('status')})
-                            elif acknowledgment.get('status') == 'failed':
-                                wp_msgs.sudo().write(
-                                    {'type': 'fail', 'fail_reason': acknowledgment.get('errors')[0].get('title')})
-                        if wa_mail_message and wa_mail_message.wp_status != acknowledgment.get('status'):
-                            temp_id = wa_mail_message.id + datetime.datetime.now().second / 100
-                            if acknowledgment.get('status') in ['sent', 'delivered', 'read']:
-                                wa_mail_message.sudo().with_context(temporary_id=temp_id).write(
-                                    {'wp_status': acknowledgment.get('status')})
-                            elif acknowledgment.get('status') == 'failed':
-                                wa_mail_message.sudo().with_context(temporary_id=temp_id).write(
-                                    {'wp_status': 'fail', 'wa_delivery_status': acknowledgment.get('status'),
-                                     'wa_error_message': acknowledgment.get('errors')[0].get('title')})
-                            if wa_mail_message:
-                                channel._notify_thread(wa_mail_message)
-
-            if provider.graph_api_authenticated:
-                user_partner = provider.user_id.partner_id
-                if data_value_obj.get('messages'):
-                    for mes in data_value_obj.get('messages'):
-                        wa_dict.update({'chat': True})
-                        partners = request.env['res.partner'].sudo().search(
-                            ['|', ('phone', '=', mes.get('from')), ('mobile', '=', mes.get('from'))])
-                        wa_dict.update({'partners': partners})
-                        if not partners:
-                            pn = phonenumbers.parse('+' + mes.get('from'))
-                            country_code = region_code_for_country_code(pn.country_code)
-                            country_id = request.env['res.country'].sudo().search(
-                                [('code', '=', country_code)], limit=1)
-                            partners = request.env['res.partner'].sudo().create(
-                                {'name': data.get('entry')[0].get('changes')[0].get('value').get('contacts')[
-                                    0].get('profile').get('name'), 'country_id': country_id.id,
-                                 'is_whatsapp_number': True,
-                                 'mobile': mes.get('from')})
-
-                        for partner in partners:
-                            channel = provider.get_channel_whatsapp(partner, provider.user_id)
-
-                            message_values = {
-                                'author_id': partner.id,
-                                'email_from': partner.email or '',
-                                'model': 'mail.channel',
-                                'message_type': 'wa_msgs',
-                                'wa_message_id': mes.get('id'),
-                                'isWaMsgs': True,
-                                'subtype_id': request.env['ir.model.data'].sudo()._xmlid_to_res_id(
-                                    'mail.mt_comment'),
-                                'partner_ids': [(4, partner.id)],
-                                'res_id': channel.id,
-                                'reply_to': partner.email,
-                                'company_id': provider.company_id.id,
-                            }
-                            vals = {
-                                'provider_id': provider.id,
-                                'author_id': user_partner.id,
-                                'message_id': mes.get('id'),
-                                'type': 'received',
-                                'partner_id': partner.id,
-                                'phone': partner.mobile,
-                                'attachment_ids': False,
-                                'company_id': provider.company_id.id,
-                            }
-                            if mes.get('type') == 'text':
-                                message_values.update({'body': mes.get('text').get('body')})
-                                vals.update({'message': mes.get('text').get('body')})
-                            elif mes.get('type') == 'location':
-                                # phone change to mobile
-                                lat = mes.get('location').get('latitude')
-                                lag = mes.get('location').get('longitude')
-                                message_values.update({
-                                    'body': "<a href='https://www.google.com/maps/search/?api=1&query=" + str(
-                                        lat) + "," + str(
-                                        lag) + "' target='_blank' class='btn btn-primary'>Google Map</a>",
-                                })
-                                vals.update(
-                                    {'message': "<a href='https://www.google.com/maps/search/?api=1&query=" + str(
-                                        lat) + "," + str(
-                                        lag) + "' target='_blank' class='btn btn-primary'>Google Map</a>"})
-                            elif mes.get('type') in ['image', 'video', 'document', 'audio', 'sticker']:
-                                attachment, message_values, vals = self._get_received_attachment(mes, provider,
-                                                                                                 message_values, vals)
-                                message_values.update({
-                                    'attachment_ids': [(4, attachment.id)],
-                                })
-                                vals.update({
-                                    'attachment_ids': [(4, attachment.id)],
-                                })
-                            elif mes.get('type') == 'reaction':
-                                message_values.update({
-                                    'body': mes.get('reaction').get('emoji')
-                                })
-                                vals.update({
-                                    'message': mes.get('reaction').get('emoji')
-                                })
-                            elif mes.get('type') == 'button':
-                                message_values.update({
-                                    'body': mes.get('button').get('text')
-                                })
-                                vals.update({
-                                    'message': mes.get('button').get('text')
-                                })
-                            elif mes.get('type') == 'interactive':
-                                title = list(
-                                    map(lambda l: mes.get('interactive').get(l), mes.get('interactive')))
-                                message_values.update({
-                                    'body': len(title) > 0 and title[1].get('title') or '',
-                                })
-                                vals.update({
-                                    'message': len(title) > 0 and title[1].get('title') or ''
-                                })
-                            else:
-                                message_values.update({
-                                    'body': mes.get('text').get('body')
-                                })
-                                vals.update({
-                                    'message': mes.get('text').get('body')
-                                })
-
-                            if 'context' in mes or mes.get('reaction', {}).get('message_id', False):
-                                parent_message = request.env['mail.message'].sudo().search_read(
-                                    [('wa_message_id', '=',
-                                      mes.get('context').get('id') if mes.get('context', False) else mes.get(
-                                          'reaction').get('message_id'))],
-                                    ['id', 'body', 'chatter_wa_model', 'chatter_wa_res_id',
-                                     'chatter_wa_message_id'])
-                                if len(parent_message) > 0:
-                                    message_values.update({'parent_id': parent_message[0]['id']})
-
-                            message = request.env['mail.message'].sudo().with_user(provider.user_id.id).with_context(
-                                {'message': 'received'}).create(
-                                message_values)
-                            channel._broadcast(channel.channel_member_ids.mapped('partner_id').ids)
-                            channel._notify_thread(message, message_values)
-                            request.env['whatsapp.history'].sudo().with_user(provider.user_id.id).with_context(
-                                {'message': 'received'}).create(vals)
+        if data.get('entry'):
+            wa_dict.update({'event': request.env['whatsapp.webhook.event'].sudo()._enqueue(payload)})
         return wa_dict
 
     @http.route(['/send/product'], type='json', methods=['POST'])
@@ -0,0 +1,22 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# One pooled session per Odoo worker process, shared by the media download
+# and bulk send threads
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32)
+                session = requests.Session()
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session = session
+    return _session
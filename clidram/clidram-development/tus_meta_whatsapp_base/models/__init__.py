@@ -17,4 +17,7 @@ from . import ir_attachment
 from . import provider_meta
 from . import ir_actions
 from . import wa_button_component
-from . import wa_carousel_componets
\ No newline at end of file
+from . import wa_carousel_componets
+from . import whatsapp_webhook_event
+from . import whatsapp_media_download
+from . import whatsapp_bulk_send
@@ -6,4 +6,25 @@ class ChannelProviderLine(models.Model):
 
     channel_id = fields.Many2one('mail.channel','Channel')
     provider_id = fields.Many2one('provider', 'Provider')
-    partner_id = fields.Many2one('res.partner','Partner')
\ No newline at end of file
+    partner_id = fields.Many2one('res.partner','Partner')
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        lines = super(ChannelProviderLine, self).create(vals_list)
+        lines._discard_cached_channels()
+        return lines
+
+    def write(self, vals):
+        self._discard_cached_channels()
+        res = super(ChannelProviderLine, self).write(vals)
+        self._discard_cached_channels()
+        return res
+
+    def unlink(self):
+        self._discard_cached_channels()
+        return super(ChannelProviderLine, self).unlink()
+
+    def _discard_cached_channels(self):
+        """Evict the providers' cached partner -> channel resolution of these lines, in this worker"""
+        for provider in self.provider_id:
+            provider._discard_cached_channel(self.filtered(lambda line: line.provider_id == provider).partner_id.ids)
@@ -23,7 +23,7 @@ class Message(models.Model):
 
     message_type = fields.Selection(selection_add=[('wa_msgs', 'WA Msgs')], ondelete={'wa_msgs': lambda recs: recs.write({'wa_msgs': 'odoo'})})
     isWaMsgs = fields.Boolean("WA msgs")
-    wa_message_id = fields.Char("Whatsapp Message ID")
+    wa_message_id = fields.Char("Whatsapp Message ID", index=True)
     company_id = fields.Many2one('res.company', string='Company', default=lambda self: self.env.company)
     chatter_wa_model = fields.Char('Chatter Wa Message Model', index=True)
     chatter_wa_res_id = fields.Many2oneReference('Chatter Wa Res Id', index=True, model_field='chatter_wa_model')
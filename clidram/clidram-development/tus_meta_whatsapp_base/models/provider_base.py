@@ -559,16 +559,55 @@ class Provider(models.Model):
             parameters[0][doc_type].pop('filename')
         return parameters or []
 
+    @tools.ormcache('self.id', 'partner_id')
+    def _cached_channel_id(self, partner_id):
+        return self._search_channel_id(partner_id)
+
+    def _search_channel_id(self, partner_id):
+        """Channel of a channel.provider.line of this provider, for the partner or for any one when partner_id is None"""
+        domain = [('provider_id', '=', self.id)]
+        if partner_id is not None:
+            domain.append(('partner_id', '=', partner_id))
+        return self.env['channel.provider.line'].sudo().search(domain, limit=1).channel_id.id
+
+    def _discard_cached_channel(self, partner_ids):
+        """
+        Drop this worker's cached channels of the providers for the partners
+        and their fallback channel. Only these entries are evicted, instead of
+        clearing the registry cache of every worker.
+        """
+        for provider in self:
+            for partner_id in set(partner_ids) | {None}:
+                cache, key, _counter = tools.get_cache_key_counter(provider._cached_channel_id, partner_id)
+                cache.pop(key, None)
+
+    def _get_partner_channel_id(self, partner_id):
+        """
+        Channel of the partner's conversation on this provider, cached per
+        worker. A cached miss is searched again without touching the cache, as
+        the conversation may have been started by another worker, whose line
+        changes only evict its own cache entries.
+        """
+        return self._cached_channel_id(partner_id) or self._search_channel_id(partner_id)
+
+    def _get_default_channel_id(self):
+        return self._get_partner_channel_id(None)
+
     def get_channel_whatsapp(self, partner, user):
         channel = self.env['mail.channel'].sudo()
         if not partner or not user:
             return channel
-        provider_channel_id = partner.channel_provider_line_ids.filtered(lambda s: s.provider_id.id == self.id) or self.env['channel.provider.line'].sudo().search([('provider_id', '=', self.id)], limit=1)
-        if provider_channel_id:
-            channel |= provider_channel_id.channel_id
+        channel_id = self._get_partner_channel_id(partner.id) or self._get_default_channel_id()
+        if channel_id:
+            channel |= channel.browse(channel_id).exists()
+            if not channel:
+                # Deleted since it was cached
+                self._discard_cached_channel([partner.id])
+                return self.get_channel_whatsapp(partner, user)
             if user.partner_id.id not in channel.channel_partner_ids.ids and user.has_group(
                     "base.group_user") and user.has_group("tus_meta_whatsapp_base.whatsapp_group_user"):
-                channel.sudo().write({"channel_partner_ids": [(4, user.partner_id.id)]})
+                channel.write({"channel_partner_ids": [(4, user.partner_id.id)]})
+            self._add_multi_agents(channel)
         else:
             name = partner.mobile
             channel |= self.env['mail.channel'].sudo().create(
@@ -592,7 +631,6 @@ class Provider(models.Model):
             })
             partner.sudo().write({"channel_provider_line_ids": [
                 (0, 0, {"channel_id": channel.id, "provider_id": self.id})]})
-        if channel:
             self._add_multi_agents(channel)
         return channel
 
@@ -602,17 +640,15 @@ class Provider(models.Model):
                 if self.company_id and (self.company_id._fields.get('wa_chatbot_id') and self.company_id.wa_chatbot_id):
                     return
                 else:
-                    for user in rec.user_ids:
-                        channel_partner = channel.channel_partner_ids.filtered(lambda x: x.id == user.partner_id.id)
-                        if not channel_partner:
-                            channel.sudo().write(
-                                {'channel_partner_ids': [(4, user.partner_id.id)]})
-                        mail_channel_partner = self.env[
-                            'mail.channel.member'].sudo().search(
-                            [('channel_id', '=', channel.id),
-                             ('partner_id', '=', user.partner_id.id)])
-                        if not mail_channel_partner.is_pinned:
-                            mail_channel_partner.write({'is_pinned': True})
+                    # One read of the members, written only when an agent is missing or unpinned
+                    agents = rec.user_ids.partner_id
+                    missing = agents - channel.channel_partner_ids
+                    if missing:
+                        channel.sudo().write({'channel_partner_ids': [(4, partner.id) for partner in missing]})
+                    unpinned = channel.sudo().channel_member_ids.filtered(
+                        lambda member: member.partner_id in agents and not member.is_pinned)
+                    if unpinned:
+                        unpinned.write({'is_pinned': True})
 
     def _get_interactive_template_params(self, component):
         self.ensure_one()
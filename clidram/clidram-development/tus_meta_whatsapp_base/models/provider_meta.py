@@ -30,6 +30,9 @@ class Provider(models.Model):
         string='Authentication')
     graph_api_authenticated = fields.Boolean('Authenticated', readonly=True)
     graph_api_app_id = fields.Char(string="App ID")
+    graph_api_throughput = fields.Selection(
+        [('80', "Standard (80 messages/s)"), ('1000', "Upgraded (1,000 messages/s)")], default='80',
+        string='Throughput Tier', help="Meta's messages per second limit for this phone number, used to pace bulk sends")
     user_id = fields.Many2one(string="User", comodel_name='res.users', default=lambda self: self.env.user)
 
     is_token_generated = fields.Boolean('Is Token Generated')
@@ -1,13 +1,48 @@
 from odoo import _, api, fields, models, modules, tools
+import logging
+import re
 import requests
 import json
+import phonenumbers
 from odoo.exceptions import UserError, ValidationError,AccessError
 
+_logger = logging.getLogger(__name__)
+
+BACKFILL_PARAM = 'tus_meta_whatsapp_base.phone_e164_backfill_id'
+BACKFILL_DONE_PARAM = 'tus_meta_whatsapp_base.phone_e164_backfill_done'
+
+
+def phone_to_e164(number, country_code=None):
+    """
+    E.164 form of a phone number, or False if it cannot be parsed.
+
+    Numbers without a leading '+' are read as national numbers of the
+    country first, then as international numbers without the '+' (the way
+    Meta sends them and the way mobile is stored here).
+    """
+    if not number or not re.search(r'\d', number):
+        return False
+    candidates = []
+    if not number.strip().startswith('+') and country_code:
+        candidates.append((number, country_code))
+    candidates.append(('+' + re.sub(r'\D', '', number), None))
+    for candidate, region in candidates:
+        try:
+            parsed = phonenumbers.parse(candidate, region)
+        except phonenumbers.NumberParseException:
+            continue
+        if phonenumbers.is_valid_number(parsed) or (region is None and phonenumbers.is_possible_number(parsed)):
+            return phonenumbers.format_number(parsed, phonenumbers.PhoneNumberFormat.E164)
+    return False
+
+
 class ResPartner(models.Model):
     _inherit = 'res.partner'
 
     is_whatsapp_number = fields.Boolean('Is Whatsapp Number')
     channel_provider_line_ids = fields.One2many('channel.provider.line', 'partner_id', 'Channel Provider Line')
+    phone_e164 = fields.Char('Whatsapp Number (E.164)', index=True, readonly=True, copy=False,
+                             help="Mobile (or phone if no mobile) in E.164 form, used to match incoming Whatsapp numbers")
 
     def check_whatsapp_history(self):
         self.ensure_one()
@@ -48,16 +83,69 @@ class ResPartner(models.Model):
     @api.model_create_multi
     def create(self, vals_list):
         for vals in vals_list:
-            res = super(ResPartner, self).create(vals)
             # phone change to mobile
-            if res.mobile:
-                res.mobile = res.mobile.strip('+').replace(" ", "").replace("-", "")
-            return res
+            if vals.get('mobile'):
+                vals['mobile'] = vals['mobile'].strip('+').replace(" ", "").replace("-", "")
+        partners = super(ResPartner, self).create(vals_list)
+        partners._update_phone_e164()
+        return partners
 
     def write(self, vals):
         if 'mobile' in vals:
             if vals.get('mobile'):
                 vals.update({'mobile':vals.get('mobile').strip('+').replace(" ", "")})
         res= super(ResPartner, self).write(vals)
+        if {'mobile', 'phone', 'country_id'} & set(vals):
+            self._update_phone_e164()
         return res
 
+    def _update_phone_e164(self):
+        for partner in self:
+            value = phone_to_e164(partner.mobile or partner.phone, partner.country_id.code)
+            if partner.phone_e164 != value:
+                super(ResPartner, partner).write({'phone_e164': value})
+
+    @api.model
+    def _find_by_wa_numbers(self, numbers):
+        """
+        Partners by E.164 number for incoming Whatsapp numbers, with one
+        indexed equality search. Until the backfill of existing partners is
+        done, numbers not found are also matched on raw phone/mobile.
+        """
+        partners = {}
+        if not numbers:
+            return partners
+        for partner in self.sudo().search([('phone_e164', 'in', list(numbers))]):
+            partners.setdefault(partner.phone_e164, self.sudo())
+            partners[partner.phone_e164] |= partner
+        missing = set(numbers) - set(partners)
+        if missing and not self.env['ir.config_parameter'].sudo().get_param(BACKFILL_DONE_PARAM):
+            raw = [number.lstrip('+') for number in missing] + list(missing)
+            for partner in self.sudo().search(['|', ('phone', 'in', raw), ('mobile', 'in', raw)]):
+                for number in {'+' + re.sub(r'\D', '', partner.phone or ''),
+                               '+' + re.sub(r'\D', '', partner.mobile or '')} & missing:
+                    partners.setdefault(number, self.sudo())
+                    partners[number] |= partner
+        return partners
+
+    @api.model
+    def _cron_backfill_phone_e164(self, batch_size=1000, max_batches=20):
+        """Fill phone_e164 of partners created before it existed, batch by batch in id order"""
+        params = self.env['ir.config_parameter'].sudo()
+        if params.get_param(BACKFILL_DONE_PARAM):
+            return
+        last_id = int(params.get_param(BACKFILL_PARAM, '0') or 0)
+        for _batch in range(max_batches):
+            partners = self.with_context(active_test=False).search(
+                [('id', '>', last_id), '|', ('mobile', '!=', False), ('phone', '!=', False)],
+                order='id', limit=batch_size)
+            if not partners:
+                params.set_param(BACKFILL_DONE_PARAM, 'True')
+                _logger.info("Partner E.164 numbers backfilled")
+                return
+            partners._update_phone_e164()
+            last_id = partners[-1].id
+            params.set_param(BACKFILL_PARAM, last_id)
+            self.env.cr.commit()
+        self.env.ref('tus_meta_whatsapp_base.ir_cron_backfill_phone_e164')._trigger()
+
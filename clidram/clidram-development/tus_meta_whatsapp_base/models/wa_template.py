@@ -322,6 +322,75 @@ class WATemplate(models.Model):
                           "components": carousel_component})
         return cards
 
+    def _get_send_fields(self, model_name, partner_field):
+        """Fields of model_name read by the template's body, header, button and carousel variables"""
+        self.ensure_one()
+        variables = self.components_ids.variables_ids | self.components_ids.wa_carousel_ids.variables_ids
+        names = set(variables.field_id.mapped('name')) | {partner_field}
+        if 'monetary' in variables.field_id.mapped('ttype'):
+            # Monetary values are formatted with the record's currency
+            names.add('currency_id')
+        fields = self.env[model_name]._fields
+        return sorted(name for name in names if name in fields) or ['id']
+
+    def _get_send_params(self, object_data, provider, partner, attachments=None):
+        """
+        Graph API components of the template rendered for one record.
+
+        object_data is the record as read by search_read; attachments are
+        used for dynamic media headers.
+        """
+        self.ensure_one()
+        history_model = self.env['whatsapp.history']
+        params = []
+        for component in self.components_ids:
+            template_dict = {}
+            cards = []
+
+            if component.type in ['body', 'footer'] and component.variables_ids:
+                template_dict.update({'type': component.type})
+                template_dict.update({'parameters': [history_model._get_variable_params_dict(variable, object_data)
+                                                     for variable in component.variables_ids]})
+
+            if component.type == "header":
+                if component.formate == "text" and component.variables_ids:
+                    template_dict.update({"type": component.type})
+                    template_dict.update({'parameters': [history_model._get_variable_params_dict(variable, object_data)
+                                                         for variable in component.variables_ids]})
+                if component.formate == "media" and component.formate_media_type in ["dynamic", "static"]:
+                    if component.media_type in ["image", "document", "video"] and (
+                            attachments or component.attachment_ids):
+                        template_dict.update({"type": component.type})
+                        doc_attachment = attachments if component.formate_media_type == "dynamic" else component.attachment_ids
+                        parameters = provider.get_docs_parameters(
+                            doc_type=component.media_type, doc_id=fields.first(doc_attachment))
+                        template_dict.update({"parameters": parameters})
+
+            if component.type == "buttons":
+                self._get_send_button_params(component, object_data, params)
+
+            if component.type == "limited_time_offer":
+                template_dict.update({'type': component.type})
+                template_dict.update({'parameters': [{
+                    "type": "limited_time_offer",
+                    "limited_time_offer": {
+                        'expiration_time_ms': fields.datetime.timestamp(component.limited_offer_exp_date) * 1000
+                    }
+                }]})
+
+            if component.type == 'carousel':
+                self._get_carousel_params(component, object_data, provider, partner, cards)
+            if bool(template_dict):
+                params.append(template_dict)
+            if cards:
+                params.append({"type": "CAROUSEL", "cards": cards})
+        return params
+
+    def _send_bulk(self, records, provider=None, partner_field='partner_id', attachments=None):
+        """Send the template to the partner of each record in the background, see whatsapp.bulk.send"""
+        self.ensure_one()
+        return self.env['whatsapp.bulk.send']._enqueue(self, records, provider, partner_field, attachments)
+
     def add_whatsapp_template(self):
         components = []
         for component in self.components_ids:
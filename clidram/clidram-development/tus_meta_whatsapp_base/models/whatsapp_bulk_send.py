@@ -0,0 +1,257 @@
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from odoo import api, fields, models, tools, _
+from odoo.exceptions import UserError
+
+from ..http_pool import get_session
+
+_logger = logging.getLogger(__name__)
+
+# Requests in flight per cron run, paced by the provider's token bucket
+MAX_WORKERS = 8
+# Records rendered, logged and sent per transaction
+CHUNK_SIZE = 200
+MAX_ATTEMPTS = 3
+TIMEOUT = (10, 30)
+
+
+class TokenBucket:
+    """Thread-safe token bucket: rate tokens per second, bursts of up to one second"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = float(rate)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+# One bucket per provider phone number and Odoo process
+_buckets_lock = threading.Lock()
+_buckets = {}
+
+
+def _get_bucket(provider_id, rate):
+    with _buckets_lock:
+        bucket = _buckets.get(provider_id)
+        if bucket is None or bucket.rate != rate:
+            bucket = _buckets[provider_id] = TokenBucket(rate)
+        return bucket
+
+
+def send_template(bucket, url, token, payload):
+    """
+    POST one template message (send thread task), retrying throttling, server
+    and connection errors with backoff.
+
+    Returns:
+        (Meta message id, error message), one of them False
+    """
+    error = False
+    for attempt in range(MAX_ATTEMPTS):
+        if attempt:
+            time.sleep(2 ** attempt)
+        bucket.acquire()
+        try:
+            answer = get_session().post(url, json=payload, headers={'Authorization': 'Bearer ' + token},
+                                        timeout=TIMEOUT)
+        except requests.exceptions.RequestException as e:
+            error = str(e)
+            continue
+        try:
+            data = answer.json()
+        except ValueError:
+            data = {}
+        if answer.status_code == 200 and data.get('messages') and data['messages'][0].get('id'):
+            return data['messages'][0]['id'], False
+        error = (data.get('error') or {}).get('message') or answer.text or str(answer.status_code)
+        if answer.status_code != 429 and answer.status_code < 500:
+            break
+    return False, error
+
+
+class WhatsappBulkSend(models.Model):
+    _name = 'whatsapp.bulk.send'
+    _description = 'Whatsapp Bulk Send'
+    _order = 'id desc'
+
+    template_id = fields.Many2one('wa.template', string='Template', required=True, ondelete='cascade')
+    provider_id = fields.Many2one('provider', string='Provider', required=True, ondelete='cascade')
+    model = fields.Char(string='Model', required=True)
+    res_ids = fields.Text(string='Record IDs', required=True, help='JSON list of the records to send to')
+    partner_field = fields.Char(string='Partner Field', required=True, default='partner_id')
+    attachment_ids = fields.Many2many('ir.attachment', string='Header Attachments')
+    rendered_count = fields.Integer(string='Rendered', help='Records rendered and logged so far')
+    state = fields.Selection([
+        ('queued', 'Queued'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string='State', default='queued', required=True, index=True)
+    error = fields.Text(string='Error')
+    history_ids = fields.One2many('whatsapp.history', 'bulk_send_id', string='Messages')
+    sent_count = fields.Integer(string='Sent', compute='_compute_counts')
+    failed_count = fields.Integer(string='Failed', compute='_compute_counts')
+
+    def _compute_counts(self):
+        counts = {
+            (group['bulk_send_id'][0], group['type']): group['__count']
+            for group in self.env['whatsapp.history'].read_group(
+                [('bulk_send_id', 'in', self.ids)], ['bulk_send_id', 'type'], ['bulk_send_id', 'type'], lazy=False)
+        } if self.ids else {}
+        for bulk in self:
+            bulk.failed_count = counts.get((bulk.id, 'fail'), 0)
+            bulk.sent_count = sum(count for (bulk_id, state), count in counts.items()
+                                  if bulk_id == bulk.id and state not in ('fail', 'in queue'))
+
+    @api.model
+    def _enqueue(self, template, records, provider=None, partner_field='partner_id', attachments=None):
+        """Queue a template send to every record; the cron renders and sends it in the background"""
+        provider = provider or template.provider_id
+        if provider.provider != 'graph_api':
+            raise UserError(_("Bulk sending is only available for Graph API providers."))
+        if template.template_type == 'interactive':
+            raise UserError(_("Interactive templates cannot be sent in bulk."))
+        bulk = self.sudo().create({
+            'template_id': template.id,
+            'provider_id': provider.id,
+            'model': records._name,
+            'res_ids': json.dumps(records.ids),
+            'partner_field': partner_field,
+            'attachment_ids': [(6, 0, attachments.ids if attachments else [])],
+        })
+        self.env.ref('tus_meta_whatsapp_base.ir_cron_process_bulk_send').sudo()._trigger()
+        return bulk
+
+    @api.model
+    def _cron_process(self, max_chunks=25):
+        """
+        Render, log and send queued bulk sends chunk by chunk, one transaction
+        per chunk. A bulk send whose chunk raises, e.g. a wrong partner field
+        or a deleted model, is marked failed so the ones after it still go out.
+        """
+        cron = self.env.ref('tus_meta_whatsapp_base.ir_cron_process_bulk_send')
+        for _chunk in range(max_chunks):
+            bulk = self.search([('state', '=', 'queued')], order='id', limit=1)
+            if not bulk:
+                return
+            try:
+                bulk._process_chunk()
+            except Exception as e:
+                self.env.cr.rollback()
+                _logger.error("Whatsapp bulk send %s failed: %s", bulk.id, e)
+                bulk.write({'state': 'failed', 'error': str(e)})
+            self.env.cr.commit()
+        cron._trigger()
+
+    def _process_chunk(self):
+        self.ensure_one()
+        res_ids = json.loads(self.res_ids)
+        # Logged but unsent messages first, e.g. after a worker restart
+        histories = self.env['whatsapp.history'].sudo().search(
+            [('bulk_send_id', '=', self.id), ('type', '=', 'in queue')], limit=CHUNK_SIZE)
+        if not histories:
+            chunk = res_ids[self.rendered_count:self.rendered_count + CHUNK_SIZE]
+            if not chunk:
+                self.state = 'done'
+                return
+            histories = self._render(chunk)
+            self.rendered_count += len(chunk)
+            # Log the queue before sending, a restart resumes from it
+            self.env.cr.commit()
+        self._send(histories)
+
+    def _render(self, res_ids):
+        """
+        Render the template for the records with one read of the fields its
+        variables use, and log a queued history per recipient
+        """
+        template = self.template_id
+        provider = self.provider_id
+        records = self.env[self.model].with_context(active_test=False).browse(res_ids).exists()
+        fields = template._get_send_fields(self.model, self.partner_field)
+        rows = {row['id']: row for row in records.search_read([('id', 'in', records.ids)], fields)}
+        # Body text of the template with its variables filled in, as logged in the history
+        body = tools.html2plaintext(template.body_html or '')
+        body_variables = template.components_ids.filtered(lambda component: component.type == 'body').variables_ids
+
+        vals_list = []
+        for record in records:
+            partner = record[self.partner_field]
+            object_data = rows[record.id]
+            vals = {
+                'provider_id': provider.id,
+                'author_id': provider.user_id.partner_id.id,
+                'partner_id': partner.id,
+                'phone': partner.mobile,
+                'model': self.model,
+                'rec_id': record.id,
+                'bulk_send_id': self.id,
+                'company_id': provider.company_id.id,
+            }
+            if not partner.mobile:
+                vals.update({'type': 'fail', 'fail_reason': _("No mobile number")})
+                vals_list.append(vals)
+                continue
+            message = body
+            for index, variable in enumerate(body_variables):
+                value = object_data.get(variable.field_id.name) if variable.field_id.name else variable.free_text
+                message = message.replace('{{%d}}' % (index + 1), str(value[1] if isinstance(value, tuple) else value))
+            try:
+                params = template._get_send_params(object_data, provider, partner, self.attachment_ids)
+            except Exception as e:
+                vals.update({'message': message, 'type': 'fail', 'fail_reason': str(e)})
+                vals_list.append(vals)
+                continue
+            vals.update({'message': message, 'template_params': json.dumps(params)})
+            vals_list.append(vals)
+        histories = self.env['whatsapp.history'].sudo().with_context(whatsapp_application=True).create(vals_list)
+        return histories.filtered(lambda history: history.type == 'in queue')
+
+    def _send(self, histories):
+        """Send the queued messages concurrently through the provider's rate limit, then record the outcomes"""
+        template = self.template_id
+        provider = self.provider_id
+        bucket = _get_bucket(provider.id, int(provider.graph_api_throughput or 80))
+        url = provider.graph_api_url + provider.graph_api_instance_id + "/messages"
+        payloads = [(history, {
+            "messaging_product": "whatsapp",
+            "recipient_type": "individual",
+            "to": history.partner_id.mobile,
+            "type": "template",
+            "template": {
+                "name": template.name,
+                "language": {"code": template.language},
+                "components": json.loads(history.template_params or '[]'),
+            },
+        }) for history in histories]
+
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='wa_bulk_send') as pool:
+            results = [(history, pool.submit(send_template, bucket, url, provider.graph_api_token, payload))
+                       for history, payload in payloads]
+        failed = 0
+        for history, future in results:
+            message_id, error = future.result()
+            if message_id:
+                history.write({'type': 'sent', 'message_id': message_id, 'template_params': False})
+            else:
+                failed += 1
+                history.write({'type': 'fail', 'fail_reason': error, 'template_params': False})
+        if failed:
+            _logger.warning("Whatsapp bulk send %s: %s of %s messages failed", self.id, failed, len(results))
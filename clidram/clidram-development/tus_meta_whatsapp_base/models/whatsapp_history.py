@@ -45,7 +45,7 @@ class WhatsappHistory(models.Model):
         'ir.attachment', 'wa_history_attachment_rel',
         'wa_message_id', 'wa_attachment_id',
         string='Attachments', readonly=True)
-    message_id = fields.Char("Message ID", readonly=True)
+    message_id = fields.Char("Message ID", readonly=True, index=True)
     mail_message_id = fields.Many2one('mail.message')
     fail_reason = fields.Char("Fail Reason", readonly=True)
     company_id = fields.Many2one('res.company', string='Company', default=lambda self: self.env.company, readonly=True)
@@ -53,6 +53,9 @@ class WhatsappHistory(models.Model):
     model = fields.Char('Related Document Model', index=True, readonly=True)
     active = fields.Boolean('Active', default=True)
     rec_id = fields.Integer("Related Model ID", readonly=True)
+    bulk_send_id = fields.Many2one('whatsapp.bulk.send', 'Bulk Send', readonly=True, index=True, ondelete='set null')
+    template_params = fields.Text('Template Parameters', readonly=True,
+                                  help="Rendered Graph API components, sent by the bulk send cron")
 
     @api.onchange('partner_id')
     def _onchange_partner(self):
@@ -105,6 +108,12 @@ class WhatsappHistory(models.Model):
 
     @api.model_create_multi
     def create(self, vals_list):
+        if self.env.context.get('whatsapp_application'):
+            # Logged only, nothing is sent: one batched insert
+            for vals in vals_list:
+                vals.pop('is_chatbot', None)
+                vals.pop('is_commerce_manager', None)
+            return super(WhatsappHistory, self).create(vals_list)
         for vals in vals_list:
             if vals.get('is_chatbot'):
                 vals.pop('is_chatbot')
@@ -171,19 +180,12 @@ class WhatsappHistory(models.Model):
                         return res
 
                     else:
+                        object_data = self.env[wa_template.model_id.model].search_read(
+                            [('id', '=', self.env.context.get('active_model_id'))])[0] if wa_template.components_ids else {}
+                        params = wa_template._get_send_params(object_data, res.provider_id, res.partner_id,
+                                                              self.env.context.get("attachment_ids"))
                         for component in wa_template.components_ids:
-                            object_data = self.env[wa_template.model_id.model].search_read(
-                                [('id', '=', self.env.context.get('active_model_id'))])[0]
-
-                            template_dict = {}
-                            cards = []
-
                             if component.type in ['body', 'footer'] and component.variables_ids:
-                                template_dict.update({'type': component.type})
-                                parameters = []
-                                for variable in component.variables_ids:
-                                    parameters.append(res._get_variable_params_dict(variable, object_data))
-                                    template_dict.update({'parameters': parameters})
                                 for length, var in enumerate(component.variables_ids):
                                     st = '{{%d}}' % (length + 1)
                                     if var.field_id.model or var.free_text:
@@ -200,51 +202,6 @@ class WhatsappHistory(models.Model):
                                                 'message': tools.html2plaintext(mail_message.body.replace(st, str(
                                                     value[1] if isinstance(value, tuple) else value)))
                                             })
-
-                            if component.type == "header":
-                                if component.formate == "text" and component.variables_ids:
-                                    template_dict.update(
-                                        {"type": component.type}
-                                    )
-                                    parameters = []
-                                    for variable in component.variables_ids:
-                                        parameters.append(
-                                            res._get_variable_params_dict(variable, object_data))
-                                        template_dict.update({'parameters': parameters})
-                                if component.formate == "media" and component.formate_media_type in ["dynamic",
-                                                                                                     "static"]:
-                                    if component.media_type in ["image", "document", "video"] and (
-                                            self.env.context.get("attachment_ids") or component.attachment_ids):
-                                        template_dict.update({"type": component.type})
-                                        doc_attachment = self.env.context.get(
-                                            "attachment_ids") if component.formate_media_type == "dynamic" else component.attachment_ids
-                                        parameters = res.provider_id.get_docs_parameters(
-                                            doc_type=component.media_type, doc_id=fields.first(doc_attachment))
-                                        template_dict.update({"parameters": parameters})
-
-                            if component.type == "buttons":
-                                wa_template._get_send_button_params(component, object_data, params)
-
-                            if component.type == "limited_time_offer":
-                                template_dict.update({'type': component.type})
-                                parameter = []
-                                limited_time_offer = {
-                                    "type": "limited_time_offer",
-                                    "limited_time_offer": {
-                                        'expiration_time_ms': fields.datetime.timestamp(
-                                            component.limited_offer_exp_date) * 1000
-                                    }
-                                }
-                                parameter.append(limited_time_offer)
-                                template_dict.update({'parameters': parameter})
-
-                            if component.type == 'carousel':
-                                wa_template._get_carousel_params(component, object_data, res.provider_id,
-                                                                 res.partner_id, cards)
-                            if bool(template_dict):
-                                params.append(template_dict)
-                            if cards:
-                                params.append({"type": "CAROUSEL", "cards": cards})
                         try:
                             answer = res.provider_id.send_template(wa_template.name, wa_template.language,
                                                                    wa_template.namespace, res.partner_id,
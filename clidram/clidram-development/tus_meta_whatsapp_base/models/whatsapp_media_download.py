@@ -0,0 +1,192 @@
+import hashlib
+import logging
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from odoo import api, fields, models
+
+from ..http_pool import get_session
+
+_logger = logging.getLogger(__name__)
+
+# Concurrent downloads per cron run
+MAX_DOWNLOADS = 4
+MAX_ATTEMPTS = 5
+# Doubled after each failed attempt
+RETRY_DELAY = timedelta(seconds=30)
+CHUNK_SIZE = 1024 * 1024
+TIMEOUT = (10, 60)
+
+# Body of a media message until its file is downloaded, when it has no caption
+MEDIA_PLACEHOLDER = '<p><i>Downloading %s…</i></p>'
+MEDIA_FAILED = '<p><i>The %s could not be downloaded from Whatsapp.</i></p>'
+
+
+def download_media(graph_api_url, token, media_id, phone_number_id, directory):
+    """
+    Fetch a Whatsapp media file into a temporary file of directory, in
+    chunks, without touching the database (download thread task).
+
+    Returns:
+        (temporary file path, sha1 checksum, size in bytes)
+    """
+    session = get_session()
+    response = session.get(f"{graph_api_url}{media_id}",
+                           params={'phone_number_id': phone_number_id, 'access_token': token}, timeout=TIMEOUT)
+    response.raise_for_status()
+    url = response.json().get('url')
+    if not url:
+        raise ValueError(f"No download url for media {media_id}")
+
+    sha = hashlib.sha1()
+    size = 0
+    fd, path = tempfile.mkstemp(prefix='wa_media_', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as file, \
+                session.get(url, headers={'Authorization': 'Bearer ' + token}, stream=True,
+                            timeout=TIMEOUT) as media:
+            media.raise_for_status()
+            for chunk in media.iter_content(CHUNK_SIZE):
+                file.write(chunk)
+                sha.update(chunk)
+                size += len(chunk)
+    except Exception:
+        os.unlink(path)
+        raise
+    return path, sha.hexdigest(), size
+
+
+class WhatsappMediaDownload(models.Model):
+    _name = 'whatsapp.media.download'
+    _description = 'Whatsapp Media Download'
+    _order = 'id'
+
+    provider_id = fields.Many2one('provider', string='Provider', required=True, ondelete='cascade')
+    media_id = fields.Char(string='Media ID', required=True)
+    media_type = fields.Char(string='Media Type', required=True)
+    name = fields.Char(string='File Name')
+    mimetype = fields.Char(string='Mime Type')
+    caption = fields.Text(string='Caption')
+    mail_message_id = fields.Many2one('mail.message', string='Message', ondelete='cascade')
+    history_id = fields.Many2one('whatsapp.history', string='History', ondelete='set null')
+    attachment_id = fields.Many2one('ir.attachment', string='Attachment', ondelete='set null')
+    state = fields.Selection([
+        ('queued', 'Queued'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string='State', default='queued', required=True, index=True)
+    attempts = fields.Integer(string='Attempts')
+    next_attempt_at = fields.Datetime(string='Next Attempt', default=fields.Datetime.now, index=True)
+    error = fields.Text(string='Error')
+
+    @api.model
+    def _enqueue(self, vals_list):
+        """Queue media downloads and wake the download cron once the transaction commits"""
+        downloads = self.sudo().create(vals_list)
+        if downloads:
+            self.env.ref('tus_meta_whatsapp_base.ir_cron_download_whatsapp_media').sudo()._trigger()
+        return downloads
+
+    @api.model
+    def _cron_process(self, batch_size=20, max_batches=25):
+        """
+        Download due media MAX_DOWNLOADS at a time and attach it to its
+        message, committing after each batch; failures are retried with a
+        doubling delay, MAX_ATTEMPTS times.
+        """
+        cron = self.env.ref('tus_meta_whatsapp_base.ir_cron_download_whatsapp_media')
+        for _batch in range(max_batches):
+            downloads = self.search([('state', '=', 'queued'), ('next_attempt_at', '<=', fields.Datetime.now())],
+                                    limit=batch_size)
+            if not downloads:
+                break
+            downloads._download()
+            self.env.cr.commit()
+        else:
+            cron._trigger()
+        retry = self.search([('state', '=', 'queued')], order='next_attempt_at', limit=1)
+        if retry:
+            cron._trigger(retry.next_attempt_at)
+        self.search([('state', '!=', 'queued'),
+                     ('create_date', '<', fields.Datetime.now() - timedelta(days=7))]).unlink()
+
+    def _download(self):
+        attachment_model = self.env['ir.attachment'].sudo()
+        directory = attachment_model._filestore()
+        os.makedirs(directory, exist_ok=True)
+        with ThreadPoolExecutor(max_workers=MAX_DOWNLOADS, thread_name_prefix='wa_media') as pool:
+            futures = [
+                (download, pool.submit(download_media, download.provider_id.graph_api_url,
+                                       download.provider_id.graph_api_token, download.media_id,
+                                       download.provider_id.graph_api_instance_id, directory))
+                for download in self
+            ]
+            for download, future in futures:
+                try:
+                    path, checksum, size = future.result()
+                except Exception as e:
+                    download._retry_later(e)
+                    continue
+                try:
+                    with self.env.cr.savepoint():
+                        download._attach(path, checksum, size)
+                except Exception as e:
+                    download._retry_later(e)
+                finally:
+                    if os.path.exists(path):
+                        os.unlink(path)
+
+    def _attach(self, path, checksum, size):
+        """Store a downloaded file as the message's attachment and show it in the channel"""
+        self.ensure_one()
+        attachment_model = self.env['ir.attachment'].sudo()
+        message = self.mail_message_id
+        vals = {
+            'name': self.name,
+            'type': 'binary',
+            'mimetype': self.mimetype,
+            'res_model': message.model or False,
+            'res_id': message.res_id,
+        }
+        if attachment_model._storage() == 'file':
+            # Move the streamed file into the filestore instead of loading it in memory;
+            # content already stored (e.g. the same sticker received twice) is reused
+            fname = next((name for name in (checksum[:2] + '/' + checksum, checksum[:3] + '/' + checksum)
+                          if os.path.isfile(attachment_model._full_path(name))), None)
+            if not fname:
+                fname, full_path = attachment_model._get_path(None, checksum)
+                os.replace(path, full_path)
+                attachment_model._mark_for_gc(fname)
+            vals.update({'store_fname': fname, 'checksum': checksum, 'file_size': size})
+        else:
+            with open(path, 'rb') as file:
+                vals['raw'] = file.read()
+        attachment = attachment_model.create(vals)
+        self.write({'state': 'done', 'attachment_id': attachment.id, 'error': False})
+        self.history_id.write({'attachment_ids': [(4, attachment.id)]})
+        self._update_message(self.caption or '', attachment)
+
+    def _retry_later(self, error):
+        self.ensure_one()
+        attempts = self.attempts + 1
+        _logger.warning("Whatsapp media %s download failed (attempt %s/%s): %s",
+                        self.media_id, attempts, MAX_ATTEMPTS, error)
+        if attempts < MAX_ATTEMPTS:
+            self.write({
+                'attempts': attempts,
+                'error': str(error),
+                'next_attempt_at': fields.Datetime.now() + RETRY_DELAY * 2 ** (attempts - 1),
+            })
+            return
+        self.write({'state': 'failed', 'attempts': attempts, 'error': str(error)})
+        self._update_message(self.caption or MEDIA_FAILED % self.media_type)
+
+    def _update_message(self, body, attachment=None):
+        message = self.mail_message_id
+        if not message or message.model != 'mail.channel':
+            return
+        channel = self.env['mail.channel'].sudo().browse(message.res_id)
+        channel._message_update_content(message, body, attachment_ids=attachment.ids if attachment else None,
+                                        strict=False)
@@ -0,0 +1,288 @@
+import json
+import logging
+import datetime
+from collections import defaultdict
+from datetime import timedelta
+
+import phonenumbers
+from phonenumbers.phonenumberutil import region_code_for_country_code
+
+from odoo import api, fields, models
+
+from .res_partner import phone_to_e164
+from .whatsapp_media_download import MEDIA_PLACEHOLDER
+
+_logger = logging.getLogger(__name__)
+
+MEDIA_TYPES = ['image', 'video', 'document', 'audio', 'sticker']
+
+# Attachment name and mimetype used when Meta leaves them out
+MEDIA_DEFAULTS = {
+    'image': (None, 'image/jpeg'),
+    'video': ('whatsapp_video', 'video/mp4'),
+    'document': (None, 'application/pdf'),
+    'audio': ('whatsapp_audio', 'audio/mpeg'),
+    'sticker': ('whatsapp_sticker', 'image/webp'),
+}
+
+
+class WhatsappWebhookEvent(models.Model):
+    _name = 'whatsapp.webhook.event'
+    _description = 'Whatsapp Webhook Event'
+    _order = 'id'
+
+    payload = fields.Text(string='Payload', required=True, help='Raw JSON body posted by Meta')
+    state = fields.Selection([
+        ('queued', 'Queued'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string='State', default='queued', required=True, index=True)
+    error = fields.Text(string='Error')
+
+    @api.model
+    def _enqueue(self, payload):
+        """Store a webhook body and wake the processing cron once the request commits"""
+        event = self.sudo().create({'payload': payload})
+        self.env.ref('tus_meta_whatsapp_base.ir_cron_process_webhook_events').sudo()._trigger()
+        return event
+
+    @api.model
+    def _cron_process(self, batch_size=100, max_batches=50):
+        """
+        Process queued webhook bodies in batches, each in its own transaction,
+        and drop processed events after 7 days. The cron never runs twice at
+        the same time, which is what makes the message id checks idempotent.
+        """
+        for _batch in range(max_batches):
+            events = self.search([('state', '=', 'queued')], limit=batch_size)
+            if not events:
+                break
+            events._process_batch()
+            self.env.cr.commit()
+        else:
+            # Still more queued, continue in a fresh cron run
+            self.env.ref('tus_meta_whatsapp_base.ir_cron_process_webhook_events')._trigger()
+        self.search([('state', '!=', 'queued'),
+                     ('create_date', '<', fields.Datetime.now() - timedelta(days=7))]).unlink()
+
+    def _process_batch(self):
+        """
+        Apply statuses and inbound messages of the events with one lookup of
+        providers, partners (by E.164 number), history and mail messages
+        (by Meta message id) for the whole batch. Messages already stored,
+        i.e. a duplicate delivery from Meta, are dropped.
+        """
+        values = []
+        for event in self:
+            try:
+                data = json.loads(event.payload)
+            except ValueError as e:
+                event.write({'state': 'failed', 'error': str(e)})
+                continue
+            values.append((event, [change.get('value') or {}
+                                   for entry in data.get('entry') or []
+                                   for change in entry.get('changes') or []]))
+
+        phone_number_ids = {value.get('metadata', {}).get('phone_number_id')
+                            for event, event_values in values for value in event_values}
+        phone_number_ids.discard(None)
+        providers = {provider.graph_api_instance_id: provider for provider in self.env['provider'].sudo().search([
+            ('graph_api_authenticated', '=', True),
+            ('graph_api_instance_id', 'in', list(phone_number_ids)),
+        ])}
+
+        numbers = set()
+        wa_message_ids = set()
+        for event, event_values in values:
+            for value in event_values:
+                for acknowledgment in value.get('statuses') or []:
+                    numbers.add(phone_to_e164(acknowledgment.get('recipient_id')))
+                    wa_message_ids.add(acknowledgment.get('id'))
+                for mes in value.get('messages') or []:
+                    numbers.add(phone_to_e164(mes.get('from')))
+                    wa_message_ids.add(mes.get('id'))
+                    parent_id = mes.get('context', {}).get('id') or mes.get('reaction', {}).get('message_id')
+                    if parent_id:
+                        wa_message_ids.add(parent_id)
+        numbers.discard(False)
+        wa_message_ids.discard(None)
+
+        partners = self._find_partners(numbers)
+        histories = {}
+        for history in self.env['whatsapp.history'].sudo().search([('message_id', 'in', list(wa_message_ids))],
+                                                                  order='id'):
+            histories.setdefault(history.message_id, history)
+        mail_messages = {}
+        for message in self.env['mail.message'].sudo().search([('wa_message_id', 'in', list(wa_message_ids))],
+                                                              order='id'):
+            mail_messages.setdefault(message.wa_message_id, message)
+
+        for event, event_values in values:
+            # Records created by an event that fails are rolled back with its savepoint
+            event_partners = defaultdict(partners.default_factory, partners)
+            event_messages = dict(mail_messages)
+            try:
+                with self.env.cr.savepoint():
+                    for value in event_values:
+                        provider = providers.get(value.get('metadata', {}).get('phone_number_id'))
+                        if not provider:
+                            continue
+                        event._apply_statuses(provider, value.get('statuses') or [], event_partners, histories,
+                                              event_messages)
+                        event._receive_messages(provider, value, event_partners, histories, event_messages)
+            except Exception as e:
+                _logger.error("Whatsapp webhook event %s failed: %s", event.id, e)
+                event.write({'state': 'failed', 'error': str(e)})
+                continue
+            partners, mail_messages = event_partners, event_messages
+            event.write({'state': 'done', 'error': False})
+
+    @api.model
+    def _find_partners(self, numbers):
+        """Partners by E.164 number, in one indexed search, for the numbers given"""
+        partners = defaultdict(lambda: self.env['res.partner'].sudo())
+        partners.update(self.env['res.partner']._find_by_wa_numbers(numbers))
+        return partners
+
+    def _apply_statuses(self, provider, statuses, partners, histories, mail_messages):
+        channel = self.env['mail.channel']
+        for acknowledgment in statuses:
+            status = acknowledgment.get('status')
+            partner = partners[phone_to_e164(acknowledgment.get('recipient_id'))][:1]
+            if partner:
+                channel |= provider.get_channel_whatsapp(partner, provider.user_id)
+            wp_msgs = histories.get(acknowledgment.get('id'))
+            if not wp_msgs:
+                continue
+            wa_mail_message = mail_messages.get(acknowledgment.get('id'))
+            if wp_msgs.type != status:
+                if status in ['sent', 'delivered', 'read']:
+                    wp_msgs.write({'type': status})
+                elif status == 'failed':
+                    wp_msgs.write({'type': 'fail', 'fail_reason': acknowledgment.get('errors')[0].get('title')})
+            if wa_mail_message and wa_mail_message.wp_status != status:
+                temp_id = wa_mail_message.id + datetime.datetime.now().second / 100
+                if status in ['sent', 'delivered', 'read']:
+                    wa_mail_message.with_context(temporary_id=temp_id).write({'wp_status': status})
+                elif status == 'failed':
+                    wa_mail_message.with_context(temporary_id=temp_id).write(
+                        {'wp_status': 'fail', 'wa_delivery_status': status,
+                         'wa_error_message': acknowledgment.get('errors')[0].get('title')})
+                channel._notify_thread(wa_mail_message)
+
+    def _receive_messages(self, provider, value, partners, histories, mail_messages):
+        """Post the inbound messages of a webhook value, skipping Meta ids already stored"""
+        user_partner = provider.user_id.partner_id
+        contacts = {contact.get('wa_id'): contact for contact in value.get('contacts') or []}
+        media_downloads = []
+        for mes in value.get('messages') or []:
+            if mes.get('id') in mail_messages or mes.get('id') in histories:
+                _logger.info("Whatsapp message %s already received, dropping duplicate delivery", mes.get('id'))
+                continue
+            number = phone_to_e164(mes.get('from')) or mes.get('from')
+            if not partners[number]:
+                contact = contacts.get(mes.get('from')) or (value.get('contacts') or [{}])[0]
+                partners[number] = self._create_partner(mes.get('from'), contact.get('profile', {}).get('name'))
+
+            for partner in partners[number]:
+                channel = provider.get_channel_whatsapp(partner, provider.user_id)
+                message_values = {
+                    'author_id': partner.id,
+                    'email_from': partner.email or '',
+                    'model': 'mail.channel',
+                    'message_type': 'wa_msgs',
+                    'wa_message_id': mes.get('id'),
+                    'isWaMsgs': True,
+                    'subtype_id': self.env['ir.model.data'].sudo()._xmlid_to_res_id('mail.mt_comment'),
+                    'partner_ids': [(4, partner.id)],
+                    'res_id': channel.id,
+                    'reply_to': partner.email,
+                    'company_id': provider.company_id.id,
+                }
+                vals = {
+                    'provider_id': provider.id,
+                    'author_id': user_partner.id,
+                    'message_id': mes.get('id'),
+                    'type': 'received',
+                    'partner_id': partner.id,
+                    'phone': partner.mobile,
+                    'attachment_ids': False,
+                    'company_id': provider.company_id.id,
+                }
+                self._set_received_content(mes, message_values, vals)
+
+                parent_id = mes.get('context', {}).get('id') or mes.get('reaction', {}).get('message_id')
+                if parent_id and parent_id in mail_messages:
+                    message_values.update({'parent_id': mail_messages[parent_id].id})
+
+                message = self.env['mail.message'].sudo().with_user(provider.user_id.id).with_context(
+                    {'message': 'received'}).create(message_values)
+                channel._broadcast(channel.channel_member_ids.mapped('partner_id').ids)
+                channel._notify_thread(message, message_values)
+                history = self.env['whatsapp.history'].sudo().with_user(provider.user_id.id).with_context(
+                    {'message': 'received'}).create(vals)
+                if mes.get('type') in MEDIA_TYPES and (mes.get(mes.get('type')) or {}).get('id'):
+                    media_downloads.append(self._get_media_download_vals(mes, provider, message, history))
+                mail_messages.setdefault(mes.get('id'), message)
+        self.env['whatsapp.media.download']._enqueue(media_downloads)
+
+    @api.model
+    def _get_media_download_vals(self, mes, provider, message, history):
+        media_type = mes.get('type')
+        media = mes.get(media_type)
+        name, mimetype = MEDIA_DEFAULTS[media_type]
+        if media_type == 'image':
+            name = media.get('id')
+        elif media_type == 'document':
+            name = media.get('filename')
+        return {
+            'provider_id': provider.id,
+            'media_id': media.get('id'),
+            'media_type': media_type,
+            'name': name,
+            'mimetype': media.get('mime_type') or mimetype,
+            'caption': media.get('caption', ''),
+            'mail_message_id': message.id,
+            'history_id': history.id,
+        }
+
+    @api.model
+    def _create_partner(self, number, name):
+        pn = phonenumbers.parse('+' + number)
+        country_code = region_code_for_country_code(pn.country_code)
+        country_id = self.env['res.country'].sudo().search([('code', '=', country_code)], limit=1)
+        return self.env['res.partner'].sudo().create({
+            'name': name,
+            'country_id': country_id.id,
+            'is_whatsapp_number': True,
+            'mobile': number,
+        })
+
+    @api.model
+    def _set_received_content(self, mes, message_values, vals):
+        """Fill the mail message and history values with the body of an inbound message"""
+        if mes.get('type') == 'text':
+            body = mes.get('text').get('body')
+        elif mes.get('type') == 'location':
+            lat = mes.get('location').get('latitude')
+            lag = mes.get('location').get('longitude')
+            body = "<a href='https://www.google.com/maps/search/?api=1&query=" + str(lat) + "," + str(
+                lag) + "' target='_blank' class='btn btn-primary'>Google Map</a>"
+        elif mes.get('type') in MEDIA_TYPES:
+            # The file is downloaded in the background, see whatsapp.media.download
+            media = mes.get(mes.get('type')) or {}
+            body = media.get('caption', '')
+            message_values.update({'body': body or MEDIA_PLACEHOLDER % mes.get('type')})
+            vals.update({'message': body})
+            return
+        elif mes.get('type') == 'reaction':
+            body = mes.get('reaction').get('emoji')
+        elif mes.get('type') == 'button':
+            body = mes.get('button').get('text')
+        elif mes.get('type') == 'interactive':
+            title = list(map(lambda l: mes.get('interactive').get(l), mes.get('interactive')))
+            body = len(title) > 0 and title[1].get('title') or ''
+        else:
+            body = mes.get('text').get('body')
+        message_values.update({'body': body})
+        vals.update({'message': body})